@@ -0,0 +1,109 @@
+"""
+benchmark.py
+
+这个脚本测量 plexmediacover 插件渲染进程池的启动耗时以及回收进程对渲染耗时的影响，仅用于开发，不随插件发布。
+渲染进程以 spawn 方式启动，每个新进程都需要重新导入插件包及 MoviePilot 的应用模块，
+回收进程（渲染进程回收任务数）时会重复这部分耗时
+
+使用方式（插件已安装到 MoviePilot，在 MoviePilot 根目录下执行）：
+    PYTHONPATH=. python <插件仓库>/benchmarks/plexmediacover/benchmark.py --font <字体文件路径> --covers 24 --workers 2
+"""
+import argparse
+import json
+import math
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from PIL import Image
+
+from app.plugins.plexmediacover.render import RenderPool, render_cover
+
+
+def measure_startup(workers: int, repeat: int) -> Dict[str, Any]:
+    """测量新进程池完成第一个任务的耗时，包括启动子进程及导入插件包"""
+    samples = []
+    for _ in range(repeat):
+        pool = RenderPool(workers)
+        start = time.perf_counter()
+        pool.submit(os.getpid).result()
+        samples.append(time.perf_counter() - start)
+        pool.shutdown()
+    return {
+        "phase": "startup",
+        "samples": [round(sample, 3) for sample in samples],
+        "mean_seconds": round(sum(samples) / len(samples), 3),
+    }
+
+
+def measure_renders(posters: List[str], font_path: str, style: str, workers: int,
+                    max_tasks_per_worker: int) -> Dict[str, Any]:
+    """按指定的回收任务数渲染所有海报，返回总耗时及启动的进程池数量"""
+    pool = RenderPool(workers, max_tasks_per_worker=max_tasks_per_worker or None)
+
+    def render(index):
+        return pool.submit(render_cover, style=style, title=("电影", "MOVIE"), font_path=(font_path, font_path),
+                           font_size=(1, 1), blur_size=50, color_ratio=0.8, seed=f"{index:016x}",
+                           image_path=posters[index]).result()
+
+    start = time.perf_counter()
+    # 与更新全部媒体库一致，I/O 线程数为进程数的两倍
+    with ThreadPoolExecutor(max_workers=workers * 2) as executor:
+        results = list(executor.map(render, range(len(posters))))
+    elapsed = time.perf_counter() - start
+    pool.shutdown()
+    pools = math.ceil(len(posters) / (workers * max_tasks_per_worker)) if max_tasks_per_worker else 1
+    return {
+        "phase": f"max_tasks={max_tasks_per_worker}",
+        "covers": len(posters),
+        "rendered": sum(1 for result in results if result),
+        "pools": pools,
+        "elapsed_seconds": round(elapsed, 3),
+        "seconds_per_cover": round(elapsed / len(posters), 3),
+    }
+
+
+def format_results(startup: Dict[str, Any], results: List[Dict[str, Any]]) -> str:
+    """将测量结果格式化为文本"""
+    lines = [f"进程池启动耗时（首个任务）：平均 {startup['mean_seconds']}s，各次 {startup['samples']}",
+             f"{'回收任务数':<16}{'封面':>6}{'成功':>6}{'进程池':>8}{'耗时(s)':>10}{'每个封面(s)':>14}"]
+    for result in results:
+        lines.append(f"{result['phase']:<20}{result['covers']:>6}{result['rendered']:>6}{result['pools']:>8}"
+                     f"{result['elapsed_seconds']:>10}{result['seconds_per_cover']:>14}")
+    return "\n".join(lines)
+
+
+def main(args: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Plex媒体库封面渲染进程池基准测试")
+    parser.add_argument("--font", required=True, help="渲染标题使用的字体文件")
+    parser.add_argument("--covers", type=int, default=24, help="渲染的封面数量")
+    parser.add_argument("--workers", type=int, default=2, help="渲染进程数")
+    parser.add_argument("--style", default="single_1", choices=["single_1", "single_2"], help="封面风格")
+    parser.add_argument("--max-tasks", type=int, action="append",
+                        help="每个进程的回收任务数，0 为不回收，可重复指定，默认比较 0、1 和 10")
+    parser.add_argument("--startup-repeat", type=int, default=3, help="测量进程池启动耗时的次数")
+    parser.add_argument("--json", action="store_true", help="以 JSON 格式输出结果")
+    options = parser.parse_args(args)
+
+    startup = measure_startup(options.workers, options.startup_repeat)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        state = np.random.RandomState(0)
+        posters = []
+        for index in range(options.covers):
+            poster = Path(tmp_dir) / f"{index}.jpg"
+            Image.fromarray(state.randint(0, 256, (600, 400, 3), dtype=np.uint8)).save(poster)
+            posters.append(str(poster))
+        results = [measure_renders(posters, options.font, options.style, options.workers, max_tasks)
+                   for max_tasks in options.max_tasks or [0, 1, 10]]
+    if options.json:
+        print(json.dumps({"startup": startup, "renders": results}, ensure_ascii=False, indent=2))
+    else:
+        print(format_results(startup, results))
+
+
+if __name__ == "__main__":
+    main()
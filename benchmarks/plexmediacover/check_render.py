@@ -0,0 +1,168 @@
+"""
+check_render.py
+
+这个脚本检查 plexmediacover 插件的封面渲染，仅用于开发，不随插件发布，
+每项检查失败时抛出 AssertionError，全部通过时输出各项检查的结果
+
+使用方式（插件已安装到 MoviePilot，在 MoviePilot 根目录下执行）：
+    PYTHONPATH=. python <插件仓库>/benchmarks/plexmediacover/check_render.py --font <字体文件路径>
+"""
+import argparse
+import random
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+from app.plugins.plexmediacover import style_multi_1, style_single_1
+from app.plugins.plexmediacover.render import RenderPool, RenderRun, RenderStopped, render_cover
+
+# 封面标题
+TITLE = ("电影", "MOVIE")
+
+
+def check_single_1_padding(font_path: str) -> str:
+    """只有两种颜色的海报提取不到足够的颜色，单图封面 1 使用备选颜色补足后仍能生成封面"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        poster = Path(tmp_dir) / "poster.png"
+        image = Image.new("RGB", (400, 600), (200, 60, 60))
+        image.paste((60, 90, 200), (0, 300, 400, 600))
+        image.save(poster)
+        colors = style_single_1.find_dominant_macaron_colors(image, num_colors=6)
+        assert len(colors) < 6, f"海报提取到 {len(colors)} 种颜色，未触发补足颜色"
+        result = style_single_1.create_style_single_1(str(poster), TITLE, (font_path, font_path))
+    assert result, "单图封面 1 生成失败"
+    return f"提取到 {len(colors)} 种颜色，补足后生成封面 {len(result)} 字节"
+
+
+def loop_gradient_mask(width, height, exponent):
+    """逐像素生成渐变遮罩，与 create_gradient_background 改为数组计算前的实现一致"""
+    mask = Image.new("L", (width, height), 0)
+    mask.putdata([int(255.0 * (x / width) ** exponent) for _ in range(height) for x in range(width)])
+    return mask
+
+
+def loop_lighten_mask(width, height, strength):
+    """逐列画线生成变浅遮罩，与 create_blur_background 改为数组计算前的实现一致"""
+    mask = Image.new("L", (width, height), 0)
+    draw = ImageDraw.Draw(mask)
+    for x in range(width):
+        max_alpha = int(255 * np.clip(strength, 0.0, 1.0))
+        draw.line([(x, 0), (x, height)], fill=int((x / width) * max_alpha))
+    return mask
+
+
+def check_multi_1_gradient_masks() -> str:
+    """多图封面 1 按数组计算的渐变遮罩及变浅遮罩与逐像素生成的遮罩完全一致"""
+    sizes = [(1, 1), (7, 3), (333, 17), (1920, 1080)]
+    checked = 0
+    for width, height in sizes:
+        for exponent in (0.5, 0.7, 0.85, 1.0, 2.0):
+            expected = loop_gradient_mask(width, height, exponent)
+            actual = style_multi_1.create_horizontal_gradient_mask(width, height, exponent=exponent)
+            assert actual.tobytes() == expected.tobytes(), f"渐变遮罩不一致：{width}x{height}，指数 {exponent}"
+            checked += 1
+        for strength in (0.1, 0.35, 0.8, 1.0, 1.5):
+            expected = loop_lighten_mask(width, height, strength)
+            max_value = float(int(255 * np.clip(strength, 0.0, 1.0)))
+            actual = style_multi_1.create_horizontal_gradient_mask(width, height, max_value=max_value)
+            assert actual.tobytes() == expected.tobytes(), f"变浅遮罩不一致：{width}x{height}，强度 {strength}"
+            checked += 1
+    return f"{checked} 个遮罩与逐像素生成的结果一致"
+
+
+def check_concurrent_render(font_path: str) -> str:
+    """多个线程同时在当前进程中渲染时，每个封面与单独渲染的结果一致，且不改变全局随机数状态"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        state = np.random.RandomState(0)
+        for index in range(1, 10):
+            pixels = state.randint(0, 256, (300, 200, 3), dtype=np.uint8)
+            Image.fromarray(pixels).save(Path(tmp_dir) / f"{index}.jpg")
+        jobs = [(style, seed) for style in ("single_1", "single_2", "multi_1") for seed in ("a" * 16, "b" * 16)]
+
+        def render(style, seed):
+            return render_cover(style=style, title=TITLE, font_path=(font_path, font_path), font_size=(1, 1),
+                                blur_size=50, color_ratio=0.8, seed=seed, image_path=str(Path(tmp_dir) / "1.jpg"),
+                                library_dir=tmp_dir, is_blur=style == "multi_1")
+
+        random.seed(1)
+        np.random.seed(1)
+        expected = {job: render(*job) for job in jobs}
+        assert all(expected.values()), "封面生成失败"
+        assert (random.random(), np.random.random()) == (random.Random(1).random(),
+                                                         np.random.RandomState(1).random_sample()), \
+            "渲染改变了全局随机数状态"
+        results = []
+
+        def work(job):
+            results.append((job, render(*job)))
+
+        threads = [threading.Thread(target=work, args=(job,)) for job in jobs * 2]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    mismatched = [job for job, result in results if result != expected[job]]
+    assert not mismatched, f"同时渲染的封面与单独渲染的结果不一致：{mismatched}"
+    return f"{len(results)} 个同时渲染的封面与单独渲染的结果一致"
+
+
+def check_render_run_stop(font_path: str) -> str:
+    """停止运行后排队中的渲染立即取消，不会改为在当前进程中渲染，之后提交的渲染也不再启动进程池"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        poster = Path(tmp_dir) / "poster.jpg"
+        Image.fromarray(np.random.RandomState(0).randint(0, 256, (600, 400, 3), dtype=np.uint8)).save(poster)
+        run = RenderRun(RenderPool(2))
+        results = []
+
+        def work(index):
+            try:
+                run.render(style="single_1", title=TITLE, font_path=(font_path, font_path), font_size=(1, 1),
+                           blur_size=50, color_ratio=0.8, seed=f"{index:016x}", image_path=str(poster))
+                results.append("rendered")
+            except RenderStopped:
+                results.append("stopped")
+
+        threads = [threading.Thread(target=work, args=(index,)) for index in range(8)]
+        for thread in threads:
+            thread.start()
+        # 等待进程池启动并开始渲染
+        time.sleep(1)
+        run.stop()
+        for thread in threads:
+            thread.join()
+        try:
+            run.render(style="single_1", title=TITLE, font_path=(font_path, font_path), font_size=(1, 1),
+                       blur_size=50, color_ratio=0.8, seed="f" * 16, image_path=str(poster))
+            raise AssertionError("停止后提交的渲染没有被取消")
+        except RenderStopped:
+            pass
+        run.close()
+    assert "stopped" in results, "停止后排队中的渲染没有被取消"
+    return f"{results.count('stopped')} 个排队中的渲染被取消，{results.count('rendered')} 个已开始的渲染完成"
+
+
+# 检查名称及检查函数，检查函数返回结果说明
+CHECKS: Dict[str, Callable[[argparse.Namespace], str]] = {
+    "single_1_padding": lambda options: check_single_1_padding(options.font),
+    "multi_1_gradient_masks": lambda options: check_multi_1_gradient_masks(),
+    "concurrent_render": lambda options: check_concurrent_render(options.font),
+    "render_run_stop": lambda options: check_render_run_stop(options.font),
+}
+
+
+def main(args: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Plex媒体库封面渲染检查")
+    parser.add_argument("--font", required=True, help="渲染标题使用的字体文件")
+    parser.add_argument("--only", action="append", choices=list(CHECKS), help="只执行指定的检查，可重复指定")
+    options = parser.parse_args(args)
+    for name in options.only or CHECKS:
+        print(f"{name}: {CHECKS[name](options)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,802 @@
+"""
+benchmark.py
+
+这个脚本提供 plexpersonmeta 插件的离线性能基准测试，仅用于开发，不随插件发布，
+使用本地 HTTP 服务模拟 Plex（包括通知流），并使用可注入延迟的替身模拟 TMDB 及豆瓣，
+生成指定规模的媒体库后分别执行全量刮削、增量刮削以及通知触发的刮削，输出吞吐量、请求次数以及内存峰值，
+用于比较刮削性能的变化
+
+使用方式（插件已安装到 MoviePilot，在 MoviePilot 根目录下执行）：
+    PYTHONPATH=. python <插件仓库>/benchmarks/plexpersonmeta/benchmark.py --movies 500 --shows 20 --episodes 12 --cast 20
+"""
+import argparse
+import base64
+import hashlib
+import json
+import random
+import re
+import socket
+import struct
+import tempfile
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from urllib.parse import parse_qs, unquote, urlparse
+
+import requests
+
+from app.core.context import MediaInfo
+from app.plugins.plexpersonmeta.metrics import scrape_metrics
+from app.plugins.plexpersonmeta.notification import PlexNotificationListener
+from app.plugins.plexpersonmeta.scrape import ScrapeHelper
+from app.plugins.plexpersonmeta.store import CheckpointStore, FailureStore, FingerprintStore, PersonStore, \
+    StateDatabase
+from app.schemas import MediaPerson, MediaServerConf, ServiceInfo, TmdbEpisode
+from app.schemas.types import MediaType
+
+# 电影及剧集媒体库的 key
+MOVIE_SECTION = 1
+SHOW_SECTION = 2
+# 时间线通知中的媒体类型
+TIMELINE_TYPES = {"movie": 1, "show": 2, "episode": 4}
+# websocket 握手使用的 GUID
+WEBSOCKET_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+
+class SyntheticLibrary:
+    """
+    合成媒体库，按指定规模生成电影、剧集及其下的集，人物从固定大小的人物池中选取，不同媒体之间存在重复的人物
+    """
+
+    def __init__(self, movies: int = 200, shows: int = 10, episodes: int = 10, cast: int = 15,
+                 guests: int = 2, person_pool: int = 2000, seed: int = 0):
+        """
+        :param movies: 电影数量
+        :param shows: 剧集数量
+        :param episodes: 每部剧集的集数
+        :param cast: 每个媒体的主要演员数量
+        :param guests: 每集的客串演员数量
+        :param person_pool: 人物池大小
+        :param seed: 随机种子
+        """
+        self.person_pool = person_pool
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._next_key = 1000
+        self.items: Dict[str, dict] = {}
+        # ratingKey -> 媒体项原始人物的 ID
+        self.person_ids: Dict[str, List[int]] = {}
+        # tmdbid -> 演员的 TMDB 人物 ID 及角色序号
+        self.casts: Dict[int, List[int]] = {}
+        for index in range(movies):
+            self.__add_item(section=MOVIE_SECTION, item_type="movie", title=f"Movie {index}",
+                            tmdbid=100000 + index, cast=cast)
+        for index in range(shows):
+            show = self.__add_item(section=SHOW_SECTION, item_type="show", title=f"Show {index}",
+                                   tmdbid=200000 + index, cast=cast)
+            show["childCount"] = 1
+            show["leafCount"] = episodes
+            for number in range(1, episodes + 1):
+                self.__add_episode(show=show, number=number, guests=guests)
+
+    @property
+    def size(self) -> int:
+        """媒体项总数"""
+        return len(self.items)
+
+    def __new_key(self) -> str:
+        self._next_key += 1
+        return str(self._next_key)
+
+    def __roles(self, person_ids: List[int]) -> List[dict]:
+        return [{"id": person_id, "tag": f"Actor {person_id}", "role": f"Role {index}",
+                 "tagKey": f"tk{person_id}", "thumb": ""}
+                for index, person_id in enumerate(person_ids)]
+
+    def __add_item(self, section: int, item_type: str, title: str, tmdbid: int, cast: int) -> dict:
+        rating_key = self.__new_key()
+        person_ids = self._random.sample(range(1, self.person_pool + 1), min(cast, self.person_pool))
+        self.casts[tmdbid] = person_ids
+        self.person_ids[rating_key] = person_ids
+        item = {
+            "ratingKey": rating_key,
+            "key": f"/library/metadata/{rating_key}",
+            "type": item_type,
+            "title": title,
+            "year": 2000 + int(rating_key) % 25,
+            "librarySectionID": section,
+            "addedAt": int(time.time()),
+            "updatedAt": 1,
+            "Guid": [{"id": f"tmdb://{tmdbid}"}],
+            "Role": self.__roles(person_ids),
+        }
+        self.items[rating_key] = item
+        return item
+
+    def __add_episode(self, show: dict, number: int, guests: int):
+        rating_key = self.__new_key()
+        tmdbid = int(show["Guid"][0]["id"].split("tmdb://")[1])
+        guest_ids = self._random.sample(range(1, self.person_pool + 1), min(guests, self.person_pool))
+        self.person_ids[rating_key] = self.casts[tmdbid] + guest_ids
+        self.items[rating_key] = {
+            "ratingKey": rating_key,
+            "key": f"/library/metadata/{rating_key}",
+            "type": "episode",
+            "title": f"Episode {number}",
+            "index": number,
+            "parentIndex": 1,
+            "grandparentTitle": show["title"],
+            "grandparentKey": show["key"],
+            "grandparentRatingKey": show["ratingKey"],
+            "librarySectionID": SHOW_SECTION,
+            "addedAt": int(time.time()),
+            "updatedAt": 1,
+            "Guid": [{"id": f"tmdb://{tmdbid}"}],
+            "Role": self.__roles(self.casts[tmdbid] + guest_ids),
+        }
+
+    def touch(self, ratio: float) -> int:
+        """
+        模拟 Plex 刷新元数据，按比例更新媒体项的 updatedAt
+        :return: 更新的媒体项数量
+        """
+        with self._lock:
+            keys = [key for key in self.items if self._random.random() < ratio]
+            for key in keys:
+                self.items[key]["updatedAt"] += 1
+        return len(keys)
+
+    def refresh(self, ratio: float) -> List[str]:
+        """
+        模拟 Plex 刷新元数据，按比例将媒体项的人物信息恢复为原始的英文信息，并更新 updatedAt
+        :return: 刷新的媒体项的 ratingKey
+        """
+        with self._lock:
+            keys = [key for key in self.items if self._random.random() < ratio]
+            for key in keys:
+                self.items[key]["Role"] = self.__roles(self.person_ids[key])
+                self.items[key]["updatedAt"] += 1
+        return keys
+
+    def unscraped(self) -> int:
+        """人物信息仍为原始信息（未被刮削写回）的媒体项数量"""
+        with self._lock:
+            return sum(1 for key, item in self.items.items() if item["Role"] == self.__roles(self.person_ids[key]))
+
+    def summary(self, item: dict, include_guids: bool = False) -> dict:
+        """列表接口返回的媒体项摘要，不包含 Role"""
+        summary = {key: value for key, value in item.items() if key not in ("Role", "Guid")}
+        if include_guids:
+            summary["Guid"] = item["Guid"]
+        return summary
+
+    def update_roles(self, rating_key: str, roles: List[dict]) -> bool:
+        """写入人物信息，并更新 updatedAt"""
+        with self._lock:
+            item = self.items.get(rating_key)
+            if not item:
+                return False
+            item["Role"] = roles
+            item["updatedAt"] += 1
+        return True
+
+
+class StandInPlexHandler(BaseHTTPRequestHandler):
+    """
+    模拟 Plex 的 HTTP 接口，仅实现 ScrapeHelper 使用到的端点
+    """
+    server: "StandInPlexServer"
+
+    def log_message(self, format: str, *args: Any):
+        pass
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == PlexNotificationListener.url_path:
+            return self.__serve_notifications()
+        self.server.delay()
+        query = {key: values[0] for key, values in parse_qs(url.query, keep_blank_values=True).items()}
+        path = url.path.rstrip("/")
+        library = self.server.library
+
+        match = re.fullmatch(r"/library/sections/(\d+)/all", path)
+        if match:
+            section = int(match.group(1))
+            items = [item for item in library.items.values()
+                     if item["librarySectionID"] == section and item["type"] != "episode"]
+            if query.get("title"):
+                self.server.count("search")
+                title = query["title"].lower()
+                items = [item for item in items if title in item["title"].lower()]
+            else:
+                self.server.count("list")
+            datas = [library.summary(item, include_guids=query.get("includeGuids") == "1") for item in items]
+            return self.__send_page(datas, query)
+
+        match = re.fullmatch(r"/library/metadata/(\d+)/allLeaves", path)
+        if match:
+            self.server.count("leaves")
+            datas = [library.summary(item) for item in library.items.values()
+                     if item.get("grandparentRatingKey") == match.group(1)]
+            return self.__send_page(datas, query)
+
+        match = re.fullmatch(r"/library/metadata/([\d,]+)", path)
+        if match:
+            self.server.count("metadata")
+            keys = match.group(1).split(",")
+            datas = [json.loads(json.dumps(library.items[key])) for key in keys if key in library.items]
+            return self.__send({"MediaContainer": {"size": len(datas), "Metadata": datas}})
+
+        if path == "/library/all":
+            self.server.count("added")
+            added_at = int(query.get("addedAt>", query.get("addedAt>=", 0)) or 0)
+            datas = [library.summary(item) for item in library.items.values() if item["addedAt"] >= added_at]
+            return self.__send_page(datas, query)
+
+        self.server.count("not_found")
+        self.__send({"error": "not found"}, status=404)
+
+    def do_PUT(self):
+        self.server.delay()
+        url = urlparse(self.path)
+        match = re.fullmatch(r"/library/metadata/(\d+)", url.path.rstrip("/"))
+        if not match:
+            self.server.count("not_found")
+            return self.__send({"error": "not found"}, status=404)
+        self.server.count("put")
+        params = {unquote(key): values[0] for key, values in parse_qs(url.query, keep_blank_values=True).items()}
+        roles = []
+        while f"actor[{len(roles)}].tag.tag" in params:
+            prefix = f"actor[{len(roles)}]"
+            roles.append({"tag": params.get(f"{prefix}.tag.tag", ""),
+                          "role": params.get(f"{prefix}.tagging.text", ""),
+                          "thumb": params.get(f"{prefix}.tag.thumb", ""),
+                          "tagKey": params.get(f"{prefix}.tag.tagKey", "")})
+        if not self.server.library.update_roles(match.group(1), roles):
+            return self.__send({"error": "not found"}, status=404)
+        self.__send({})
+
+    def __serve_notifications(self):
+        """升级为 websocket 连接，保持连接直到客户端关闭，期间由服务端推送通知"""
+        self.server.count("notifications")
+        key = self.headers.get("Sec-WebSocket-Key", "")
+        accept = base64.b64encode(hashlib.sha1(f"{key}{WEBSOCKET_GUID}".encode()).digest()).decode()
+        self.send_response(101, "Switching Protocols")
+        self.send_header("Upgrade", "websocket")
+        self.send_header("Connection", "Upgrade")
+        self.send_header("Sec-WebSocket-Accept", accept)
+        self.end_headers()
+        self.wfile.flush()
+        self.close_connection = True
+        self.server.add_client(self.connection)
+        try:
+            while True:
+                frame = self.__read_frame()
+                if frame is None:
+                    break
+                opcode, payload = frame
+                if opcode == 0x8:
+                    self.server.send_frame(self.connection, 0x8, payload[:2])
+                    break
+                if opcode == 0x9:
+                    self.server.send_frame(self.connection, 0xA, payload)
+        except OSError:
+            pass
+        finally:
+            self.server.remove_client(self.connection)
+
+    def __read_frame(self) -> Optional[tuple]:
+        """读取客户端发送的一帧，客户端的帧均带有掩码"""
+        header = self.rfile.read(2)
+        if len(header) < 2:
+            return None
+        opcode, length = header[0] & 0x0F, header[1] & 0x7F
+        if length == 126:
+            length = struct.unpack("!H", self.rfile.read(2))[0]
+        elif length == 127:
+            length = struct.unpack("!Q", self.rfile.read(8))[0]
+        mask = self.rfile.read(4) if header[1] & 0x80 else b"\x00\x00\x00\x00"
+        payload = bytes(byte ^ mask[index % 4] for index, byte in enumerate(self.rfile.read(length)))
+        return opcode, payload
+
+    def __send_page(self, datas: List[dict], query: Dict[str, str]):
+        start = int(query.get("X-Plex-Container-Start", 0))
+        size = int(query.get("X-Plex-Container-Size", len(datas) or 1))
+        page = datas[start:start + size]
+        self.__send({"MediaContainer": {"totalSize": len(datas), "offset": start, "size": len(page),
+                                        "Metadata": page}})
+
+    def __send(self, data: dict, status: int = 200):
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class StandInPlexServer(ThreadingHTTPServer):
+    """
+    本地 Plex 替身服务，每个请求附加固定延迟，并按端点统计请求次数
+    """
+    daemon_threads = True
+
+    def __init__(self, library: SyntheticLibrary, latency: float = 0.0):
+        super().__init__(("127.0.0.1", 0), StandInPlexHandler)
+        self.library = library
+        self.latency = latency
+        self._counts: Counter = Counter()
+        self._counts_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        # 已连接通知流的客户端
+        self._clients: List[socket.socket] = []
+        self._clients_changed = threading.Condition()
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def delay(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    def count(self, route: str):
+        with self._counts_lock:
+            self._counts[route] += 1
+
+    def counts(self) -> Dict[str, int]:
+        with self._counts_lock:
+            return dict(self._counts)
+
+    def reset_counts(self):
+        with self._counts_lock:
+            self._counts.clear()
+
+    def add_client(self, client: socket.socket):
+        with self._clients_changed:
+            self._clients.append(client)
+            self._clients_changed.notify_all()
+
+    def remove_client(self, client: socket.socket):
+        with self._clients_changed:
+            if client in self._clients:
+                self._clients.remove(client)
+            self._clients_changed.notify_all()
+
+    def wait_for_clients(self, count: int = 1, timeout: float = 5) -> bool:
+        """等待指定数量的客户端连接通知流"""
+        with self._clients_changed:
+            return self._clients_changed.wait_for(lambda: len(self._clients) >= count, timeout=timeout)
+
+    @staticmethod
+    def send_frame(client: socket.socket, opcode: int, payload: bytes):
+        """发送一帧，服务端的帧不带掩码"""
+        length = len(payload)
+        if length < 126:
+            header = struct.pack("!BB", 0x80 | opcode, length)
+        elif length < 65536:
+            header = struct.pack("!BBH", 0x80 | opcode, 126, length)
+        else:
+            header = struct.pack("!BBQ", 0x80 | opcode, 127, length)
+        client.sendall(header + payload)
+
+    def notify(self, container: dict):
+        """向所有已连接的客户端推送通知"""
+        payload = json.dumps({"NotificationContainer": container}).encode("utf-8")
+        with self._clients_changed:
+            clients = list(self._clients)
+        for client in clients:
+            try:
+                self.send_frame(client, 0x1, payload)
+            except OSError:
+                self.remove_client(client)
+
+    def notify_timeline(self, item: dict, state: int):
+        """推送媒体项的时间线通知"""
+        self.notify({"type": "timeline", "size": 1, "TimelineEntry": [{
+            "identifier": PlexNotificationListener.library_identifier,
+            "sectionID": str(item["librarySectionID"]),
+            "itemID": item["ratingKey"],
+            "type": TIMELINE_TYPES.get(item["type"], 0),
+            "title": item["title"],
+            "state": state,
+            "updatedAt": item["updatedAt"],
+        }]})
+
+    def start(self) -> "StandInPlexServer":
+        self._thread = threading.Thread(target=self.serve_forever, name="plexpersonmeta-benchmark-plex",
+                                        daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        with self._clients_changed:
+            clients, self._clients = list(self._clients), []
+        for client in clients:
+            try:
+                client.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        self.shutdown()
+        self.server_close()
+
+
+class StandInPlex:
+    """
+    Plex 替身客户端，get_data/put_data 与 MoviePilot Plex 模块的接口一致，请求失败时返回 None，
+    get_plex 返回的对象仅提供通知监听及刮削专用 Plex 客户端使用到的 url 方法
+    """
+
+    def __init__(self, base_url: str):
+        self._base_url = base_url
+        self._session = requests.Session()
+        self._session.headers.update({"Accept": "application/json"})
+
+    def __url(self, endpoint: str) -> str:
+        return f"{self._base_url}/{endpoint.lstrip('/')}"
+
+    def get_plex(self) -> "StandInPlex":
+        return self
+
+    def url(self, key: str, includeToken: bool = False) -> str:
+        return self.__url(key)
+
+    def get_data(self, endpoint: str, timeout: Optional[int] = None) -> Optional[requests.Response]:
+        try:
+            return self._session.get(self.__url(endpoint), timeout=timeout)
+        except requests.RequestException:
+            return None
+
+    def put_data(self, endpoint: str, params: Optional[dict] = None,
+                 timeout: Optional[int] = None) -> Optional[requests.Response]:
+        try:
+            return self._session.put(self.__url(endpoint), params=params, timeout=timeout)
+        except requests.RequestException:
+            return None
+
+    def close(self):
+        self._session.close()
+
+
+class StandInChain:
+    """
+    TMDB 及豆瓣替身，接口与 PluginChian 的 recognize_media/match_doubaninfo/douban_info
+    及 TmdbChain 的 person_detail/tmdb_episodes 一致
+    """
+
+    def __init__(self, library: SyntheticLibrary, tmdb_latency: float = 0.0, douban_latency: float = 0.0,
+                 untranslated_ratio: float = 0.1):
+        """
+        :param library: 合成媒体库
+        :param tmdb_latency: TMDB 请求延迟（秒）
+        :param douban_latency: 豆瓣请求延迟（秒）
+        :param untranslated_ratio: TMDB 中没有中文名的人物比例，这些人物需要通过豆瓣翻译
+        """
+        self.library = library
+        self.tmdb_latency = tmdb_latency
+        self.douban_latency = douban_latency
+        self.untranslated_ratio = untranslated_ratio
+        self.calls: Counter = Counter()
+        self._lock = threading.Lock()
+
+    def count(self, name: str):
+        with self._lock:
+            self.calls[name] += 1
+
+    def has_chinese_name(self, person_id: int) -> bool:
+        """按人物 ID 确定性地决定人物在 TMDB 中是否有中文名"""
+        return (person_id * 7919) % 1000 >= self.untranslated_ratio * 1000
+
+    def recognize_media(self, mtype: MediaType = None, tmdbid: int = None, **kwargs) -> Optional[MediaInfo]:
+        self.count("tmdb_media")
+        time.sleep(self.tmdb_latency)
+        person_ids = self.library.casts.get(tmdbid)
+        if person_ids is None:
+            return None
+        seasons = {}
+        if mtype == MediaType.TV:
+            for episode in self.__episodes(tmdbid):
+                seasons.setdefault(episode["parentIndex"], []).append(episode["index"])
+        return MediaInfo(type=mtype, tmdb_id=tmdbid, title=f"媒体 {tmdbid}", year="2020", seasons=seasons,
+                         actors=[{"id": person_id, "name": f"Actor {person_id}",
+                                  "original_name": f"Actor {person_id}", "character": f"角色{index}"}
+                                 for index, person_id in enumerate(person_ids)])
+
+    def __episodes(self, tmdbid: int) -> List[dict]:
+        """剧集下的所有集"""
+        return [item for item in list(self.library.items.values())
+                if item["type"] == "episode" and item["Guid"][0]["id"] == f"tmdb://{tmdbid}"]
+
+    def tmdb_episodes(self, tmdbid: int, season: int, **kwargs) -> List[TmdbEpisode]:
+        self.count("tmdb_season")
+        time.sleep(self.tmdb_latency)
+        cast = self.library.casts.get(tmdbid) or []
+        return [TmdbEpisode(episode_number=episode["index"], season_number=season,
+                            guest_stars=[{"id": person_id, "name": f"Actor {person_id}",
+                                          "original_name": f"Actor {person_id}", "character": f"客串{index}"}
+                                         for index, person_id in
+                                         enumerate(self.library.person_ids[episode["ratingKey"]][len(cast):])])
+                for episode in self.__episodes(tmdbid) if episode["parentIndex"] == season]
+
+    def person_detail(self, person_id: int) -> Optional[MediaPerson]:
+        self.count("tmdb_person")
+        time.sleep(self.tmdb_latency)
+        also_known_as = [f"演员{person_id}"] if self.has_chinese_name(person_id) else []
+        return MediaPerson(id=person_id, name=f"Actor {person_id}", also_known_as=also_known_as)
+
+    def match_doubaninfo(self, name: str = None, **kwargs) -> Optional[dict]:
+        self.count("douban_match")
+        time.sleep(self.douban_latency)
+        match = re.search(r"(\d+)", name or "")
+        return {"id": match.group(1)} if match else None
+
+    def douban_info(self, doubanid: str, **kwargs) -> Optional[dict]:
+        self.count("douban_info")
+        time.sleep(self.douban_latency)
+        person_ids = self.library.casts.get(int(doubanid)) or []
+        return {"actors": [{"name": f"演员{person_id}", "latin_name": f"Actor {person_id}",
+                            "character": f"饰 角色{index}"}
+                           for index, person_id in enumerate(person_ids)],
+                "directors": []}
+
+
+class StandInLibrary:
+    """媒体库替身，提供 ScrapeHelper 使用到的 key、TYPE、title 属性"""
+
+    def __init__(self, key: int, library_type: str, title: str):
+        self.key = key
+        self.TYPE = library_type
+        self.title = title
+
+
+class Benchmark:
+    """
+    离线基准测试，依次执行全量刮削与增量刮削，并记录每个阶段的耗时、吞吐量、请求次数及内存峰值
+    """
+
+    def __init__(self, library: SyntheticLibrary, config: Optional[dict] = None, plex_latency: float = 0.0,
+                 tmdb_latency: float = 0.0, douban_latency: float = 0.0, untranslated_ratio: float = 0.1):
+        self.library = library
+        self.config = {"douban_scrape": True, **(config or {})}
+        self.server = StandInPlexServer(library=library, latency=plex_latency)
+        self.chain = StandInChain(library=library, tmdb_latency=tmdb_latency, douban_latency=douban_latency,
+                                  untranslated_ratio=untranslated_ratio)
+        self._data_dir = tempfile.TemporaryDirectory(prefix="plexpersonmeta-benchmark-")
+        self.state = StateDatabase(path=Path(self._data_dir.name) / "state.db")
+        self.fingerprints = FingerprintStore(database=self.state)
+        self.checkpoints = CheckpointStore(database=self.state)
+        self.failures = FailureStore(database=self.state)
+        self.persons = PersonStore(path=Path(self._data_dir.name) / "persons.db")
+        self.libraries = {
+            MOVIE_SECTION: StandInLibrary(key=MOVIE_SECTION, library_type="movie", title="电影"),
+            SHOW_SECTION: StandInLibrary(key=SHOW_SECTION, library_type="show", title="剧集"),
+        }
+
+    def __enter__(self) -> "Benchmark":
+        self.server.start()
+        return self
+
+    def __exit__(self, *args):
+        self.server.stop()
+        self.persons.close()
+        self.state.close()
+        self._data_dir.cleanup()
+
+    def service_info(self, plex: StandInPlex) -> ServiceInfo:
+        """替身媒体服务器的服务信息，刮削专用 Plex 客户端从配置中读取令牌"""
+        return ServiceInfo(name="benchmark", instance=plex, type="plex",
+                           config=MediaServerConf(name="benchmark", type="plex",
+                                                  config={"host": self.server.base_url, "token": "benchmark"}))
+
+    def create_helper(self, plex: StandInPlex) -> ScrapeHelper:
+        """创建使用替身的 ScrapeHelper"""
+        helper = ScrapeHelper(config=self.config, event=threading.Event(), chain=self.chain,
+                              service=self.service_info(plex),
+                              libraries=self.libraries, fingerprints=self.fingerprints,
+                              persons=self.persons, checkpoints=self.checkpoints, failures=self.failures)
+        helper.tmdb_chain = self.chain
+        return helper
+
+    def run_phase(self, name: str, stop_after_writes: int = 0) -> Dict[str, Any]:
+        """
+        执行一次刮削并返回统计数据
+        :param name: 阶段名称
+        :param stop_after_writes: 写回次数达到该值后触发外部中断，模拟中断的刮削，为 0 时不中断
+        """
+        self.server.reset_counts()
+        self.chain.calls.clear()
+        scrape_metrics.reset()
+        plex = StandInPlex(base_url=self.server.base_url)
+        helper = self.create_helper(plex=plex)
+        if stop_after_writes:
+            threading.Thread(target=self.__interrupt_after, args=(helper.event, stop_after_writes),
+                             daemon=True).start()
+
+        tracemalloc.start()
+        start = time.perf_counter()
+        try:
+            with scrape_metrics.run():
+                for library in self.libraries.values():
+                    helper.scrape_library(library=library)
+            elapsed = time.perf_counter() - start
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+            plex.close()
+            helper.event.set()
+        self.fingerprints.save()
+        self.checkpoints.save()
+        self.failures.save()
+        return self.__phase_result(name=name, items=self.library.size, elapsed=elapsed, peak=peak)
+
+    def __interrupt_after(self, event: threading.Event, writes: int):
+        """写回次数达到指定值后触发外部中断，阶段结束时退出"""
+        while not event.is_set():
+            if self.server.counts().get("put", 0) >= writes:
+                event.set()
+                return
+            time.sleep(0.005)
+
+    def run_notifications(self, ratio: float = 0.05, debounce: float = 0.5, repeat: int = 3,
+                          timeout: float = 60) -> Dict[str, Any]:
+        """
+        刷新部分媒体项的元数据后，通过通知流推送时间线通知，由通知监听去抖后刮削，记录从推送到全部写回的耗时
+        :param ratio: 刷新元数据的媒体项比例
+        :param debounce: 去抖时间（秒）
+        :param repeat: 每个媒体项重复推送处理完成通知的次数，用于验证去抖
+        :param timeout: 等待全部写回的超时时间（秒）
+        """
+        self.server.reset_counts()
+        self.chain.calls.clear()
+        scrape_metrics.reset()
+        plex = StandInPlex(base_url=self.server.base_url)
+        batches: List[List[str]] = []
+        handled = threading.Condition()
+
+        def handler(service: ServiceInfo, libraries: Dict[int, Any], rating_keys: List[str]) -> bool:
+            self.create_helper(plex=plex).scrape_rating_keys(rating_keys=rating_keys)
+            with handled:
+                batches.append(rating_keys)
+                handled.notify_all()
+            return True
+
+        listener = PlexNotificationListener(service=self.service_info(plex),
+                                            libraries=self.libraries, handler=handler, debounce=debounce)
+        listener.poll_interval = min(listener.poll_interval, debounce / 5 or 0.1)
+        tracemalloc.start()
+        try:
+            listener.start()
+            if not self.server.wait_for_clients(count=1):
+                raise RuntimeError("通知监听未能连接到 Plex 替身")
+            rating_keys = self.library.refresh(ratio=ratio)
+            start = time.perf_counter()
+            with scrape_metrics.run():
+                for rating_key in rating_keys:
+                    item = self.library.items[rating_key]
+                    for state in [0, 1] + [listener.processed_state] * repeat:
+                        self.server.notify_timeline(item=item, state=state)
+                with handled:
+                    handled.wait_for(lambda: len({key for batch in batches for key in batch}) >= len(rating_keys),
+                                     timeout=timeout)
+            elapsed = time.perf_counter() - start
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+            listener.stop()
+            plex.close()
+        self.fingerprints.save()
+        self.failures.save()
+
+        result = self.__phase_result(name="notifications", items=len(rating_keys), elapsed=elapsed, peak=peak)
+        result["notifications"] = listener.received_count
+        result["batches"] = len(batches)
+        return result
+
+    def __phase_result(self, name: str, items: int, elapsed: float, peak: int) -> Dict[str, Any]:
+        """汇总阶段的统计数据"""
+        metrics = scrape_metrics.snapshot()
+        counters = metrics["counters"]
+        processed = counters.get("items_resolved", 0) + counters.get("items_skipped", 0)
+        return {
+            "phase": name,
+            "items": items,
+            "elapsed_seconds": round(elapsed, 3),
+            "items_per_second": round(items / elapsed, 2) if elapsed else 0.0,
+            "processed": processed,
+            "written": counters.get("items_written", 0),
+            "unchanged": counters.get("items_skipped", 0),
+            "writes_skipped": counters.get("writes_skipped", 0),
+            "unscraped": self.library.unscraped(),
+            "plex_requests": self.server.counts(),
+            "chain_calls": dict(self.chain.calls),
+            "peak_memory_mb": round(peak / 1024 / 1024, 2),
+            "dependencies": {name: {"count": stats["count"], "avg_ms": stats["avg_ms"], "p95_ms": stats["p95_ms"]}
+                             for name, stats in metrics["dependencies"].items()},
+        }
+
+    def run(self, touch_ratio: float = 0.05, notify_ratio: float = 0.0,
+            interrupt_after: int = 0) -> List[Dict[str, Any]]:
+        """
+        依次执行全量刮削、无变化的增量刮削、部分媒体项变化后的增量刮削、部分媒体项人物信息被刷新后的增量刮削，
+        以及通知触发的刮削；除中断的阶段外，各阶段结束后所有媒体项均应已刮削
+        :param touch_ratio: 增量刮削阶段中 updatedAt 发生变化（或人物信息被刷新）的媒体项比例
+        :param notify_ratio: 通知阶段中刷新元数据的媒体项比例，为 0 时不执行通知阶段
+        :param interrupt_after: 全量刮削写回该数量的媒体项后中断，连续中断两次后再从检查点继续刮削，为 0 时不中断
+        """
+        ScrapeHelper.clear_cache()
+        if interrupt_after:
+            # 第二次中断时剧集本身已写回，剧集的指纹在本次运行中即被刷新
+            results = [self.run_phase("interrupted", stop_after_writes=interrupt_after),
+                       self.run_phase("interrupted_again", stop_after_writes=interrupt_after),
+                       self.run_phase("resumed")]
+        else:
+            results = [self.run_phase("full")]
+        results.append(self.run_phase("incremental"))
+        touched = self.library.touch(ratio=touch_ratio)
+        result = self.run_phase("incremental_touched")
+        result["touched"] = touched
+        results.append(result)
+        refreshed = self.library.refresh(ratio=touch_ratio)
+        result = self.run_phase("incremental_refreshed")
+        result["touched"] = len(refreshed)
+        results.append(result)
+        if notify_ratio:
+            results.append(self.run_notifications(ratio=notify_ratio))
+        return results
+
+
+def format_results(results: List[Dict[str, Any]]) -> str:
+    """将基准测试结果格式化为文本表格"""
+    lines = [f"{'阶段':<22}{'媒体项':>8}{'耗时(s)':>10}{'吞吐量(个/s)':>14}{'写回':>8}{'未变化':>8}{'未刮削':>8}"
+             f"{'Plex请求':>10}{'TMDB请求':>10}{'豆瓣请求':>10}{'内存峰值(MB)':>14}"]
+    for result in results:
+        chain_calls = result["chain_calls"]
+        lines.append(f"{result['phase']:<22}{result['items']:>8}{result['elapsed_seconds']:>10}"
+                     f"{result['items_per_second']:>14}{result['written']:>8}{result['unchanged']:>8}"
+                     f"{result['unscraped']:>8}"
+                     f"{sum(result['plex_requests'].values()):>10}"
+                     f"{sum(chain_calls.get(name, 0) for name in ('tmdb_media', 'tmdb_person', 'tmdb_season')):>10}"
+                     f"{chain_calls.get('douban_match', 0) + chain_calls.get('douban_info', 0):>10}"
+                     f"{result['peak_memory_mb']:>14}")
+    return "\n".join(lines)
+
+
+def main(args: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Plex演职人员刮削离线基准测试")
+    parser.add_argument("--movies", type=int, default=200, help="电影数量")
+    parser.add_argument("--shows", type=int, default=10, help="剧集数量")
+    parser.add_argument("--episodes", type=int, default=10, help="每部剧集的集数")
+    parser.add_argument("--cast", type=int, default=15, help="每个媒体的演员数量")
+    parser.add_argument("--plex-latency", type=float, default=5, help="Plex 请求延迟（毫秒）")
+    parser.add_argument("--tmdb-latency", type=float, default=50, help="TMDB 请求延迟（毫秒）")
+    parser.add_argument("--douban-latency", type=float, default=100, help="豆瓣请求延迟（毫秒）")
+    parser.add_argument("--untranslated", type=float, default=0.1, help="需要通过豆瓣翻译的人物比例")
+    parser.add_argument("--touch", type=float, default=0.05, help="增量刮削前 updatedAt 发生变化的媒体项比例")
+    parser.add_argument("--interrupt", type=int, default=0,
+                        help="全量刮削写回该数量的媒体项后中断，连续中断两次后再从检查点继续刮削，为 0 时不中断")
+    parser.add_argument("--notify", type=float, default=0.05, help="通过通知流触发刮削的媒体项比例，为 0 时不执行")
+    parser.add_argument("--douban-rate", type=int, default=600, help="豆瓣请求速率（次/分钟）")
+    parser.add_argument("--config", type=json.loads, default={}, help="额外的插件配置（JSON）")
+    parser.add_argument("--json", action="store_true", help="以 JSON 格式输出结果")
+    options = parser.parse_args(args)
+
+    library = SyntheticLibrary(movies=options.movies, shows=options.shows, episodes=options.episodes,
+                               cast=options.cast)
+    config = {"douban_rate": options.douban_rate, **options.config}
+    with Benchmark(library=library, config=config,
+                   plex_latency=options.plex_latency / 1000,
+                   tmdb_latency=options.tmdb_latency / 1000,
+                   douban_latency=options.douban_latency / 1000,
+                   untranslated_ratio=options.untranslated) as benchmark:
+        results = benchmark.run(touch_ratio=options.touch, notify_ratio=options.notify,
+                                interrupt_after=options.interrupt)
+    print(json.dumps(results, ensure_ascii=False, indent=2) if options.json else format_results(results))
+
+
+if __name__ == "__main__":
+    main()
@@ -11,6 +11,7 @@ from pathlib import Path
 from urllib.parse import urlparse
 from typing import Any, Dict, List, Optional, Tuple
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 import pytz
 import yaml
@@ -30,9 +31,9 @@ from app.schemas.types import EventType
 from app.schemas import ServiceInfo
 from app.utils.http import RequestUtils
 from app.utils.url import UrlUtils
-from app.plugins.plexmediacover.style_single_1 import create_style_single_1
-from app.plugins.plexmediacover.style_single_2 import create_style_single_2
-from app.plugins.plexmediacover.style_multi_1  import create_style_multi_1
+from app.plugins.plexmediacover.downloader import ImageDownloader
+from app.plugins.plexmediacover.render import RenderRun, RenderStopped, create_render_pool, render_cover
+from app.plugins.plexmediacover.render_cache import RenderCache
 from app.plugins.plexmediacover.static.single_1 import single_1
 from app.plugins.plexmediacover.static.single_2 import single_2
 from app.plugins.plexmediacover.static.multi_1  import multi_1
@@ -46,7 +47,7 @@ class PlexMediaCover(_PluginBase):
     # 插件图标
     plugin_icon = "https://raw.githubusercontent.com/NasPilot/MoviePilot-Plugins/main/icons/plexcover.png"
     # 插件版本
-    plugin_version = "0.3.1"
+    plugin_version = "0.4.0"
     # 插件作者
     plugin_author = "NasPilot"
     # 作者主页
@@ -107,9 +108,18 @@ class PlexMediaCover(_PluginBase):
     _color_ratio_multi_1 = 0.8
     _single_use_primary = False
     _multi_1_use_primary = True
+    _render_cache = None
+    _uploaded_lock = threading.Lock()
+    _history_lock = threading.RLock()
+    _render_workers = 2
+    _render_max_tasks = 0
+    _downloader = None
 
     def __init__(self):
         super().__init__()
+        # 正在进行的全部媒体库更新，停止服务时通知其停止
+        self._render_runs = set()
+        self._render_runs_lock = threading.Lock()
 
     def init_plugin(self, config: dict = None):
         self.mschain = MediaServerChain()
@@ -119,6 +129,8 @@ class PlexMediaCover(_PluginBase):
         (data_path / 'covers').mkdir(parents=True, exist_ok=True)
         self._covers_path = data_path / 'covers'
         self._font_path = data_path / 'fonts'
+        self._render_cache = RenderCache(data_path / 'render_cache')
+        self._downloader = ImageDownloader()
         if config:
             self._enabled = config.get("enabled")
             self._onlyonce = config.get("onlyonce")
@@ -157,6 +169,8 @@ class PlexMediaCover(_PluginBase):
             self._color_ratio_multi_1 = config.get("color_ratio_multi_1")
             self._single_use_primary = config.get("single_use_primary")
             self._multi_1_use_primary = config.get("multi_1_use_primary")
+            self._render_workers = config.get("render_workers", 2)
+            self._render_max_tasks = config.get("render_max_tasks", 0)
 
         if self._selected_servers:
             self._servers = self.mediaserver_helper.get_services(
@@ -234,7 +248,9 @@ class PlexMediaCover(_PluginBase):
             "color_ratio": self._color_ratio,
             "color_ratio_multi_1": self._color_ratio_multi_1,
             "single_use_primary": self._single_use_primary,
-            "multi_1_use_primary": self._multi_1_use_primary
+            "multi_1_use_primary": self._multi_1_use_primary,
+            "render_workers": self._render_workers,
+            "render_max_tasks": self._render_max_tasks
         })
 
     def get_state(self) -> bool:
@@ -1083,6 +1099,49 @@ class PlexMediaCover(_PluginBase):
                                             
                                         ]
                                     },
+                                    {
+                                        'component': 'VRow',
+                                        'content': [
+                                            {
+                                                'component': 'VCol',
+                                                'props': {
+                                                    'cols': 12,
+                                                    'md': 6
+                                                },
+                                                'content': [
+                                                    {
+                                                        'component': 'VTextField',
+                                                        'props': {
+                                                            'model': 'render_workers',
+                                                            'label': '渲染进程数',
+                                                            'placeholder': '2',
+                                                            'hint': '更新全部媒体库时并行渲染封面的进程数，1 为不使用进程池',
+                                                            'persistentHint': True
+                                                        }
+                                                    }
+                                                ]
+                                            },
+                                            {
+                                                'component': 'VCol',
+                                                'props': {
+                                                    'cols': 12,
+                                                    'md': 6
+                                                },
+                                                'content': [
+                                                    {
+                                                        'component': 'VTextField',
+                                                        'props': {
+                                                            'model': 'render_max_tasks',
+                                                            'label': '渲染进程回收任务数',
+                                                            'placeholder': '0',
+                                                            'hint': '每个渲染进程处理该数量的封面后重启以释放内存，0 为不重启；新进程需重新加载插件及 MoviePilot 模块，会增加更新耗时',
+                                                            'persistentHint': True
+                                                        }
+                                                    }
+                                                ]
+                                            },
+                                        ]
+                                    },
                                     {
                                         'component': 'VRow',
                                         'content': [
@@ -1281,7 +1340,9 @@ class PlexMediaCover(_PluginBase):
             "color_ratio": 0.8,
             "color_ratio_multi_1": 0.8,
             "single_use_primary": False,
-            "multi_1_use_primary": True
+            "multi_1_use_primary": True,
+            "render_workers": 2,
+            "render_max_tasks": 0
         }
 
     def get_page(self) -> List[dict]:
@@ -1377,6 +1438,8 @@ class PlexMediaCover(_PluginBase):
     def __update_all_libraries(self):
         """
         更新所有媒体库封面
+
+        各媒体库在 I/O 线程中获取媒体项、下载图片及上传封面，渲染提交到进程池中并行执行
         """
         if not self._enabled:
             return
@@ -1384,42 +1447,87 @@ class PlexMediaCover(_PluginBase):
         if not self._servers:
             return
         self.__get_fonts()  
+        cover_style = {
+            "single_1": "单图 1",
+            "single_2": "单图 2",
+            "multi_1": "多图 1"
+        }[self._cover_style]
+        logger.info(f"当前风格 {cover_style}")
+        # 同名媒体库共用图片目录，分为一组依次更新
+        groups = defaultdict(list)
         for server, service in self._servers.items():
             # 扫描所有媒体库
             logger.info(f"当前服务器 {server}")
-            cover_style = {
-                "single_1": "单图 1",
-                "single_2": "单图 2",
-                "multi_1": "多图 1"
-            }[self._cover_style]
-            logger.info(f"当前风格 {cover_style}")
             # 获取媒体库列表
             libraries = self.__get_server_libraries(service)
             if not libraries:
                 logger.warning(f"服务器 {server} 的媒体库列表获取失败")
                 continue
             for library in libraries:
-                if self._event.is_set():
-                    logger.info("媒体库封面更新服务停止")
-                    return
                 if service.type == 'emby':
                     library_id = library.get("Id")
                 elif service.type == 'plex':
                     library_id = library.get("key")
                 else:
                     library_id = library.get("ItemId")
+                library_name = library.get('title') if service.type == 'plex' else library.get('Name')
                 if f"{server}-{library_id}" in self._exclude_libraries:
-                    logger.info(f"媒体库 {server}：{library['Name']} 已忽略，跳过更新封面")
+                    logger.info(f"媒体库 {server}：{library_name} 已忽略，跳过更新封面")
                     continue
-                if self.__update_library(service, library):
-                    logger.info(f"媒体库 {server}：{library['Name']} 封面更新成功")
-                else:
-                    logger.warning(f"媒体库 {server}：{library['Name']} 封面更新失败")
+                groups[library_name].append((server, service, library))
+        if not groups:
+            return
+
+        try:
+            render_workers = int(self._render_workers or 1)
+            render_max_tasks = int(self._render_max_tasks or 0)
+        except (TypeError, ValueError):
+            render_workers, render_max_tasks = 1, 0
+        render_run = RenderRun(create_render_pool(render_workers, max_tasks_per_worker=render_max_tasks or None))
+        with self._render_runs_lock:
+            self._render_runs.add(render_run)
+        try:
+            # 下载及上传等待 I/O 时进程池可渲染其他媒体库，线程数多于进程数
+            with ThreadPoolExecutor(max_workers=min(len(groups), max(render_workers, 1) * 2),
+                                    thread_name_prefix="plexmediacover") as executor:
+                futures = [executor.submit(self.__update_library_group, group, render_run)
+                           for group in groups.values()]
+                for future in as_completed(futures):
+                    future.result()
+        finally:
+            with self._render_runs_lock:
+                self._render_runs.discard(render_run)
+            render_run.close()
+        if render_run.stopped or self._event.is_set():
+            logger.info("媒体库封面更新服务停止")
+            return
         logger.info("所有媒体库封面更新完成")
-                 
 
-    def __update_library(self, service, library):
+    def __update_library_group(self, group, render_run):
+        """
+        依次更新一组同名媒体库的封面
+        """
+        for server, service, library in group:
+            if render_run.stopped or self._event.is_set():
+                return
+            library_name = library.get('title') if service.type == 'plex' else library.get('Name')
+            try:
+                if self.__update_library(service, library, render_run):
+                    logger.info(f"媒体库 {server}：{library_name} 封面更新成功")
+                else:
+                    logger.warning(f"媒体库 {server}：{library_name} 封面更新失败")
+            except Exception as err:
+                logger.error(f"媒体库 {server}：{library_name} 封面更新失败：{str(err)}")
+
+    def __update_library(self, service, library, render_run=None):
+        """
+        更新媒体库封面
+
+        render_run: 更新全部媒体库时本次运行的渲染上下文，为空时在当前进程中渲染
+        """
         library_name = library['Name']
+        if render_run and render_run.stopped:
+            return False
         logger.info(f"媒体库 {service.name}：{library_name} 开始准备更新封面")
         # 自定义图像路径
         image_path = self.__check_custom_image(library_name)
@@ -1427,12 +1535,33 @@ class PlexMediaCover(_PluginBase):
         title = self.__get_library_title_from_yaml(library_name)
         if image_path:
             logger.info(f"媒体库 {service.name}：{library_name} 从自定义路径获取封面")
-            image_data = self.__generate_image_from_path(service.name, library_name, title, image_path[0])
+            image_data = self.__generate_image_from_path(service.name, library_name, title, image_path[0],
+                                                         render_run=render_run)
         else:
-            image_data = self.__generate_from_server(service, library, title)
+            image_data = self.__generate_from_server(service, library, title, render_run)
 
         if image_data:
-            return self.__set_library_image(service, library, image_data)
+            # 与上次上传的封面一致时无需重新上传
+            if service.type == 'emby':
+                library_id = library.get("Id")
+            elif service.type == 'plex':
+                library_id = library.get("key")
+            else:
+                library_id = library.get("ItemId")
+            library_key = f"{service.name}-{library_id}"
+            digest = RenderCache.output_digest(image_data)
+            with self._uploaded_lock:
+                uploaded = self.get_data('uploaded_covers') or {}
+            if uploaded.get(library_key) == digest:
+                logger.info(f"媒体库 {service.name}：{library_name} 封面未变化，跳过上传")
+                return True
+            if not self.__set_library_image(service, library, image_data):
+                return False
+            with self._uploaded_lock:
+                uploaded = self.get_data('uploaded_covers') or {}
+                uploaded[library_key] = digest
+                self.save_data('uploaded_covers', uploaded)
+            return True
 
     def __check_custom_image(self, library_name):
         if not self._covers_input:
@@ -1450,7 +1579,15 @@ class PlexMediaCover(_PluginBase):
         
         return images if images else None  # 或改为 return images if images else False
 
-    def __generate_image_from_path(self, server, library_name, title, image_path=None):
+    def __generate_image_from_path(self, server, library_name, title, image_path=None, source_dir=None,
+                                   render_run=None):
+        """
+        生成封面图
+
+        image_path: 单图风格的源图片路径或图片内容
+        source_dir: 多图风格的源图片目录，为空时使用自定义图片目录或下载目录
+        render_run: 更新全部媒体库时本次运行的渲染上下文，为空时在当前进程中渲染
+        """
         logger.info(f"媒体库 {server}：{library_name} 正在生成封面图...")
         font_path = (str(self._zh_font_path), str(self._en_font_path))
 
@@ -1464,34 +1601,80 @@ class PlexMediaCover(_PluginBase):
         color_ratio_multi_1 = self._color_ratio_multi_1 or 0.8
         font_size = (float(zh_font_size), float(en_font_size))
 
-        if self._cover_style == 'single_1':
-            image_data = create_style_single_1(image_path, title, font_path, 
-                                               font_size=font_size, 
-                                               blur_size=blur_size, 
-                                               color_ratio=color_ratio)
-        elif self._cover_style == 'single_2':
-            image_data = create_style_single_2(image_path, title, font_path, 
-                                               font_size=font_size, 
-                                               blur_size=blur_size, 
-                                               color_ratio=color_ratio)
-        elif self._cover_style == 'multi_1':
+        image_data = None
+        if self._cover_style == 'multi_1':
             zh_font_path = self._zh_font_path if self._multi_1_use_main_font else self._zh_font_path_multi_1
             en_font_path = self._en_font_path if self._multi_1_use_main_font else self._en_font_path_multi_1
             font_path = (zh_font_path, en_font_path)
             font_size = (float(zh_font_size_multi_1), float(en_font_size_multi_1))
-            if image_path:
+            blur_size, color_ratio = blur_size_multi_1, color_ratio_multi_1
+            if source_dir:
+                library_dir = Path(source_dir)
+            elif image_path:
                 library_dir = Path(self._covers_input) / library_name
             else:
                 library_dir = Path(self._covers_path) / library_name
-            if self.prepare_library_images(library_dir):
-                image_data = create_style_multi_1(library_dir, title, font_path, 
-                                                  font_size=font_size, 
-                                                  is_blur=self._multi_1_blur, 
-                                                  blur_size=blur_size_multi_1, 
-                                                  color_ratio=color_ratio_multi_1)
+            if not self.prepare_library_images(library_dir):
+                return image_data
+            # 九宫格使用目录下的 1-9 号图片
+            source_paths = sorted(
+                str(library_dir / f) for f in os.listdir(library_dir)
+                if re.match(r"^[1-9]\.(jpg|jpeg|png|bmp|gif|webp)$", f, re.IGNORECASE)
+            )
+            if source_dir:
+                # 临时目录中的图片按内容计算缓存键
+                source_paths = [Path(path).read_bytes() for path in source_paths]
+        else:
+            source_paths = [image_path]
+
+        # 渲染输入不变时直接使用缓存的封面
+        cache_key = self._render_cache.make_key(
+            style=self._cover_style,
+            title=title,
+            font_paths=font_path,
+            image_paths=source_paths,
+            params={
+                "version": self.plugin_version,
+                "font_size": font_size,
+                "blur_size": blur_size,
+                "color_ratio": color_ratio,
+                "multi_1_blur": bool(self._multi_1_blur) if self._cover_style == 'multi_1' else None,
+            }
+        )
+        image_data = self._render_cache.get(cache_key)
+        if image_data:
+            logger.info(f"媒体库 {server}：{library_name} 封面输入未变化，使用缓存的封面图")
+            return image_data
+
+        render_args = {
+            "style": self._cover_style,
+            "title": title,
+            "font_path": font_path,
+            "font_size": font_size,
+            "blur_size": blur_size,
+            "color_ratio": color_ratio,
+            "seed": cache_key,
+            "image_path": image_path,
+            "library_dir": str(library_dir) if self._cover_style == 'multi_1' else None,
+            "is_blur": bool(self._multi_1_blur),
+        }
+        # 更新全部媒体库时在本次运行的进程池中渲染，当前线程等待渲染结果
+        if render_run:
+            try:
+                image_data = render_run.render(**render_args)
+            except RenderStopped:
+                logger.info(f"媒体库 {server}：{library_name} 封面更新服务停止，取消渲染")
+                return None
+            except Exception as e:
+                logger.warning(f"媒体库 {server}：{library_name} 在进程池中渲染封面失败，改为在当前进程中渲染：{str(e)}")
+                image_data = render_cover(**render_args)
+        else:
+            image_data = render_cover(**render_args)
+        if image_data:
+            self._render_cache.put(cache_key, image_data)
         return image_data
     
-    def __generate_from_server(self, service, library, title):
+    def __generate_from_server(self, service, library, title, render_run=None):
 
         logger.info(f"媒体库 {service.name}：{library['Name']} 开始筛选媒体项")
         required_items = 1 if self._cover_style.startswith('single') else 9
@@ -1513,9 +1696,9 @@ class PlexMediaCover(_PluginBase):
         
         # 处理合集类型的特殊情况
         if library_type == "boxsets":
-            return self.__handle_boxset_library(service, library, title)
+            return self.__handle_boxset_library(service, library, title, render_run)
         elif library_type == "playlists":
-            return self.__handle_playlist_library(service, library, title)
+            return self.__handle_playlist_library(service, library, title, render_run)
         elif library_type == "music":
             include_types = 'MusicAlbum,Audio'
         else:
@@ -1546,14 +1729,14 @@ class PlexMediaCover(_PluginBase):
         # 使用获取到的有效项目更新封面
         if len(items) > 0:
             if self._cover_style.startswith('single'):
-                return self.__update_single_image(service, library, title, items[0])
+                return self.__update_single_image(service, library, title, items[0], render_run)
             else:
-                return self.__update_grid_image(service, library, title, items[:9])
+                return self.__update_grid_image(service, library, title, items[:9], render_run)
         else:
             print(f"媒体库 {service.name}：{library['Name']} 无法找到有效的图片项目")
             return False
         
-    def __handle_boxset_library(self, service, library, title):
+    def __handle_boxset_library(self, service, library, title, render_run=None):
 
         include_types = 'BoxSet,Movie'
         if service.type == 'emby':
@@ -1591,14 +1774,14 @@ class PlexMediaCover(_PluginBase):
         # 使用获取到的有效项目更新封面
         if len(valid_items) > 0:
             if self._cover_style.startswith('single'):
-                return self.__update_single_image(service, library, title, valid_items[0])
+                return self.__update_single_image(service, library, title, valid_items[0], render_run)
             else:
-                return self.__update_grid_image(service, library, title, valid_items[:9])
+                return self.__update_grid_image(service, library, title, valid_items[:9], render_run)
         else:
             print(f"媒体库 {service.name}：{library['Name']} 无法找到有效的图片项目")
             return False
         
-    def __handle_playlist_library(self, service, library, title):
+    def __handle_playlist_library(self, service, library, title, render_run=None):
         """ 
         播放列表图片获取 
         """
@@ -1638,9 +1821,9 @@ class PlexMediaCover(_PluginBase):
         # 使用获取到的有效项目更新封面
         if len(valid_items) > 0:
             if self._cover_style.startswith('single'):
-                return self.__update_single_image(service, library, title, valid_items[0])
+                return self.__update_single_image(service, library, title, valid_items[0], render_run)
             else:
-                return self.__update_grid_image(service, library, title, valid_items[:9])
+                return self.__update_grid_image(service, library, title, valid_items[:9], render_run)
         else:
             print(f"警告: 无法为播放列表 {service.name}：{library['Name']} 找到有效的图片项目")
             return False
@@ -1744,7 +1927,7 @@ class PlexMediaCover(_PluginBase):
         return valid_items
 
     
-    def __update_single_image(self, service, library, title, item):
+    def __update_single_image(self, service, library, title, item, render_run=None):
         """更新单图封面"""
         library_name = library.get('title') if service.type == 'plex' else library.get('Name')
         logger.info(f"媒体库 {service.name}：{library_name} 从媒体项获取图片")
@@ -1753,11 +1936,13 @@ class PlexMediaCover(_PluginBase):
         if not image_url:
             return False
             
-        image_path = self.__download_image(service, image_url, library_name, count=1)
-        if not image_path:
+        # 单图风格直接使用内存中的图片，无需写入文件
+        image_content = self._downloader.download(lambda url: self.__fetch_image(service, url), image_url)
+        if not image_content:
             return False
         updated_item_id = self.__get_item_id(item)
-        image_data = self.__generate_image_from_path(service.name, library_name, title, image_path)
+        image_data = self.__generate_image_from_path(service.name, library_name, title, image_content,
+                                                     render_run=render_run)
             
         if not image_data:
             return False
@@ -1776,29 +1961,39 @@ class PlexMediaCover(_PluginBase):
 
         return image_data
     
-    def __update_grid_image(self, service, library, title, items):
+    def __update_grid_image(self, service, library, title, items, render_run=None):
         """更新九宫格封面"""
         library_name = library.get('title') if service.type == 'plex' else library.get('Name')
         logger.info(f"媒体库 {service.name}：{library_name} 从媒体项获取图片")
 
-        image_paths = []
-        
-        updated_item_ids = []
+        # 并发下载所有图片，文件名为媒体项的序号 1-9.jpg
+        downloads = []
         for i, item in enumerate(items[:9]):
             image_url = self.__get_image_url(item)
             if image_url:
-                image_path = self.__download_image(service, image_url, library_name, count=i+1)
-                if image_path:
-                    image_paths.append(image_path)
-                    updated_item_ids.append(self.__get_item_id(item))
+                downloads.append((f"{i+1}.jpg", image_url, item))
+        contents = self._downloader.download_all(lambda url: self.__fetch_image(service, url),
+                                                 [image_url for _, image_url, _ in downloads])
+
+        image_files = {}
+        updated_item_ids = []
+        for (filename, _, item), content in zip(downloads, contents):
+            if content:
+                image_files[filename] = content
+                updated_item_ids.append(self.__get_item_id(item))
         
-        if len(image_paths) < 1:
+        if len(image_files) < 1:
             return False
             
-        # 生成九宫格图片
-        image_data = self.__generate_image_from_path(service.name, library_name, title)
-        if not image_data:
-            return False
+        # 在本次任务独立的临时目录中生成九宫格图片，完成后再替换媒体库目录中的图片
+        library_dir = os.path.join(self._covers_path, library_name)
+        with ImageDownloader.job_dir(self._covers_path, prefix=f".{library_name}-") as job_dir:
+            ImageDownloader.write_files(job_dir, image_files)
+            image_data = self.__generate_image_from_path(service.name, library_name, title, source_dir=job_dir,
+                                                         render_run=render_run)
+            if not image_data:
+                return False
+            ImageDownloader.publish(job_dir, library_dir, [f"{i}.jpg" for i in range(1, 10)])
         if service.type == 'emby':
             library_id = library.get("Id")
         elif service.type == 'plex':
@@ -2074,62 +2269,19 @@ class PlexMediaCover(_PluginBase):
             logger.error(f"获取Plex图片URL失败: {str(e)}")
             return None
 
-    def __download_image(self, service, imageurl, library_name, count=None, retries=3, delay=1):
+    def __fetch_image(self, service, imageurl):
         """
-        下载图片，保存到本地目录 self._covers_path/library_name/ 下，文件名为 1-9.jpg
-        若已存在则跳过下载，直接返回图片路径。
-        下载失败时重试若干次。
+        下载图片，返回图片内容，失败时返回 None；重试由 ImageDownloader 负责
         """
-        try:
-            # 创建目标子目录
-            subdir = os.path.join(self._covers_path, library_name)
-            os.makedirs(subdir, exist_ok=True)
-
-            # 文件命名：item_id 为主，适合排序
-            if count is not None:
-                filename = f"{count}.jpg"
-            else:
-                filename = f"img_{int(time.time())}.jpg"
-
-            filepath = os.path.join(subdir, filename)
-
-            # 如果文件已存在，直接返回路径
-            # if os.path.exists(filepath):
-            #     return filepath
-
-            # 重试机制
-            for attempt in range(1, retries + 1):
-                image_content = None
-
-                if '[HOST]' in imageurl:
-                    if not service:
-                        return None
-
-                    r = service.instance.get_data(url=imageurl)
-                    if r and r.status_code == 200:
-                        image_content = r.content
-                else:
-                    r = RequestUtils().get_res(url=imageurl)
-                    if r and r.status_code == 200:
-                        image_content = r.content
-
-                # 如果成功，保存并返回
-                if image_content:
-                    with open(filepath, 'wb') as f:
-                        f.write(image_content)
-                    return filepath
-
-                # 如果失败，记录并等待后重试
-                logger.warning(f"第 {attempt} 次尝试下载失败：{imageurl}")
-                if attempt < retries:
-                    time.sleep(delay)
-
-            logger.error(f"图片下载失败（重试 {retries} 次）：{imageurl}")
-            return None
-
-        except Exception as err:
-            logger.error(f"下载图片异常：{str(err)}")
-            return None
+        if '[HOST]' in imageurl:
+            if not service:
+                return None
+            r = service.instance.get_data(url=imageurl)
+        else:
+            r = RequestUtils().get_res(url=imageurl)
+        if r and r.status_code == 200:
+            return r.content
+        return None
 
 
     def __save_image_to_local(self, image_content, filename):
@@ -2252,43 +2404,45 @@ class PlexMediaCover(_PluginBase):
             "timestamp": now
         }
 
-        # 原始数据
-        history = self.get_data('cover_history') or []
+        # 多个媒体库并行更新时，避免覆盖其他线程写入的记录
+        with self._history_lock:
+            # 原始数据
+            history = self.get_data('cover_history') or []
 
-        # 用于分组管理：(server, library_id) => list of items
-        grouped = defaultdict(list)
-        for item in history:
-            key = (item["server"], str(item["library_id"]))
-            grouped[key].append(item)
+            # 用于分组管理：(server, library_id) => list of items
+            grouped = defaultdict(list)
+            for item in history:
+                key = (item["server"], str(item["library_id"]))
+                grouped[key].append(item)
 
-        key = (server, library_id)
-        items = grouped[key]
+            key = (server, library_id)
+            items = grouped[key]
 
-        # 查找是否已有该 item_id
-        existing = next((i for i in items if str(i["item_id"]) == item_id), None)
+            # 查找是否已有该 item_id
+            existing = next((i for i in items if str(i["item_id"]) == item_id), None)
 
-        if existing:
-            # 若已存在且是最新的，跳过
-            if existing["timestamp"] >= max(i["timestamp"] for i in items):
-                return
+            if existing:
+                # 若已存在且是最新的，跳过
+                if existing["timestamp"] >= max(i["timestamp"] for i in items):
+                    return
+                else:
+                    existing["timestamp"] = now
             else:
-                existing["timestamp"] = now
-        else:
-            items.append(history_item)
+                items.append(history_item)
 
-        # 排序 + 截取前9
-        grouped[key] = sorted(items, key=lambda x: x["timestamp"], reverse=True)[:9]
+            # 排序 + 截取前9
+            grouped[key] = sorted(items, key=lambda x: x["timestamp"], reverse=True)[:9]
 
-        # 重新整合所有分组的数据
-        new_history = []
-        for item_list in grouped.values():
-            new_history.extend(item_list)
+            # 重新整合所有分组的数据
+            new_history = []
+            for item_list in grouped.values():
+                new_history.extend(item_list)
 
-        self.save_data('cover_history', new_history)
-        return [ 
-            item for item in new_history
-            if str(item.get("library_id")) == str(library_id)
-        ]
+            self.save_data('cover_history', new_history)
+            return [ 
+                item for item in new_history
+                if str(item.get("library_id")) == str(library_id)
+            ]
 
     def prepare_library_images(self, library_dir: str):
         """
@@ -3422,6 +3576,11 @@ class PlexMediaCover(_PluginBase):
         停止服务
         """
         try:
+            # 通知正在进行的更新停止并取消排队中的渲染，定时服务触发的更新不会被调度器等待
+            with self._render_runs_lock:
+                render_runs = list(self._render_runs)
+            for render_run in render_runs:
+                render_run.stop()
             if self._scheduler:
                 self._scheduler.remove_all_jobs()
                 if self._scheduler.running:
@@ -3429,5 +3588,7 @@ class PlexMediaCover(_PluginBase):
                     self._scheduler.shutdown()
                     self._event.clear()
                 self._scheduler = None
+            if self._downloader:
+                self._downloader.shutdown()
         except Exception as e:
             logger.error(f"停止服务失败: {str(e)}")
\ No newline at end of file
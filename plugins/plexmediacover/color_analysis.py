@@ -0,0 +1,309 @@
+"""
+图片颜色分析
+
+将缩小后的图片量化到固定大小的三维颜色直方图中统计主要颜色，
+黑白灰及透明像素的过滤在数组上一次完成，结果按缩小后图片（或图片文件）内容的哈希缓存，各封面风格共用
+"""
+import colorsys
+import functools
+import hashlib
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+# 每个通道量化保留的位数，直方图共 2^(3*QUANT_BITS) 个颜色区间
+QUANT_BITS = 5
+# 缓存的分析结果数量
+CACHE_SIZE = 64
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def image_digest(image):
+    """计算图片像素内容的哈希，用作分析结果的缓存键，大图应先缩小再计算"""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(f"{image.mode}:{image.size}".encode())
+    digest.update(image.tobytes())
+    return digest.hexdigest()
+
+
+def file_digest(path):
+    """计算图片文件内容的哈希，用作分析结果的缓存键，命中时无需解码图片"""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _cached(key, compute):
+    """按键缓存分析结果，缓存满时淘汰最久未使用的结果"""
+    with _cache_lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return _cache[key]
+    result = compute()
+    with _cache_lock:
+        _cache[key] = result
+        _cache.move_to_end(key)
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return result
+
+
+def clear_cache():
+    """清空分析结果缓存"""
+    with _cache_lock:
+        _cache.clear()
+
+
+def downsample(image, max_size):
+    """
+    按比例缩小图片，使宽高不超过 max_size，与 Image.thumbnail 一致但不修改原图
+
+    参数:
+        image: PIL.Image对象
+        max_size: 最大宽高 (width, height)
+
+    返回:
+        缩小后的图片，原图足够小时返回原图
+    """
+    width, height = image.size
+    scale = min(max_size[0] / width, max_size[1] / height)
+    if scale >= 1:
+        return image
+    size = (max(1, round(width * scale)), max(1, round(height * scale)))
+    return image.resize(size, Image.BICUBIC, reducing_gap=2.0)
+
+
+def colorful_mask(rgb, threshold=20, gray_diff_threshold=10):
+    """
+    过滤黑、白、灰以及接近黑、白的像素，与逐像素判断的 is_not_black_white_gray_near 一致
+
+    参数:
+        rgb: 形状为 (N, 3) 的像素数组
+        threshold: 接近黑、白的阈值
+        gray_diff_threshold: 各通道差值都小于该值时视为灰色
+
+    返回:
+        形状为 (N,) 的布尔数组，True 表示保留的像素
+    """
+    rgb = rgb.astype(np.int16)
+    near_black = (rgb < threshold).all(axis=1)
+    near_white = (rgb > 255 - threshold).all(axis=1)
+    r, g, b = rgb[:, 0], rgb[:, 1], rgb[:, 2]
+    gray = ((np.abs(r - g) < gray_diff_threshold) & (np.abs(g - b) < gray_diff_threshold)
+            & (np.abs(r - b) < gray_diff_threshold))
+    return ~(near_black | near_white | gray)
+
+
+def histogram_colors(rgb, limit):
+    """
+    将像素量化到三维颜色直方图中，返回出现次数最多的颜色区间
+
+    参数:
+        rgb: 形状为 (N, 3) 的 uint8 像素数组
+        limit: 返回的颜色数量上限
+
+    返回:
+        [((r, g, b), count), ...]，按出现次数从高到低排序，颜色为区间内像素的平均值
+    """
+    if not len(rgb) or limit <= 0:
+        return []
+    shift = 8 - QUANT_BITS
+    quantized = (rgb >> shift).astype(np.int32)
+    bins = (quantized[:, 0] << (2 * QUANT_BITS)) | (quantized[:, 1] << QUANT_BITS) | quantized[:, 2]
+    size = 1 << (3 * QUANT_BITS)
+    counts = np.bincount(bins, minlength=size)
+    sums = np.stack([np.bincount(bins, weights=rgb[:, channel], minlength=size) for channel in range(3)], axis=1)
+
+    occupied = np.flatnonzero(counts)
+    # 出现次数相同时按区间编号排序，保证结果稳定
+    order = occupied[np.lexsort((occupied, -counts[occupied]))][:limit]
+    means = np.rint(sums[order] / counts[order, None]).astype(int)
+    return [(tuple(int(v) for v in color), int(count)) for color, count in zip(means, counts[order])]
+
+
+def rgb_to_hsv_array(colors):
+    """
+    批量将 RGB 颜色转换为 HSV 颜色，结果与 colorsys.rgb_to_hsv 一致
+
+    参数:
+        colors: 形状为 (N, 3) 的 RGB 数组，取值 0~255
+
+    返回:
+        形状为 (N, 3) 的 HSV 数组，取值 0~1
+    """
+    rgb = np.asarray(colors, dtype=np.float64).reshape(-1, 3) / 255.0
+    maxc = rgb.max(axis=1)
+    minc = rgb.min(axis=1)
+    delta = maxc - minc
+    safe_delta = np.where(delta == 0, 1.0, delta)
+    r, g, b = rgb[:, 0], rgb[:, 1], rgb[:, 2]
+    rc, gc, bc = (maxc - r) / safe_delta, (maxc - g) / safe_delta, (maxc - b) / safe_delta
+    h = np.where(r == maxc, bc - gc, np.where(g == maxc, 2.0 + rc - bc, 4.0 + gc - rc))
+    h = np.where(delta == 0, 0.0, (h / 6.0) % 1.0)
+    s = np.where(maxc == 0, 0.0, delta / np.where(maxc == 0, 1.0, maxc))
+    return np.stack([h, s, maxc], axis=1)
+
+
+def hsv_distance(hsv, target):
+    """
+    批量计算颜色与目标颜色在 HSV 空间中的距离，色调在环形空间中取较近的一侧，权重为饱和度、亮度的 5 倍
+
+    参数:
+        hsv: 形状为 (N, 3) 的 HSV 数组
+        target: 目标颜色的 (h, s, v)
+
+    返回:
+        形状为 (N,) 的距离数组
+    """
+    hsv = np.asarray(hsv, dtype=np.float64).reshape(-1, 3)
+    h, s, v = target
+    hue_diff = np.abs(hsv[:, 0] - h)
+    return np.minimum(hue_diff, 1 - hue_diff) * 5 + np.abs(hsv[:, 1] - s) + np.abs(hsv[:, 2] - v)
+
+
+def color_distance(color1, color2):
+    """计算两个 RGB 颜色在 HSV 空间中的距离，给予色调更高的权重"""
+    hsv = rgb_to_hsv_array([color1, color2])
+    return float(hsv_distance(hsv[:1], hsv[1])[0])
+
+
+def _hsv_to_rgb(h, s, v):
+    r, g, b = colorsys.hsv_to_rgb(h, s, v)
+    return (int(r * 255), int(g * 255), int(b * 255))
+
+
+def _colorful_candidates(img, limit):
+    """过滤缩小后图片中的黑白灰像素，返回出现次数最多的颜色及其 HSV 值"""
+    rgb = np.asarray(img, dtype=np.uint8).reshape(-1, 3)
+    candidates = histogram_colors(rgb[colorful_mask(rgb)], limit)
+    hsv = rgb_to_hsv_array([color for color, _ in candidates]) if candidates else np.empty((0, 3))
+    return candidates, hsv
+
+
+def find_vibrant_colors(image, num_colors=5, max_size=(100, 100),
+                        saturation_range=(0.2, 0.7), value_range=(0.55, 0.85), min_hue_distance=15):
+    """
+    从图像中提取出现次数较多的前 N 种非黑非白非灰的颜色，并将其调整到接近马卡龙色系，
+    色调相差小于 min_hue_distance 度的颜色只保留一种
+
+    参数:
+        image: PIL.Image对象
+        num_colors: 颜色数量
+        max_size: 分析前缩小到的最大宽高
+        saturation_range: 调整后的饱和度范围
+        value_range: 调整后的亮度范围
+        min_hue_distance: 色调去重的最小间隔（度）
+
+    返回:
+        RGB 颜色列表
+    """
+    img = downsample(image, max_size).convert("RGB")
+
+    def compute():
+        candidates, hsv = _colorful_candidates(img, num_colors * 3)
+        hsv[:, 1] = np.clip(hsv[:, 1], *saturation_range)
+        hsv[:, 2] = np.clip(hsv[:, 2], *value_range)
+        hue_degrees = (hsv[:, 0] * 360).astype(int)
+
+        colors = []
+        seen_hues = []
+        for (h, s, v), hue_degree in zip(hsv, hue_degrees):
+            adjusted_rgb = _hsv_to_rgb(h, s, v)
+            if any(abs(hue_degree - seen) < min_hue_distance for seen in seen_hues) or adjusted_rgb in colors:
+                continue
+            colors.append(adjusted_rgb)
+            seen_hues.append(hue_degree)
+            if len(colors) >= num_colors:
+                break
+        return colors
+
+    key = ("vibrant", image_digest(img), num_colors, max_size, saturation_range, value_range, min_hue_distance)
+    return list(_cached(key, compute))
+
+
+def find_macaron_colors(image, num_colors=5, max_size=(150, 150),
+                        saturation_range=(0.3, 0.7), value_range=(0.6, 0.85), min_color_distance=0.15):
+    """
+    从图像中提取主要颜色并调整为马卡龙风格，调整后在 HSV 空间中距离小于 min_color_distance 的颜色只保留一种
+
+    参数:
+        image: PIL.Image对象
+        num_colors: 颜色数量
+        max_size: 分析前缩小到的最大宽高
+        saturation_range: 调整后的饱和度范围
+        value_range: 调整后的亮度范围
+        min_color_distance: 颜色差异阈值，色调的权重为饱和度、亮度的 5 倍
+
+    返回:
+        RGB 颜色列表
+    """
+    img = downsample(image, max_size).convert("RGB")
+
+    def compute():
+        candidates, hsv = _colorful_candidates(img, num_colors * 5)
+        hsv[:, 1] = np.clip(hsv[:, 1], *saturation_range)
+        hsv[:, 2] = np.clip(hsv[:, 2], *value_range)
+        adjusted = [_hsv_to_rgb(h, s, v) for h, s, v in hsv]
+        # 按调整后的 RGB 计算距离，与调整后的颜色一致
+        adjusted_hsv = rgb_to_hsv_array(adjusted) if adjusted else np.empty((0, 3))
+
+        colors = []
+        selected = []
+        for index, (color, hsv_color) in enumerate(zip(adjusted, adjusted_hsv)):
+            if selected and (hsv_distance(adjusted_hsv[selected], hsv_color) < min_color_distance).any():
+                continue
+            selected.append(index)
+            colors.append(color)
+            if len(colors) >= num_colors:
+                break
+        return colors
+
+    key = ("macaron", image_digest(img), num_colors, max_size, saturation_range, value_range, min_color_distance)
+    return list(_cached(key, compute))
+
+
+def find_primary_colors(image, num_colors=10, size=(100, 150), min_alpha=200, brightness_range=(30, 220),
+                        fallback_alpha=100):
+    """
+    分析图片并提取主色调，过滤透明度低以及过暗或过亮的像素，过滤后没有像素时使用所有不透明的像素
+
+    参数:
+        image: PIL.Image对象或图片文件路径，传入路径时按文件内容缓存，命中时无需解码图片
+        num_colors: 颜色数量
+        size: 分析前缩放到的尺寸
+        min_alpha: 像素的最小透明度
+        brightness_range: 像素的亮度范围（三个通道的平均值）
+        fallback_alpha: 没有符合条件的像素时，像素的最小透明度（不含）
+
+    返回:
+        [((r, g, b, 255), count), ...]，按出现次数从高到低排序，没有像素时返回空列表
+    """
+    def compute(img=None):
+        if img is None:
+            with Image.open(image) as source:
+                img = source.resize(size, Image.LANCZOS)
+        if img.mode != "RGBA":
+            img = img.convert("RGBA")
+        rgba = np.asarray(img, dtype=np.uint8).reshape(-1, 4)
+        rgb, alpha = rgba[:, :3], rgba[:, 3]
+        brightness = rgb.astype(np.int32).sum(axis=1) / 3
+        mask = (alpha >= min_alpha) & (brightness >= brightness_range[0]) & (brightness <= brightness_range[1])
+        if not mask.any():
+            mask = alpha > fallback_alpha
+        return [(color + (255,), count) for color, count in histogram_colors(rgb[mask], num_colors)]
+
+    params = (num_colors, size, min_alpha, brightness_range, fallback_alpha)
+    if isinstance(image, (str, Path)):
+        key = ("primary_file", file_digest(image)) + params
+    else:
+        resized = image.resize(size, Image.LANCZOS)
+        key = ("primary", image_digest(resized)) + params
+        compute = functools.partial(compute, resized)
+    return list(_cached(key, compute))
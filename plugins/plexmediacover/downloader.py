@@ -0,0 +1,147 @@
+"""
+封面源图片下载
+
+多张图片在有上限的线程池中并发下载，九宫格封面的下载耗时约等于单张图片；
+每次生成封面使用独立的临时目录，完成后再重命名到媒体库目录，同一媒体库的任务重叠时不会互相覆盖图片
+"""
+import contextlib
+import os
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app.log import logger
+
+
+class ImageDownloader:
+    """
+    图片下载器，所有任务共用一个线程池，同时进行的下载数量不超过 max_workers
+    """
+
+    def __init__(self, max_workers=9, retries=3, delay=1):
+        """
+        参数:
+            max_workers: 同时下载的图片数量上限
+            retries: 每张图片的尝试次数
+            delay: 重试前等待的秒数
+        """
+        self.max_workers = max_workers
+        self.retries = retries
+        self.delay = delay
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def __get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                    thread_name_prefix="plexmediacover-download")
+            return self._executor
+
+    def download(self, fetch, url):
+        """
+        下载单张图片，失败时重试
+
+        参数:
+            fetch: 下载函数，参数为图片地址，返回图片内容，失败时返回 None
+            url: 图片地址
+
+        返回:
+            图片内容，重试后仍失败时返回 None
+        """
+        for attempt in range(1, self.retries + 1):
+            try:
+                content = fetch(url)
+            except Exception as err:
+                logger.warning(f"第 {attempt} 次尝试下载异常：{url}，{str(err)}")
+                content = None
+            if content:
+                return content
+            logger.warning(f"第 {attempt} 次尝试下载失败：{url}")
+            if attempt < self.retries:
+                time.sleep(self.delay)
+        logger.error(f"图片下载失败（重试 {self.retries} 次）：{url}")
+        return None
+
+    def download_all(self, fetch, urls):
+        """
+        并发下载多张图片，结果保存在内存中
+
+        参数:
+            fetch: 下载函数，参数为图片地址，返回图片内容，失败时返回 None
+            urls: 图片地址列表
+
+        返回:
+            与 urls 顺序一致的图片内容列表，下载失败的位置为 None
+        """
+        if not urls:
+            return []
+        if len(urls) == 1:
+            return [self.download(fetch, urls[0])]
+        executor = self.__get_executor()
+        futures = [executor.submit(self.download, fetch, url) for url in urls]
+        return [future.result() for future in futures]
+
+    def shutdown(self):
+        """关闭线程池，未开始的下载将被取消"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    @staticmethod
+    @contextlib.contextmanager
+    def job_dir(parent_dir, prefix):
+        """
+        创建本次任务独立使用的临时目录，结束后删除
+
+        参数:
+            parent_dir: 临时目录所在的目录，应与目标目录位于同一文件系统，以便重命名
+            prefix: 临时目录名称前缀
+        """
+        os.makedirs(parent_dir, exist_ok=True)
+        path = tempfile.mkdtemp(dir=parent_dir, prefix=prefix)
+        try:
+            yield path
+        finally:
+            shutil.rmtree(path, ignore_errors=True)
+
+    @staticmethod
+    def write_files(directory, contents):
+        """
+        将图片写入目录，先写入临时文件再重命名，写入过程中目录中不会出现不完整的图片
+
+        参数:
+            directory: 目标目录
+            contents: {文件名: 图片内容}
+        """
+        os.makedirs(directory, exist_ok=True)
+        for filename, content in contents.items():
+            target = os.path.join(directory, filename)
+            fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f".{filename}.", suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    f.write(content)
+                os.replace(tmp_path, target)
+            except Exception:
+                with contextlib.suppress(OSError):
+                    os.unlink(tmp_path)
+                raise
+
+    @staticmethod
+    def publish(source_dir, target_dir, filenames):
+        """
+        将临时目录中的图片逐个重命名到目标目录，替换同名文件；目标目录中始终是完整的图片
+
+        参数:
+            source_dir: 临时目录
+            target_dir: 目标目录，应与临时目录位于同一文件系统
+            filenames: 需要移动的文件名列表
+        """
+        os.makedirs(target_dir, exist_ok=True)
+        for filename in filenames:
+            source = os.path.join(source_dir, filename)
+            if os.path.exists(source):
+                os.replace(source, os.path.join(target_dir, filename))
@@ -0,0 +1,208 @@
+"""
+封面渲染
+
+渲染函数只依赖可序列化的参数，既可在当前进程中调用，也可提交到进程池中执行
+"""
+import io
+import multiprocessing
+import os
+import threading
+from concurrent.futures import CancelledError, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from app.plugins.plexmediacover.render_cache import RenderCache
+from app.plugins.plexmediacover.style_multi_1 import create_style_multi_1
+from app.plugins.plexmediacover.style_single_1 import create_style_single_1
+from app.plugins.plexmediacover.style_single_2 import create_style_single_2
+
+
+def render_cover(style, title, font_path, font_size, blur_size, color_ratio, seed,
+                 image_path=None, library_dir=None, is_blur=False):
+    """
+    渲染封面
+
+    参数:
+        style: 封面风格，single_1、single_2 或 multi_1
+        title: (中文标题, 英文标题)
+        font_path: (中文字体路径, 英文字体路径)
+        font_size: (中文字体大小比例, 英文字体大小比例)
+        blur_size: 背景模糊尺寸
+        color_ratio: 背景颜色混合比例
+        seed: 随机数种子，通常为渲染缓存键，相同输入的渲染结果一致
+        image_path: 单图风格的源图片路径或图片内容
+        library_dir: 多图风格的源图片目录
+        is_blur: 多图风格是否使用模糊背景
+
+    返回:
+        base64 编码的封面，失败时返回 None
+    """
+    if isinstance(image_path, bytes):
+        image_path = io.BytesIO(image_path)
+    with RenderCache.seeded(seed):
+        if style == 'single_1':
+            return create_style_single_1(image_path, title, font_path,
+                                         font_size=font_size,
+                                         blur_size=blur_size,
+                                         color_ratio=color_ratio)
+        if style == 'single_2':
+            return create_style_single_2(image_path, title, font_path,
+                                         font_size=font_size,
+                                         blur_size=blur_size,
+                                         color_ratio=color_ratio)
+        if style == 'multi_1':
+            return create_style_multi_1(library_dir, title, font_path,
+                                        font_size=font_size,
+                                        is_blur=is_blur,
+                                        blur_size=blur_size,
+                                        color_ratio=color_ratio)
+    return None
+
+
+class RenderPool:
+    """
+    渲染进程池
+
+    渲染以 CPU 计算为主，进程池中的渲染不受 GIL 限制；子进程以 spawn 方式启动，避免复制主进程中其他线程持有的锁。
+    提交的任务数量达到 进程数 × max_tasks_per_worker 后，新任务提交到新的进程池，旧进程池完成已提交的任务后退出，
+    释放渲染大图占用的内存（ProcessPoolExecutor 的 max_tasks_per_child 在部分 Python 版本中会导致进程池卡死）。
+    新进程需要重新导入插件包及 MoviePilot 的应用模块，替换进程池会重复这部分耗时，因此默认不替换，
+    启动耗时可使用 benchmarks/plexmediacover/benchmark.py 测量
+    """
+
+    def __init__(self, workers, max_tasks_per_worker=None):
+        """
+        参数:
+            workers: 进程数量
+            max_tasks_per_worker: 每个进程平均处理的任务数量上限，为空时不替换进程池
+        """
+        self.workers = workers
+        self.max_tasks = workers * max_tasks_per_worker if max_tasks_per_worker else None
+        self._lock = threading.Lock()
+        self._executor = None
+        self._retired = []
+        self._submitted = 0
+        self._closed = False
+        # 尚未完成的任务，关闭时取消其中尚未开始的任务
+        self._pending = set()
+
+    def submit(self, fn, *args, **kwargs):
+        """提交任务，返回 Future，进程池关闭后提交时抛出 RuntimeError"""
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("渲染进程池已关闭")
+            if self._executor is None or (self.max_tasks and self._submitted >= self.max_tasks):
+                if self._executor:
+                    # 不等待旧进程池，已提交的任务仍会完成
+                    self._executor.shutdown(wait=False)
+                    self._retired.append(self._executor)
+                self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                     mp_context=multiprocessing.get_context("spawn"))
+                self._submitted = 0
+            self._submitted += 1
+            future = self._executor.submit(fn, *args, **kwargs)
+            self._pending.add(future)
+        # 任务已完成时回调立即在当前线程中执行，需在释放锁后注册
+        future.add_done_callback(self.__forget)
+        return future
+
+    def __forget(self, future):
+        with self._lock:
+            self._pending.discard(future)
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        """
+        关闭所有进程池
+
+        参数:
+            wait: 是否等待已开始的任务完成
+            cancel_futures: 是否取消尚未开始的任务
+        """
+        with self._lock:
+            executors = self._retired + ([self._executor] if self._executor else [])
+            pending = list(self._pending) if cancel_futures else []
+            self._closed = True
+            self._executor = None
+            self._retired = []
+        # 子进程尚未启动时 ProcessPoolExecutor 的 cancel_futures 不会取消排队中的任务，逐个取消
+        for future in pending:
+            future.cancel()
+        for executor in executors:
+            executor.shutdown(wait=wait, cancel_futures=cancel_futures)
+
+
+class RenderRun:
+    """
+    一次更新全部媒体库的渲染上下文，包括本次使用的渲染进程池及停止标志
+
+    每次运行各自创建，停止服务时只需通知正在进行的运行停止，不影响之后新建的运行
+    """
+
+    def __init__(self, pool=None):
+        """
+        参数:
+            pool: 渲染进程池，为空时在当前进程中渲染
+        """
+        self.pool = pool
+        self._stop_event = threading.Event()
+
+    @property
+    def stopped(self):
+        """是否已停止"""
+        return self._stop_event.is_set()
+
+    def stop(self):
+        """停止本次运行，取消排队中的渲染，不等待正在进行的渲染"""
+        self._stop_event.set()
+        if self.pool:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+
+    def close(self):
+        """本次运行结束，关闭进程池"""
+        if self.pool:
+            self.pool.shutdown(wait=True, cancel_futures=True)
+
+    def render(self, **kwargs):
+        """
+        渲染封面，参数与 render_cover 一致
+
+        返回:
+            base64 编码的封面，渲染失败时返回 None
+
+        异常:
+            RenderStopped: 本次运行已停止，渲染被取消
+            其他异常: 进程池渲染失败，调用方可改为在当前进程中渲染
+        """
+        if self.stopped:
+            raise RenderStopped()
+        if not self.pool:
+            return render_cover(**kwargs)
+        try:
+            return self.pool.submit(render_cover, **kwargs).result()
+        except (CancelledError, BrokenProcessPool) as err:
+            # 停止服务时排队中的渲染被取消，进程池随之关闭，不应改为在当前进程中渲染
+            raise RenderStopped() from err
+        except Exception:
+            if self.stopped:
+                raise RenderStopped()
+            raise
+
+
+class RenderStopped(Exception):
+    """本次运行已停止，渲染被取消"""
+
+
+def create_render_pool(workers, max_tasks_per_worker=None):
+    """
+    创建渲染进程池
+
+    参数:
+        workers: 进程数量，不超过 CPU 核心数，小于 2 时不创建进程池
+        max_tasks_per_worker: 每个进程平均处理的任务数量上限，达到后替换为新的进程池
+
+    返回:
+        进程池，无需创建时返回 None，由调用方在当前进程中渲染
+    """
+    workers = min(workers, os.cpu_count() or 1)
+    if workers < 2:
+        return None
+    return RenderPool(workers, max_tasks_per_worker=max_tasks_per_worker)
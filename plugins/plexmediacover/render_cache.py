@@ -0,0 +1,195 @@
+"""
+封面渲染缓存
+
+按渲染输入（源图片、标题、字体、风格参数）的哈希缓存生成的封面，输入不变时直接使用缓存的封面，无需重新渲染；
+渲染时使用由输入哈希生成的随机数种子，相同输入的渲染结果一致；随机数生成器按线程区分，同时渲染的封面互不影响
+"""
+import base64
+import contextlib
+import hashlib
+import json
+import os
+import random
+import threading
+from pathlib import Path
+
+import numpy as np
+
+from app.log import logger
+
+# 当前线程渲染使用的随机数生成器，由 RenderCache.seeded 设置
+_local = threading.local()
+
+
+def get_random():
+    """
+    获取当前线程渲染使用的随机数生成器
+
+    返回:
+        在 RenderCache.seeded 中时返回按缓存键初始化的 random.Random，否则返回 random 模块
+    """
+    return getattr(_local, "random", None) or random
+
+
+def get_np_random():
+    """
+    获取当前线程渲染使用的 numpy 随机数生成器
+
+    返回:
+        在 RenderCache.seeded 中时返回按缓存键初始化的 np.random.RandomState，否则返回 np.random 模块
+    """
+    return getattr(_local, "np_random", None) or np.random
+
+
+class RenderCache:
+    """
+    封面渲染缓存，每个封面保存为缓存目录下以输入哈希命名的文件，超过数量上限时删除最久未使用的文件
+    """
+    # 缓存文件的扩展名
+    suffix = ".cover"
+
+    def __init__(self, cache_dir, max_entries=200):
+        """
+        参数:
+            cache_dir: 缓存目录
+            max_entries: 缓存的封面数量上限
+        """
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        # 文件哈希缓存：路径 -> (修改时间, 大小, 哈希)，字体等大文件无需每次重新计算
+        self._file_digests = {}
+
+    def file_digest(self, path):
+        """
+        计算文件内容的哈希，文件的修改时间和大小不变时使用上次计算的结果
+
+        返回:
+            文件不存在时返回 None
+        """
+        path = str(path)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        with self._lock:
+            cached = self._file_digests.get(path)
+        if cached and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+            return cached[2]
+        digest = hashlib.blake2b(digest_size=20)
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+        hexdigest = digest.hexdigest()
+        with self._lock:
+            self._file_digests[path] = (stat.st_mtime_ns, stat.st_size, hexdigest)
+        return hexdigest
+
+    @staticmethod
+    def content_digest(content):
+        """计算内存中图片内容的哈希，与相同内容文件的 file_digest 一致"""
+        return hashlib.blake2b(content, digest_size=20).hexdigest()
+
+    def make_key(self, style, title, font_paths, image_paths, params=None):
+        """
+        根据渲染输入计算缓存键
+
+        参数:
+            style: 封面风格
+            title: (中文标题, 英文标题)
+            font_paths: 字体文件路径列表
+            image_paths: 源图片路径或内存中的图片内容列表，顺序影响渲染结果
+            params: 其他影响渲染结果的参数，需可序列化为 JSON
+
+        返回:
+            缓存键
+        """
+        inputs = {
+            "style": style,
+            "title": list(title) if title else None,
+            "fonts": [self.file_digest(path) if path else None for path in font_paths],
+            "images": [self.content_digest(image) if isinstance(image, bytes) else self.file_digest(image)
+                       for image in image_paths],
+            "params": params or {},
+        }
+        payload = json.dumps(inputs, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def __path(self, key):
+        return self.cache_dir / f"{key}{self.suffix}"
+
+    def get(self, key):
+        """
+        获取缓存的封面
+
+        返回:
+            base64 编码的封面，未缓存时返回 None
+        """
+        path = self.__path(key)
+        try:
+            data = path.read_bytes()
+        except OSError:
+            return None
+        if not data:
+            return None
+        # 更新修改时间，清理时保留最近使用的封面
+        with contextlib.suppress(OSError):
+            os.utime(path)
+        return base64.b64encode(data).decode("utf-8")
+
+    def put(self, key, image_base64):
+        """
+        缓存封面，先写入临时文件再重命名，中断时不会留下不完整的缓存
+        """
+        path = self.__path(key)
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            tmp_path.write_bytes(base64.b64decode(image_base64))
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logger.warning(f"缓存封面失败：{str(e)}")
+            with contextlib.suppress(OSError):
+                tmp_path.unlink()
+            return
+        self.prune()
+
+    def prune(self):
+        """删除超出数量上限的最久未使用的缓存"""
+        try:
+            entries = [(entry.stat().st_mtime, entry) for entry in self.cache_dir.glob(f"*{self.suffix}")]
+        except OSError:
+            return
+        if len(entries) <= self.max_entries:
+            return
+        entries.sort(key=lambda entry: entry[0])
+        for _, entry in entries[:len(entries) - self.max_entries]:
+            with contextlib.suppress(OSError):
+                entry.unlink()
+
+    def clear(self):
+        """清空缓存"""
+        for entry in self.cache_dir.glob(f"*{self.suffix}"):
+            with contextlib.suppress(OSError):
+                entry.unlink()
+
+    @staticmethod
+    def output_digest(image_base64):
+        """计算封面内容的哈希，用于判断封面与上次上传的是否一致"""
+        return hashlib.blake2b(image_base64.encode("utf-8"), digest_size=20).hexdigest()
+
+    @staticmethod
+    @contextlib.contextmanager
+    def seeded(key):
+        """
+        使用由缓存键生成的随机数种子渲染，随机数生成器只在当前线程中生效，
+        多个线程同时渲染时互不影响，也不会改变 random 及 numpy 的全局随机数状态
+        """
+        seed = int(key[:16], 16)
+        previous = getattr(_local, "random", None), getattr(_local, "np_random", None)
+        _local.random = random.Random(seed)
+        _local.np_random = np.random.RandomState(seed % (2 ** 32))
+        try:
+            yield
+        finally:
+            _local.random, _local.np_random = previous
@@ -1,14 +1,15 @@
 import base64
-from collections import Counter
+from functools import lru_cache
 import io
 from pathlib import Path
 from PIL import Image, ImageFilter, ImageDraw, ImageFont, ImageOps
 import numpy as np
 import os
 import math
-import random  # 添加随机模块
 import colorsys
 from app.log import logger
+from app.plugins.plexmediacover.color_analysis import find_primary_colors, find_vibrant_colors
+from app.plugins.plexmediacover.render_cache import get_np_random, get_random
 
 """ 
 代码修改自 https://github.com/HappyQuQu/jellyfin-library-poster/blob/main/gen_poster.py
@@ -254,8 +255,8 @@ def get_random_color(image_path):
 
         # 在图片范围内随机选择一个点
         # 避免边缘区域，缩小范围到图片的20%-80%区域
-        random_x = random.randint(int(width * 0.5), int(width * 0.8))
-        random_y = random.randint(int(height * 0.5), int(height * 0.8))
+        random_x = get_random().randint(int(width * 0.5), int(width * 0.8))
+        random_y = get_random().randint(int(height * 0.5), int(height * 0.8))
 
         # 获取随机点的颜色
         if img.mode == "RGBA":
@@ -272,9 +273,9 @@ def get_random_color(image_path):
         # logger.error(f"获取图片颜色时出错: {e}")
         # 返回随机颜色作为备选
         return (
-            random.randint(50, 200),
-            random.randint(50, 200),
-            random.randint(50, 200),
+            get_random().randint(50, 200),
+            get_random().randint(50, 200),
+            get_random().randint(50, 200),
             255,
         )
 
@@ -304,6 +305,28 @@ def draw_color_block(image, position, size, color):
     return img_copy
 
 
+@lru_cache(maxsize=8)
+def create_horizontal_gradient_mask(width, height, exponent=1.0, max_value=255.0):
+    """
+    创建从左到右的横向渐变遮罩，第 x 列的值为 int(max_value * (x / width) ** exponent)
+
+    遮罩按 (width, height, exponent, max_value) 缓存，调用方不能修改返回的图像
+
+    参数:
+        width: 遮罩宽度
+        height: 遮罩高度
+        exponent: 渐变曲线的指数，小于1时左侧深色区域更大
+        max_value: 渐变的最大值(0-255)
+
+    返回:
+        L 模式的遮罩图像
+    """
+    row = max_value * (np.arange(width, dtype=np.float64) / width) ** exponent
+    # 与 int() 一致向零截断，每列的值相同，只计算一行后复制到整个遮罩
+    row = row.astype(np.uint8)
+    return Image.fromarray(np.tile(row, (height, 1)), "L")
+
+
 def create_gradient_background(width, height, color=None):
     """
     创建一个从左到右的渐变背景，使用遮罩技术实现渐变效果
@@ -389,9 +412,9 @@ def create_gradient_background(width, height, color=None):
             light_range: 明度范围，取值 0~1
             返回值：RGB 三元组，每个通道 0~255
             """
-            h = random.uniform(hue_range[0]/360.0, hue_range[1]/360.0)
-            s = random.uniform(sat_range[0], sat_range[1])
-            l = random.uniform(light_range[0], light_range[1])
+            h = get_random().uniform(hue_range[0]/360.0, hue_range[1]/360.0)
+            s = get_random().uniform(sat_range[0], sat_range[1])
+            l = get_random().uniform(light_range[0], light_range[1])
             # colorsys.hls_to_rgb 接受 H, L, S (注意顺序) 都是 0~1
             r, g, b = colorsys.hls_to_rgb(h, l, s)
             # 转回 0~255
@@ -443,20 +466,9 @@ def create_gradient_background(width, height, color=None):
     left_image = Image.new("RGBA", (width, height), selected_color)
     right_image = Image.new("RGBA", (width, height), color2)
     
-    # 创建渐变遮罩（从黑到白的横向线性渐变）
-    mask = Image.new("L", (width, height), 0)
-    mask_data = []
-    
-    # 生成遮罩数据，使用更加平滑的过渡
-    for y in range(height):
-        for x in range(width):
-            # 计算从左到右的渐变值 (0-255)
-            # 使用更加非线性的渐变，使左侧深色区域更大
-            mask_value = int(255.0 * (x / width) ** 0.7)  # 从0.85改为0.7
-            mask_data.append(mask_value)
-    
-    # 应用遮罩数据到遮罩图像
-    mask.putdata(mask_data)
+    # 创建渐变遮罩（从黑到白的横向渐变）
+    # 使用更加非线性的渐变，使左侧深色区域更大
+    mask = create_horizontal_gradient_mask(width, height, exponent=0.7)  # 从0.85改为0.7
     
     # 使用遮罩合成左右两个图像
     # 遮罩中黑色部分(0)显示left_image，白色部分(255)显示right_image
@@ -473,77 +485,14 @@ def get_poster_primary_color(image_path):
         image_path: 图片文件路径
         
     返回:
-        主色调颜色，RGBA格式
+        出现最多的颜色列表 [((r, g, b, 255), count), ...]，RGBA格式
     """
     try:
-        from collections import Counter
-        
-        # 打开图片
-        img = Image.open(image_path)
-        
-        # 缩小图片尺寸以加快处理速度
-        img = img.resize((100, 150), Image.LANCZOS)
-        
-        # 确保图片为RGBA模式
-        if img.mode != 'RGBA':
-            img = img.convert('RGBA')
-            
-        # 获取图片中心部分的像素数据（避免边框和角落）
-        # width, height = img.size
-        # center_x1 = int(width * 0.2)
-        # center_y1 = int(height * 0.2)
-        # center_x2 = int(width * 0.8)
-        # center_y2 = int(height * 0.8)
-        
-        # # 裁剪出中心区域
-        # center_img = img.crop((center_x1, center_y1, center_x2, center_y2))
-
-        # 获取所有像素
-        pixels = list(img.getdata())
-        
-        # 过滤掉接近黑色和白色的像素，以及透明度低的像素
-        filtered_pixels = []
-        for pixel in pixels:
-            r, g, b, a = pixel
-            
-            # 跳过透明度低的像素
-            if a < 200:
-                continue
-                
-            # 计算亮度
-            brightness = (r + g + b) / 3
-            
-            # 跳过过暗或过亮的像素
-            if brightness < 30 or brightness > 220:
-                continue
-                
-            # 添加到过滤后的列表
-            filtered_pixels.append((r, g, b, 255))
-            
-        # 如果过滤后没有像素，使用全部像素
-        if not filtered_pixels:
-            filtered_pixels = [(p[0], p[1], p[2], 255) for p in pixels if p[3] > 100]
-            
-        # 如果仍然没有像素，返回默认颜色
-        if not filtered_pixels:
+        common_colors = find_primary_colors(image_path, num_colors=10)
+        # 如果没有可用的像素，返回默认颜色
+        if not common_colors:
             return (150, 100, 50, 255)
-            
-        # 使用Counter找到出现最多的颜色
-        color_counter = Counter(filtered_pixels)
-        common_colors = color_counter.most_common(10)
-        
-        # 如果找到了颜色，返回最常见的颜色
-        if common_colors:
-            return common_colors
-        
-        # 如果无法找到主色调，使用平均值
-        r_avg = sum(p[0] for p in filtered_pixels) // len(filtered_pixels)
-        g_avg = sum(p[1] for p in filtered_pixels) // len(filtered_pixels)
-        b_avg = sum(p[2] for p in filtered_pixels) // len(filtered_pixels)
-        
-        return [(r_avg, g_avg, b_avg, 255)]
-     
-        
+        return common_colors
     except Exception as e:
         # logger.error(f"获取图片主色调时出错: {e}")
         # 返回默认颜色作为备选
@@ -616,13 +565,9 @@ def create_blur_background(image_path, template_width, template_height, backgrou
 
     # 3. 从左到右颜色变浅的渐变处理
     if lighten_gradient_strength > 0:
-        gradient_mask = Image.new("L", canvas_size, 0)  
-        draw_mask = ImageDraw.Draw(gradient_mask)
-
-        for x in range(template_width):
-            max_alpha_for_gradient = int(255 * np.clip(lighten_gradient_strength, 0.0, 1.0))
-            alpha_value = int((x / template_width) * max_alpha_for_gradient)
-            draw_mask.line([(x, 0), (x, template_height)], fill=alpha_value)
+        max_alpha_for_gradient = int(255 * np.clip(lighten_gradient_strength, 0.0, 1.0))
+        gradient_mask = create_horizontal_gradient_mask(template_width, template_height,
+                                                        max_value=float(max_alpha_for_gradient))
 
         # 创建一个白色的叠加层
         lighten_layer = Image.new("RGBA", canvas_size, (255, 255, 255, 0))
@@ -659,11 +604,11 @@ def add_film_grain(image, intensity=0.05):
         channels = img_array.shape[2]
         for i in range(min(3, channels)):  # 只处理RGB通道
             channel = img_array[:, :, i]
-            noise = np.random.normal(0, 255 * intensity, channel.shape)
+            noise = get_np_random().normal(0, 255 * intensity, channel.shape)
             img_array[:, :, i] = np.clip(channel + noise, 0, 255)
     else:
         # RGB或其他模式
-        noise = np.random.normal(0, 255 * intensity, img_array.shape)
+        noise = get_np_random().normal(0, 255 * intensity, img_array.shape)
         img_array = np.clip(img_array + noise, 0, 255)
     
     # 转换回PIL图像
@@ -671,67 +616,12 @@ def add_film_grain(image, intensity=0.05):
     
     return grainy_image
 
-def is_not_black_white_gray_near(color, threshold=20):
-    """判断颜色既不是黑、白、灰，也不是接近黑、白。"""
-    r, g, b = color
-    if (r < threshold and g < threshold and b < threshold) or \
-       (r > 255 - threshold and g > 255 - threshold and b > 255 - threshold):
-        return False
-    gray_diff_threshold = 10
-    if abs(r - g) < gray_diff_threshold and abs(g - b) < gray_diff_threshold and abs(r - b) < gray_diff_threshold:
-        return False
-    return True
-
-def rgb_to_hsv(color):
-    """将 RGB 颜色转换为 HSV 颜色。"""
-    r, g, b = [x / 255.0 for x in color]
-    return colorsys.rgb_to_hsv(r, g, b)
-
-def hsv_to_rgb(h, s, v):
-    """将 HSV 颜色转换为 RGB 颜色。"""
-    r, g, b = colorsys.hsv_to_rgb(h, s, v)
-    return (int(r * 255), int(g * 255), int(b * 255))
-
-def adjust_to_macaron(h, s, v, target_saturation_range=(0.2, 0.7), target_value_range=(0.55, 0.85)):
-    """将颜色的饱和度和亮度调整到接近马卡龙色系的范围，同时避免颜色过亮。"""
-    adjusted_s = min(max(s, target_saturation_range[0]), target_saturation_range[1])
-    adjusted_v = min(max(v, target_value_range[0]), target_value_range[1])
-    return adjusted_s, adjusted_v
-
 def find_dominant_vibrant_colors(image, num_colors=5):
     """
     从图像中提取出现次数较多的前 N 种非黑非白非灰的颜色，
     并将其调整到接近马卡龙色系。
     """
-    img = image.copy()  
-    img.thumbnail((100, 100))
-    img = img.convert('RGB')
-    pixels = list(img.getdata())
-    filtered_pixels = [p for p in pixels if is_not_black_white_gray_near(p)]
-    if not filtered_pixels:
-        return []
-    color_counter = Counter(filtered_pixels)
-    dominant_colors = color_counter.most_common(num_colors * 3) # 提取更多候选
-
-    macaron_colors = []
-    seen_hues = set() # 避免提取过于相似的颜色
-
-    for color, count in dominant_colors:
-        h, s, v = rgb_to_hsv(color)
-        adjusted_s, adjusted_v = adjust_to_macaron(h, s, v)
-        adjusted_rgb = hsv_to_rgb(h, adjusted_s, adjusted_v)
-
-        # 可以加入一些色调的判断，例如避免过于接近的色调
-        hue_degree = int(h * 360)
-        is_similar_hue = any(abs(hue_degree - seen) < 15 for seen in seen_hues) # 15度范围内的色调认为是相似的
-
-        if not is_similar_hue and adjusted_rgb not in macaron_colors:
-            macaron_colors.append(adjusted_rgb)
-            seen_hues.add(hue_degree)
-            if len(macaron_colors) >= num_colors:
-                break
-
-    return macaron_colors
+    return find_vibrant_colors(image, num_colors=num_colors)
 
 def darken_color(color, factor=0.7):
     """
@@ -746,7 +636,7 @@ def add_film_grain(image, intensity=0.05):
     img_array = np.array(image)
     
     # 创建随机噪点
-    noise = np.random.normal(0, intensity * 255, img_array.shape)
+    noise = get_np_random().normal(0, intensity * 255, img_array.shape)
     
     # 应用噪点
     img_array = img_array + noise
@@ -824,7 +714,7 @@ def create_style_multi_1(library_dir, title, font_path, font_size=(1,1), is_blur
         if vibrant_colors:
             blur_color = vibrant_colors[0]
         else:
-            blur_color = random.choice(soft_colors) # 默认橙色
+            blur_color = get_random().choice(soft_colors) # 默认橙色
 
         gradient_color = get_poster_primary_color(first_image_path)
 
@@ -1032,9 +922,9 @@ def create_style_multi_1(library_dir, title, font_path, font_size=(1,1), is_blur
         else:
             # 如果没有图片，生成一个随机颜色
             random_color = (
-                random.randint(50, 200),
-                random.randint(50, 200),
-                random.randint(50, 200),
+                get_random().randint(50, 200),
+                get_random().randint(50, 200),
+                get_random().randint(50, 200),
                 255,
             )
 
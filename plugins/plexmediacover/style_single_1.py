@@ -1,7 +1,5 @@
 import base64
-import random
 import colorsys
-from collections import Counter
 from io import BytesIO
 from pathlib import Path
 import math
@@ -10,22 +8,13 @@ import numpy as np
 from PIL import Image, ImageDraw, ImageFilter, ImageFont, ImageOps
 
 from app.log import logger
+from app.plugins.plexmediacover.color_analysis import color_distance, find_macaron_colors
+from app.plugins.plexmediacover.render_cache import get_np_random, get_random
 
 
 # ========== 配置 ==========
 canvas_size = (1920, 1080)
 
-def is_not_black_white_gray_near(color, threshold=20):
-    """判断颜色既不是黑、白、灰，也不是接近黑、白。"""
-    r, g, b = color
-    if (r < threshold and g < threshold and b < threshold) or \
-       (r > 255 - threshold and g > 255 - threshold and b > 255 - threshold):
-        return False
-    gray_diff_threshold = 10
-    if abs(r - g) < gray_diff_threshold and abs(g - b) < gray_diff_threshold and abs(r - b) < gray_diff_threshold:
-        return False
-    return True
-
 def rgb_to_hsv(color):
     """将 RGB 颜色转换为 HSV 颜色。"""
     r, g, b = [x / 255.0 for x in color]
@@ -36,44 +25,6 @@ def hsv_to_rgb(h, s, v):
     r, g, b = colorsys.hsv_to_rgb(h, s, v)
     return (int(r * 255), int(g * 255), int(b * 255))
 
-def adjust_color_macaron(color):
-    """
-    调整颜色使其更接近马卡龙风格：
-    - 如果颜色太暗，增加亮度
-    - 如果颜色太亮，降低亮度
-    - 调整饱和度到适当范围
-    """
-    h, s, v = rgb_to_hsv(color)
-    
-    # 马卡龙风格的理想范围
-    target_saturation_range = (0.3, 0.7)  # 饱和度范围
-    target_value_range = (0.6, 0.85)      # 亮度范围
-    
-    # 调整饱和度
-    if s < target_saturation_range[0]:
-        s = target_saturation_range[0]
-    elif s > target_saturation_range[1]:
-        s = target_saturation_range[1]
-    
-    # 调整亮度
-    if v < target_value_range[0]:
-        v = target_value_range[0]  # 太暗，加亮
-    elif v > target_value_range[1]:
-        v = target_value_range[1]  # 太亮，加暗
-    
-    return hsv_to_rgb(h, s, v)
-
-def color_distance(color1, color2):
-    """计算两个颜色在HSV空间中的距离"""
-    h1, s1, v1 = rgb_to_hsv(color1)
-    h2, s2, v2 = rgb_to_hsv(color2)
-    
-    # 色调在环形空间中，需要特殊处理
-    h_dist = min(abs(h1 - h2), 1 - abs(h1 - h2))
-    
-    # 综合距离，给予色调更高的权重
-    return h_dist * 5 + abs(s1 - s2) + abs(v1 - v2)
-
 def find_dominant_macaron_colors(image, num_colors=5):
     """
     从图像中提取主要颜色并调整为马卡龙风格：
@@ -82,35 +33,7 @@ def find_dominant_macaron_colors(image, num_colors=5):
     3. 调整这些颜色使其接近马卡龙风格
     4. 确保提取的颜色之间有足够的差异
     """
-    # 缩小图片以提高效率
-    img = image.copy()
-    img.thumbnail((150, 150))
-    img = img.convert('RGB')
-    pixels = list(img.getdata())
-    
-    # 过滤掉黑白灰颜色
-    filtered_pixels = [p for p in pixels if is_not_black_white_gray_near(p)]
-    if not filtered_pixels:
-        return []
-    
-    # 统计颜色出现频率
-    color_counter = Counter(filtered_pixels)
-    candidate_colors = color_counter.most_common(num_colors * 5)  # 提取更多候选颜色
-    
-    macaron_colors = []
-    min_color_distance = 0.15  # 颜色差异阈值
-    
-    for color, _ in candidate_colors:
-        # 调整为马卡龙风格
-        adjusted_color = adjust_color_macaron(color)
-        
-        # 检查与已选颜色的差异
-        if not any(color_distance(adjusted_color, existing) < min_color_distance for existing in macaron_colors):
-            macaron_colors.append(adjusted_color)
-            if len(macaron_colors) >= num_colors:
-                break
-    
-    return macaron_colors
+    return find_macaron_colors(image, num_colors=num_colors)
 
 def adjust_background_color(color, darken_factor=0.85):
     """
@@ -137,7 +60,7 @@ def add_film_grain(image, intensity=0.05):
     img_array = np.array(image)
     
     # 创建随机噪点
-    noise = np.random.normal(0, intensity * 255, img_array.shape)
+    noise = get_np_random().normal(0, intensity * 255, img_array.shape)
     
     # 应用噪点
     img_array = img_array + noise
@@ -337,7 +260,7 @@ def create_style_single_1(image_path, title, font_path, font_size=(1,1), blur_si
         # 从图片提取马卡龙风格的颜色
         candidate_colors = find_dominant_macaron_colors(original_img, num_colors=num_colors)
         
-        random.shuffle(candidate_colors)
+        get_random().shuffle(candidate_colors)
         extracted_colors = candidate_colors[:num_colors]
             
         # 柔和的马卡龙备选颜色
@@ -352,7 +275,7 @@ def create_style_single_1(image_path, title, font_path, font_size=(1,1), blur_si
         while len(extracted_colors) < num_colors:
             # 从备选颜色中选择一个与已有颜色差异最大的
             if not extracted_colors:
-                extracted_colors.append(random.choice(soft_macaron_colors))
+                extracted_colors.append(get_random().choice(soft_macaron_colors))
             else:
                 max_diff = 0
                 best_color = None
@@ -361,7 +284,7 @@ def create_style_single_1(image_path, title, font_path, font_size=(1,1), blur_si
                     if min_dist > max_diff:
                         max_diff = min_dist
                         best_color = color
-                extracted_colors.append(best_color or random.choice(soft_macaron_colors))
+                extracted_colors.append(best_color or get_random().choice(soft_macaron_colors))
         
         # 处理颜色
         bg_color = darken_color(extracted_colors[0], 0.85)  # 背景色
@@ -1,8 +1,10 @@
 import threading
 import time
 from collections import defaultdict
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Any, Dict, List, Optional, Tuple
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 import pytz
 from apscheduler.schedulers.background import BackgroundScheduler
@@ -12,14 +14,24 @@ from app.core.config import settings
 from app.core.context import MediaInfo
 from app.core.event import Event, eventmanager
 from app.core.meta import MetaBase
+from app.core.metainfo import MetaInfoPath
 from app.helper.mediaserver import MediaServerHelper
 from app.log import logger
 from app.plugins import _PluginBase
+from app.plugins.plexpersonmeta.helper import BudgetEvent, TransferTarget, cache_stats, douban_limiter, to_int
+from app.plugins.plexpersonmeta.metrics import COUNTER_NAMES, DEPENDENCY_NAMES, scrape_metrics
+from app.plugins.plexpersonmeta.notification import PlexNotificationListener
+from app.plugins.plexpersonmeta.plexclient import PlexClient
 from app.plugins.plexpersonmeta.scrape import ScrapeHelper
-from app.schemas import ServiceInfo
-from app.schemas.types import EventType, NotificationType
+from app.plugins.plexpersonmeta.store import CheckpointStore, FailureStore, FingerprintStore, PersonStore, \
+    StateDatabase
+from app.schemas import ServiceInfo, TransferInfo
+from app.schemas.types import EventType, MediaType, NotificationType
 
-lock = threading.Lock()
+# 媒体服务器的刮削锁，同一媒体服务器同一时间只运行一个刮削任务
+server_locks: Dict[str, threading.Lock] = defaultdict(threading.Lock)
+server_locks_lock = threading.Lock()
+transfer_lock = threading.Lock()
 
 
 class PlexPersonMeta(_PluginBase):
@@ -30,7 +42,7 @@ class PlexPersonMeta(_PluginBase):
     # 插件图标
     plugin_icon = "https://raw.githubusercontent.com/NasPilot/MoviePilot-Plugins/main/icons/plexpersonmeta.png"
     # 插件版本
-    plugin_version = "2.1"
+    plugin_version = "2.2"
     # 插件作者
     plugin_author = "NasPilot"
     # 作者主页
@@ -60,8 +72,30 @@ class PlexPersonMeta(_PluginBase):
     _delay = None
     # 最近一次入库时间
     _transfer_time = None
+    # 等待刮削的入库媒体
+    _transfer_targets = None
+    # 存在无法定位的入库媒体，需要按入库时间扫描
+    _transfer_rescan = False
     # 清理缓存
     _clear_cache = None
+    # 全量刮削一次
+    _force_full_scan = None
+    # 实时监听 Plex 通知
+    _listen_notifications = False
+    # 通知去抖时间
+    _notification_debounce = 30
+    # Plex 通知监听
+    _listeners = None
+    # 刮削状态数据库
+    _state = None
+    # 媒体项指纹
+    _fingerprints = None
+    # 媒体库刮削检查点
+    _checkpoints = None
+    # 媒体项刮削失败记录
+    _failures = None
+    # 人物翻译库
+    _persons = None
     # 定时器
     _scheduler = None
     # 退出事件
@@ -72,6 +106,7 @@ class PlexPersonMeta(_PluginBase):
     def init_plugin(self, config: dict = None):
         self.mediaserver_helper = MediaServerHelper()
         if not config:
+            self.__open_stores()
             return
         self._enabled = config.get("enabled")
         self._onlyonce = config.get("onlyonce")
@@ -79,7 +114,10 @@ class PlexPersonMeta(_PluginBase):
         self._notify = config.get("notify")
         self._libraries = config.get("libraries", [])
         self._clear_cache = config.get("clear_cache")
+        self._force_full_scan = config.get("force_full_scan")
         self._execute_transfer = config.get("execute_transfer")
+        self._listen_notifications = config.get("listen_notifications")
+        self._notification_debounce = to_int(config.get("notification_debounce"), 30, minimum=0)
         try:
             self._delay = int(config.get("delay", 200))
         except ValueError:
@@ -91,6 +129,7 @@ class PlexPersonMeta(_PluginBase):
 
         # 停止现有任务
         self.stop_service()
+        self.__open_stores()
 
         # 启动服务
         self._scheduler = BackgroundScheduler(timezone=settings.TZ)
@@ -107,6 +146,26 @@ class PlexPersonMeta(_PluginBase):
             config["clear_cache"] = False
             self.update_config(config=config)
 
+        if self._force_full_scan:
+            # 清理指纹、检查点及失败记录后，下次运行时所有媒体项都会从头重新刮削
+            if self._fingerprints:
+                self._fingerprints.clear()
+            if self._checkpoints:
+                self._checkpoints.clear()
+            if self._failures:
+                self._failures.clear()
+            self._force_full_scan = False
+            config["force_full_scan"] = False
+            self.update_config(config=config)
+
+        if self._enabled and self._listen_notifications:
+            self._scheduler.add_job(
+                func=self.__start_listeners,
+                trigger="date",
+                run_date=datetime.now(tz=pytz.timezone(settings.TZ)) + timedelta(seconds=3),
+                name=f"{self.plugin_name}通知监听",
+            )
+
         if self._onlyonce:
             logger.info(f"{self.plugin_name}服务，立即运行一次")
             self._scheduler.add_job(
@@ -125,6 +184,37 @@ class PlexPersonMeta(_PluginBase):
             self._scheduler.print_jobs()
             self._scheduler.start()
 
+    def __open_stores(self):
+        """
+        打开刮削状态数据库及本地人物翻译库，停止服务时关闭
+        """
+        if not self._state:
+            try:
+                self._state = StateDatabase(path=self.get_data_path() / "state.db")
+                self._fingerprints = FingerprintStore(database=self._state, plugin=self)
+                self._checkpoints = CheckpointStore(database=self._state, plugin=self)
+                self._failures = FailureStore(database=self._state, plugin=self)
+            except Exception as e:
+                self._state = self._fingerprints = self._checkpoints = self._failures = None
+                logger.error(f"打开刮削状态数据库失败：{str(e)}")
+        if self._persons:
+            return
+        try:
+            self._persons = PersonStore(path=self.get_data_path() / "persons.db")
+        except Exception as e:
+            logger.error(f"打开本地人物翻译库失败：{str(e)}")
+
+    def __save_stores(self):
+        """
+        保存指纹、失败记录及检查点
+        """
+        for store in (self._fingerprints, self._failures, self._checkpoints):
+            if store:
+                try:
+                    store.save()
+                except Exception as e:
+                    logger.error(f"保存刮削状态失败：{str(e)}")
+
     def service_infos(self, name_filters: Optional[List[str]] = None) -> Optional[Dict[str, ServiceInfo]]:
         """
         服务信息
@@ -170,7 +260,41 @@ class PlexPersonMeta(_PluginBase):
         pass
 
     def get_api(self) -> List[Dict[str, Any]]:
-        pass
+        return [
+            {
+                "path": "/metrics",
+                "endpoint": self.get_metrics,
+                "methods": ["GET"],
+                "summary": "获取刮削性能统计",
+                "description": "获取各外部依赖的调用次数、耗时分布、缓存命中率以及刮削吞吐量",
+                "auth": "bear",
+            },
+            {
+                "path": "/metrics/reset",
+                "endpoint": self.reset_metrics,
+                "methods": ["POST"],
+                "summary": "重置刮削性能统计",
+                "description": "清空已记录的性能统计，重新开始统计",
+                "auth": "bear",
+            }
+        ]
+
+    @staticmethod
+    def get_metrics() -> Dict[str, Any]:
+        """
+        获取刮削性能统计API
+        """
+        snapshot = scrape_metrics.snapshot()
+        snapshot["douban_limiter"] = douban_limiter.stats()
+        return {"success": True, "data": snapshot}
+
+    @staticmethod
+    def reset_metrics() -> Dict[str, Any]:
+        """
+        重置刮削性能统计API
+        """
+        scrape_metrics.reset()
+        return {"success": True, "message": "性能统计已重置"}
 
     def get_service(self) -> List[Dict[str, Any]]:
         """
@@ -197,6 +321,7 @@ class PlexPersonMeta(_PluginBase):
         """
         退出插件
         """
+        self.__stop_listeners()
         try:
             if self._scheduler:
                 self._scheduler.remove_all_jobs()
@@ -205,6 +330,16 @@ class PlexPersonMeta(_PluginBase):
                     self._scheduler.shutdown()
                     self._event.clear()
                 self._scheduler = None
+            # 媒体服务器的配置可能已变化，关闭共用的 Plex 连接，下次刮削时重新创建
+            PlexClient.close_all()
+            # 关闭人物翻译库，完成 WAL 检查点，下次启用时重新打开
+            if self._persons:
+                self._persons.close()
+                self._persons = None
+            # 提交未保存的刮削状态并关闭数据库
+            if self._state:
+                self._state.close()
+                self._state = self._fingerprints = self._checkpoints = self._failures = None
         except Exception as e:
             logger.info(str(e))
 
@@ -300,7 +435,7 @@ class PlexPersonMeta(_PluginBase):
                                 'component': 'VCol',
                                 'props': {
                                     'cols': 12,
-                                    'md': 4
+                                    'md': 3
                                 },
                                 'content': [
                                     {
@@ -318,7 +453,7 @@ class PlexPersonMeta(_PluginBase):
                                 'component': 'VCol',
                                 'props': {
                                     'cols': 12,
-                                    'md': 4
+                                    'md': 3
                                 },
                                 'content': [
                                     {
@@ -336,7 +471,7 @@ class PlexPersonMeta(_PluginBase):
                                 'component': 'VCol',
                                 'props': {
                                     'cols': 12,
-                                    'md': 4
+                                    'md': 3
                                 },
                                 'content': [
                                     {
@@ -349,6 +484,24 @@ class PlexPersonMeta(_PluginBase):
                                         }
                                     }
                                 ]
+                            },
+                            {
+                                'component': 'VCol',
+                                'props': {
+                                    'cols': 12,
+                                    'md': 3
+                                },
+                                'content': [
+                                    {
+                                        'component': 'VSwitch',
+                                        'props': {
+                                            'model': 'force_full_scan',
+                                            'label': '全量刮削一次',
+                                            'hint': '忽略增量记录，下次运行时重新刮削所有媒体',
+                                            'persistent-hint': True
+                                        }
+                                    }
+                                ]
                             }
                         ],
                     },
@@ -459,6 +612,277 @@ class PlexPersonMeta(_PluginBase):
                             }
                         ],
                     },
+                    {
+                        'component': 'VRow',
+                        'content': [
+                            {
+                                'component': 'VCol',
+                                'props': {
+                                    'cols': 12,
+                                    'md': 6
+                                },
+                                'content': [
+                                    {
+                                        'component': 'VSwitch',
+                                        'props': {
+                                            'model': 'listen_notifications',
+                                            'label': '实时监听Plex通知',
+                                            'hint': 'Plex中新建或刷新元数据的媒体项将自动刮削，需安装websocket-client',
+                                            'persistent-hint': True
+                                        }
+                                    }
+                                ]
+                            },
+                            {
+                                'component': 'VCol',
+                                'props': {
+                                    'cols': 12,
+                                    'md': 6
+                                },
+                                'content': [
+                                    {
+                                        'component': 'VTextField',
+                                        'props': {
+                                            'model': 'notification_debounce',
+                                            'label': '通知去抖时间（秒）',
+                                            'placeholder': '30',
+                                            'hint': '同一媒体项最后一次通知后等待的时间，期间的多次通知只刮削一次',
+                                            'persistent-hint': True
+                                        },
+                                    }
+                                ],
+                            }
+                        ],
+                    },
+                    {
+                        'component': 'VRow',
+                        'content': [
+                            {
+                                'component': 'VCol',
+                                'props': {
+                                    'cols': 12,
+                                    'md': 3
+                                },
+                                'content': [
+                                    {
+                                        'component': 'VTextField',
+                                        'props': {
+                                            'model': 'fetch_workers',
+                                            'label': '读取并发数',
+                                            'placeholder': '4',
+                                            'hint': '同时从Plex读取媒体详情的线程数',
+                                            'persistent-hint': True
+                                        },
+                                    }
+                                ],
+                            },
+                            {
+                                'component': 'VCol',
+                                'props': {
+                                    'cols': 12,
+                                    'md': 3
+                                },
+                                'content': [
+                                    {
+                                        'component': 'VTextField',
+                                        'props': {
+                                            'model': 'resolve_workers',
+                                            'label': '识别并发数',
+                                            'placeholder': '4',
+                                            'hint': '同时从TMDB、豆瓣识别人物信息的线程数',
+                                            'persistent-hint': True
+                                        },
+                                    }
+                                ],
+                            },
+                            {
+                                'component': 'VCol',
+                                'props': {
+                                    'cols': 12,
+                                    'md': 3
+                                },
+                                'content': [
+                                    {
+                                        'component': 'VTextField',
+                                        'props': {
+                                            'model': 'write_workers',
+                                            'label': '写入并发数',
+                                            'placeholder': '2',
+                                            'hint': '同时向Plex写入人物信息的线程数',
+                                            'persistent-hint': True
+                                        },
+                                    }
+                                ],
+                            },
+                            {
+                                'component': 'VCol',
+                                'props': {
+                                    'cols': 12,
+                                    'md': 3
+                                },
+                                'content': [
+                                    {
+                                        'component': 'VTextField',
+                                        'props': {
+                                            'model': 'person_workers',
+                                            'label': '人物预取并发数',
+                                            'placeholder': '8',
+                                            'hint': '每个媒体项并发获取TMDB人物信息的线程数',
+                                            'persistent-hint': True
+                                        },
+                                    }
+                                ],
+                            }
+                        ],
+                    },
+                    {
+                        'component': 'VRow',
+                        'content': [
+                            {
+                                'component': 'VCol',
+                                'props': {
+                                    'cols': 12,
+                                    'md': 4
+                                },
+                                'content': [
+                                    {
+                                        'component': 'VTextField',
+                                        'props': {
+                                            'model': 'server_workers',
+                                            'label': '媒体服务器并发数',
+                                            'placeholder': '2',
+                                            'hint': '同时刮削的媒体服务器数量，每个媒体服务器同一时间只运行一个刮削任务',
+                                            'persistent-hint': True
+                                        },
+                                    }
+                                ],
+                            },
+                            {
+                                'component': 'VCol',
+                                'props': {
+                                    'cols': 12,
+                                    'md': 4
+                                },
+                                'content': [
+                                    {
+                                        'component': 'VTextField',
+                                        'props': {
+                                            'model': 'library_workers',
+                                            'label': '媒体库并发数',
+                                            'placeholder': '1',
+                                            'hint': '每个媒体服务器同时刮削的媒体库数量',
+                                            'persistent-hint': True
+                                        },
+                                    }
+                                ],
+                            },
+                            {
+                                'component': 'VCol',
+                                'props': {
+                                    'cols': 12,
+                                    'md': 4
+                                },
+                                'content': [
+                                    {
+                                        'component': 'VSelect',
+                                        'props': {
+                                            'model': 'scrape_order',
+                                            'label': '刮削顺序',
+                                            'items': [
+                                                {'title': '媒体库默认顺序', 'value': 'default'},
+                                                {'title': '最近添加优先', 'value': 'added'},
+                                                {'title': '观看次数优先', 'value': 'viewed'},
+                                                {'title': '最近观看优先', 'value': 'played'},
+                                            ],
+                                            'hint': '全量刮削时的处理顺序，此前刮削失败的媒体项始终最后处理',
+                                            'persistent-hint': True
+                                        }
+                                    }
+                                ]
+                            }
+                        ],
+                    },
+                    {
+                        'component': 'VRow',
+                        'content': [
+                            {
+                                'component': 'VCol',
+                                'props': {
+                                    'cols': 12,
+                                    'md': 3
+                                },
+                                'content': [
+                                    {
+                                        'component': 'VTextField',
+                                        'props': {
+                                            'model': 'page_size',
+                                            'label': '分页大小',
+                                            'placeholder': '200',
+                                            'hint': '分页获取媒体库条目时每页的数量',
+                                            'persistent-hint': True
+                                        },
+                                    }
+                                ],
+                            },
+                            {
+                                'component': 'VCol',
+                                'props': {
+                                    'cols': 12,
+                                    'md': 3
+                                },
+                                'content': [
+                                    {
+                                        'component': 'VTextField',
+                                        'props': {
+                                            'model': 'batch_size',
+                                            'label': '批量读取数量',
+                                            'placeholder': '50',
+                                            'hint': '批量获取条目详情时每批的数量',
+                                            'persistent-hint': True
+                                        },
+                                    }
+                                ],
+                            },
+                            {
+                                'component': 'VCol',
+                                'props': {
+                                    'cols': 12,
+                                    'md': 3
+                                },
+                                'content': [
+                                    {
+                                        'component': 'VTextField',
+                                        'props': {
+                                            'model': 'douban_rate',
+                                            'label': '豆瓣请求速率',
+                                            'placeholder': '10',
+                                            'hint': '豆瓣辅助识别的初始请求速率（次/分钟），将根据豆瓣响应自动调整',
+                                            'persistent-hint': True
+                                        },
+                                    }
+                                ],
+                            },
+                            {
+                                'component': 'VCol',
+                                'props': {
+                                    'cols': 12,
+                                    'md': 3
+                                },
+                                'content': [
+                                    {
+                                        'component': 'VTextField',
+                                        'props': {
+                                            'model': 'time_budget',
+                                            'label': '单次运行时长',
+                                            'placeholder': '0',
+                                            'hint': '定时刮削单次运行的最长时间（分钟），到时后停止，下次运行从检查点继续，0为不限制',
+                                            'persistent-hint': True
+                                        },
+                                    }
+                                ],
+                            }
+                        ],
+                    },
                     {
                         'component': 'VRow',
                         'content': [
@@ -719,11 +1143,158 @@ class PlexPersonMeta(_PluginBase):
             "scrape_type": "all",
             "remove_no_zh": False,
             # "reserve_tag_key": False,
-            "douban_scrape": True
+            "douban_scrape": True,
+            "force_full_scan": False,
+            "listen_notifications": False,
+            "notification_debounce": 30,
+            "fetch_workers": 4,
+            "resolve_workers": 4,
+            "write_workers": 2,
+            "person_workers": 8,
+            "server_workers": 2,
+            "library_workers": 1,
+            "scrape_order": "default",
+            "page_size": 200,
+            "batch_size": 50,
+            "douban_rate": 10,
+            "time_budget": 0
         }
 
     def get_page(self) -> List[dict]:
-        pass
+        snapshot = scrape_metrics.snapshot()
+        if not snapshot["dependencies"] and not snapshot["counters"]:
+            return [
+                {
+                    'component': 'div',
+                    'text': '暂无性能统计数据，运行一次刮削后再查看',
+                    'props': {
+                        'class': 'text-center',
+                    }
+                }
+            ]
+
+        counters = snapshot["counters"]
+        overview = [
+            ("刮削运行时长", f"{snapshot['busy_seconds']} 秒"),
+            ("吞吐量", f"{snapshot['items_per_second']} 个/秒"),
+        ] + [(label, counters.get(name, 0)) for name, label in COUNTER_NAMES.items()]
+
+        dependency_rows = [
+            [DEPENDENCY_NAMES.get(name, name), stats["count"], stats["errors"], stats["avg_ms"],
+             stats["p50_ms"], stats["p95_ms"], stats["max_ms"], round(stats["total_ms"] / 1000, 2)]
+            for name, stats in snapshot["dependencies"].items()
+        ]
+        cache_rows = [
+            [region, stats["hit"], stats["negative_hit"], stats["miss"], f"{stats['hit_ratio']:.2%}",
+             stats["avg_miss_ms"]]
+            for region, stats in snapshot["cache"].items()
+        ]
+
+        return [
+            {
+                'component': 'VRow',
+                'content': [
+                    {
+                        'component': 'VCol',
+                        'props': {
+                            'cols': 6,
+                            'md': 2
+                        },
+                        'content': [
+                            {
+                                'component': 'VCard',
+                                'props': {
+                                    'variant': 'tonal',
+                                },
+                                'content': [
+                                    {
+                                        'component': 'VCardText',
+                                        'props': {
+                                            'class': 'text-center',
+                                        },
+                                        'content': [
+                                            {
+                                                'component': 'div',
+                                                'props': {
+                                                    'class': 'text-caption'
+                                                },
+                                                'text': label
+                                            },
+                                            {
+                                                'component': 'div',
+                                                'props': {
+                                                    'class': 'text-h6'
+                                                },
+                                                'text': str(value)
+                                            }
+                                        ]
+                                    }
+                                ]
+                            }
+                        ]
+                    } for label, value in overview
+                ]
+            },
+            self.__build_table(headers=["外部依赖", "调用次数", "失败次数", "平均耗时(ms)", "P50(ms)",
+                                        "P95(ms)", "最大耗时(ms)", "累计耗时(s)"],
+                               rows=dependency_rows),
+            self.__build_table(headers=["缓存区", "命中", "负缓存命中", "未命中", "命中率", "未命中平均耗时(ms)"],
+                               rows=cache_rows)
+        ]
+
+    @staticmethod
+    def __build_table(headers: List[str], rows: List[list]) -> dict:
+        """构建统计表格"""
+        return {
+            'component': 'VRow',
+            'content': [
+                {
+                    'component': 'VCol',
+                    'props': {
+                        'cols': 12
+                    },
+                    'content': [
+                        {
+                            'component': 'VTable',
+                            'props': {
+                                'hover': True
+                            },
+                            'content': [
+                                {
+                                    'component': 'thead',
+                                    'content': [
+                                        {
+                                            'component': 'th',
+                                            'props': {
+                                                'class': 'text-start ps-4'
+                                            },
+                                            'text': header
+                                        } for header in headers
+                                    ]
+                                },
+                                {
+                                    'component': 'tbody',
+                                    'content': [
+                                        {
+                                            'component': 'tr',
+                                            'content': [
+                                                {
+                                                    'component': 'td',
+                                                    'props': {
+                                                        'class': 'ps-4'
+                                                    },
+                                                    'text': str(value)
+                                                } for value in row
+                                            ]
+                                        } for row in rows
+                                    ]
+                                }
+                            ]
+                        }
+                    ]
+                }
+            ]
+        }
 
     def __get_service_library_options(self):
         """
@@ -835,9 +1406,21 @@ class PlexPersonMeta(_PluginBase):
         season_episode = f" {meta.season_episode}" if meta.season_episode else ""
         media_desc = f"{mediainfo.title_year}{season_episode}"
 
-        # 如果最近一次入库时间为None，这里才进行赋值，否则可能是存在尚未执行的任务待执行
-        if not self._transfer_time:
-            self._transfer_time = datetime.now(tz=pytz.timezone(settings.TZ))
+        # 记录入库媒体，同一媒体在延迟时间内的多次入库合并为一次刮削
+        target = self.__build_transfer_target(mediainfo=mediainfo, meta=meta,
+                                              transferinfo=event_info.get("transferinfo"))
+        with transfer_lock:
+            # 如果最近一次入库时间为None，这里才进行赋值，否则可能是存在尚未执行的任务待执行
+            if not self._transfer_time:
+                self._transfer_time = datetime.now(tz=pytz.timezone(settings.TZ))
+            if self._transfer_targets is None:
+                self._transfer_targets = {}
+            if not target:
+                self._transfer_rescan = True
+            elif target.key in self._transfer_targets:
+                self._transfer_targets[target.key].merge(target)
+            else:
+                self._transfer_targets[target.key] = target
 
         # 根据是否有延迟设置不同的日志消息
         delay_message = f"{self._delay} 秒后运行一次{self.plugin_name}服务" if self._delay else f"准备运行一次{self.plugin_name}服务"
@@ -860,19 +1443,110 @@ class PlexPersonMeta(_PluginBase):
             self._scheduler.print_jobs()
             self._scheduler.start()
 
+    @staticmethod
+    def __build_transfer_target(mediainfo: MediaInfo, meta: MetaBase,
+                                transferinfo: Optional[TransferInfo] = None) -> Optional[TransferTarget]:
+        """根据入库事件构建需要刮削的入库媒体"""
+        if not mediainfo.tmdb_id:
+            return None
+        titles = [title for title in [mediainfo.title, mediainfo.original_title, mediainfo.en_title] if title]
+        if not titles:
+            return None
+        episodes = None
+        if mediainfo.type == MediaType.TV:
+            episodes = PlexPersonMeta.__transfer_episodes(mediainfo=mediainfo, meta=meta, transferinfo=transferinfo)
+        return TransferTarget(mtype=mediainfo.type,
+                              tmdbid=mediainfo.tmdb_id,
+                              title=mediainfo.title_year,
+                              titles=list(dict.fromkeys(titles)),
+                              episodes=episodes)
+
+    @staticmethod
+    def __transfer_episodes(mediainfo: MediaInfo, meta: MetaBase,
+                            transferinfo: Optional[TransferInfo] = None) -> Dict[int, set]:
+        """
+        获取入库的季及集，优先按入库后的文件逐个识别，整季或多季入库时可以覆盖全部入库的剧集，
+        无法识别文件时再使用入库事件的识别结果，多季入库时按整季刮削
+        """
+        episodes: Dict[int, set] = {}
+        for file in (transferinfo.file_list_new if transferinfo else None) or []:
+            file_meta = MetaInfoPath(Path(file))
+            if not file_meta.episode_list:
+                continue
+            season = file_meta.begin_season or meta.begin_season or mediainfo.season or 1
+            episodes.setdefault(season, set()).update(file_meta.episode_list)
+        if episodes:
+            return episodes
+        seasons = meta.season_list or [mediainfo.season or 1]
+        if len(seasons) == 1:
+            return {seasons[0]: set(meta.episode_list or [])}
+        return {season: set() for season in seasons}
+
     def __scrape_by_transfer(self):
         """入库后运行一次"""
-        if not self._transfer_time:
+        with transfer_lock:
+            transfer_time, self._transfer_time = self._transfer_time, None
+            targets, self._transfer_targets = self._transfer_targets or {}, {}
+            rescan, self._transfer_rescan = self._transfer_rescan, False
+
+        if not transfer_time:
             logger.info(f"没有获取到最近一次的入库时间，取消执行{self.plugin_name}服务")
             return
 
-        logger.info(f"正在运行一次{self.plugin_name}服务，入库时间 {self._transfer_time.strftime('%Y-%m-%d %H:%M:%S')}")
+        logger.info(f"正在运行一次{self.plugin_name}服务，入库时间 {transfer_time.strftime('%Y-%m-%d %H:%M:%S')}，"
+                    f"共 {len(targets)} 个入库媒体")
+
+        # 优先定位入库媒体对应的条目进行刮削，无法定位时再按入库时间扫描
+        unresolved = self.scrape_library_by_targets(targets=targets) if targets else set()
+        if targets and not unresolved and not rescan:
+            return
+        if unresolved:
+            logger.info(f"{'、'.join(targets[key].title for key in unresolved)} 未能定位到对应的媒体项，按入库时间进行刮削")
 
-        adjusted_time = self._transfer_time - timedelta(minutes=5)
+        adjusted_time = transfer_time - timedelta(minutes=5)
         logger.info(f"为保证入库数据完整性，前偏移5分钟后的时间：{adjusted_time.strftime('%Y-%m-%d %H:%M:%S')}")
 
         self.scrape_library_by_added_time(added_time=int(adjusted_time.timestamp()))
-        self._transfer_time = None
+
+    def scrape_library_by_targets(self, targets: Dict[tuple, TransferTarget]) -> set:
+        """
+        刮削入库媒体的演员信息
+        :return: 所有媒体服务器中均未能定位到的入库媒体的键
+        """
+        if not self.__check_plex_media_server():
+            return set()
+
+        overall_start_time = time.time()
+        plugin_config = self.get_config()
+
+        def scrape_service(service: ServiceInfo, libraries: Dict[int, Any]) -> set:
+            scrape_helper = ScrapeHelper(config=plugin_config, event=self._event, chain=self.chain,
+                                         service=service, libraries=libraries,
+                                         fingerprints=self._fingerprints, persons=self._persons,
+                                         failures=self._failures)
+            logger.info(f"开始刮削媒体服务器 {service.name} 中入库媒体的演员信息 ...")
+            try:
+                return scrape_helper.scrape_transfer_targets(targets=list(targets.values()))
+            except Exception as e:
+                logger.error(f"媒体服务器 {service.name} 刮削入库媒体过程中出现异常，{str(e)}")
+                return set()
+            finally:
+                self.__save_stores()
+                self.__log_helper_stats(service=service, scrape_helpers=[scrape_helper])
+
+        resolved = set()
+        for service_resolved in self.__run_services(plugin_config=plugin_config, handler=scrape_service):
+            resolved |= service_resolved or set()
+
+        if resolved:
+            titles = [targets[key].title for key in targets if key in resolved]
+            overall_elapsed_time = time.time() - overall_start_time
+            message_text = f"{'、'.join(titles[:5])}{f' 等 {len(titles)} 个媒体' if len(titles) > 5 else ''}" \
+                           f" 演员信息刮削完成，用时 {overall_elapsed_time:.2f} 秒"
+            self.__send_message(title="【媒体库演员信息刮削】", text=message_text)
+            logger.info(message_text)
+            self.__log_stats()
+        return set(targets) - resolved
 
     def scrape_library(self):
         """
@@ -881,107 +1555,259 @@ class PlexPersonMeta(_PluginBase):
         if not self.__check_plex_media_server():
             return
 
-        with lock:
-            overall_start_time = time.time()
-            plugin_config = self.get_config()
-            service_libraries = self.__get_service_libraries()
-            for service_name, libraries in service_libraries.items():
-                service = self.service_info(name=service_name)
-                if not service or not service.instance:
-                    logger.info(f"获取媒体服务器 {service.name} 实例失败，跳过处理")
-                    continue
-                service_start_time = time.time()
-                scrape_helper = ScrapeHelper(config=plugin_config, event=self._event, chain=self.chain,
-                                             service=service, libraries=libraries)
-                logger.info(f"开始处理媒体服务器 {service.name} 的媒体库")
-
-                for library_id, library in libraries.items():
-                    logger.info(f"开始刮削媒体库 {library.title} 的演员信息 ...")
-                    try:
-                        rating_items = scrape_helper.list_rating_items(library=library)
-                        if not rating_items:
-                            logger.info(f"媒体库 {library.title} 没有找到任何媒体信息，跳过刮削")
-                            continue
-
-                        scrape_helper.scrape_rating_items(rating_items=rating_items)
-                        logger.info(f"媒体库 {library.title} 的演员信息刮削完成")
-                    except Exception as e:
-                        logger.error(f"媒体库 {library.title} 刮削过程中出现异常，{str(e)}")
-
-                service_elapsed_time = time.time() - service_start_time
-                logger.info(f"媒体服务器 {service.name} 处理完成，耗时 {service_elapsed_time:.2f} 秒")
-
-            overall_elapsed_time = time.time() - overall_start_time
+        overall_start_time = time.time()
+        plugin_config = self.get_config()
+        # 单次运行的时间预算，到时后停止，下次运行从检查点继续
+        time_budget = to_int(plugin_config.get("time_budget"), 0, minimum=0)
+        run_event = BudgetEvent(event=self._event, budget=time_budget * 60)
+
+        def scrape_library(service: ServiceInfo, libraries: Dict[int, Any], library_id: int,
+                           library: Any) -> Optional[ScrapeHelper]:
+            if run_event.is_set():
+                return None
+            scrape_helper = ScrapeHelper(config=plugin_config, event=run_event, chain=self.chain,
+                                         service=service, libraries=libraries,
+                                         fingerprints=self._fingerprints, persons=self._persons,
+                                         checkpoints=self._checkpoints, failures=self._failures)
+            logger.info(f"开始刮削媒体库 {library.title} 的演员信息 ...")
+            try:
+                # 分页获取媒体项，首页返回后即开始刮削，存在检查点时从检查点继续
+                if scrape_helper.scrape_library(library=library):
+                    logger.info(f"媒体库 {library.title} 的演员信息刮削完成")
+                else:
+                    logger.info(f"媒体库 {library.title} 的演员信息刮削未完成，下次运行时将从检查点继续")
+            except Exception as e:
+                logger.error(f"媒体库 {library.title} 刮削过程中出现异常，{str(e)}")
+            finally:
+                self.__save_stores()
+            return scrape_helper
+
+        def scrape_service(service: ServiceInfo, libraries: Dict[int, Any]):
+            if run_event.is_set():
+                return
+            service_start_time = time.time()
+            logger.info(f"开始处理媒体服务器 {service.name} 的媒体库")
+            scrape_helpers = self.__run_libraries(plugin_config=plugin_config, service=service,
+                                                  libraries=libraries, handler=scrape_library)
+            self.__log_helper_stats(service=service, scrape_helpers=scrape_helpers)
+            service_elapsed_time = time.time() - service_start_time
+            logger.info(f"媒体服务器 {service.name} 处理完成，耗时 {service_elapsed_time:.2f} 秒")
+
+        self.__run_services(plugin_config=plugin_config, handler=scrape_service)
+
+        overall_elapsed_time = time.time() - overall_start_time
+        if run_event.expired and not self._event.is_set():
+            message_text = f"已达到单次运行时长 {time_budget} 分钟，演员信息刮削暂停，" \
+                           f"下次运行时将从检查点继续，用时 {overall_elapsed_time:.2f} 秒"
+        else:
             message_text = f"演员信息刮削完成，用时 {overall_elapsed_time:.2f} 秒"
-            self.__send_message(title="【媒体库演员信息刮削】", text=message_text)
-            logger.info(message_text)
+        self.__send_message(title="【媒体库演员信息刮削】", text=message_text)
+        logger.info(message_text)
+        self.__log_stats()
 
     def scrape_library_by_added_time(self, added_time: int):
         """根据入库时间刮削媒体库中的演员信息"""
         if not self.__check_plex_media_server():
             return
 
-        with lock:
-            overall_start_time = time.time()
-            plugin_config = self.get_config()
-            service_libraries = self.__get_service_libraries()
-            for service_name, libraries in service_libraries.items():
-                service = self.service_info(name=service_name)
-                if not service or not service.instance:
-                    logger.info(f"获取媒体服务器 {service.name} 实例失败，跳过处理")
+        overall_start_time = time.time()
+        plugin_config = self.get_config()
+
+        def scrape_library(service: ServiceInfo, libraries: Dict[int, Any], library_id: int, library: Any,
+                           recent_added_items: List[dict]) -> ScrapeHelper:
+            scrape_helper = ScrapeHelper(config=plugin_config, event=self._event, chain=self.chain,
+                                         service=service, libraries=libraries,
+                                         fingerprints=self._fingerprints, persons=self._persons,
+                                         failures=self._failures)
+            rating_items = {}
+            episode_items = {}
+            for rating_item in recent_added_items:
+                section_id = rating_item.get("librarySectionID")
+                if section_id != library_id:
                     continue
-                service_start_time = time.time()
-                scrape_helper = ScrapeHelper(config=plugin_config, event=self._event, chain=self.chain,
-                                             service=service, libraries=libraries)
-                logger.info(f"开始处理媒体服务器 {service.name} 的媒体库")
-
-                for library_id, library in libraries.items():
-                    rating_items = {}
-                    episode_items = {}
-                    recent_added_items = scrape_helper.list_rating_items_by_added(added_time=added_time)
-
-                    for rating_item in recent_added_items:
-                        section_id = rating_item.get("librarySectionID")
-                        if section_id != library_id:
-                            continue
-
-                        rating_key = rating_item.get("ratingKey")
-                        if not rating_key:
-                            continue
-
-                        rating_type = rating_item.get("type")
-                        # 先获取show和movie的key，后续直接进行刮削
-                        if rating_type in ["show", "movie"]:
-                            rating_items[rating_key] = rating_item
-                        # 如果是季，这里直接当成show进行处理
-                        elif rating_type == "season":
-                            parent_key = scrape_helper.extract_key_from_url(rating_item.get("parentKey"))
-                            if parent_key and parent_key not in rating_items:
-                                try:
-                                    rating_items[parent_key] = scrape_helper.fetch_item(rating_key=parent_key)
-                                except Exception as e:
-                                    logger.error(f"媒体项 {rating_item.get('parentTitle')} 获取详细信息失败，{e}")
-                        # 如果是集的，先判断对应的父级key是否已经在rating_keys中增加，如果是，则忽略，如果不是，则追加到集的key中，后续独立进行刮削
-                        elif rating_type == "episode":
-                            parent_key = scrape_helper.extract_key_from_url(rating_item.get("grandparentKey"))
-                            if parent_key and parent_key not in rating_items:
-                                episode_items.setdefault(parent_key, []).append(rating_item)
-
-                    logger.info(f"开始刮削媒体库 {library.title} 最近入库的演员信息 ...")
-                    if not rating_items and not episode_items:
-                        logger.info(f"媒体库 {library.title} 最近入库没有找到任何符合条件的媒体信息，跳过刮削")
-                    else:
-                        scrape_helper.scrape_rating_items(rating_items=list(rating_items.values()))
-                        scrape_helper.scrape_episode_items(episode_items=episode_items)
-
-                service_elapsed_time = time.time() - service_start_time
-                logger.info(f"媒体服务器 {service.name} 处理完成，耗时 {service_elapsed_time:.2f} 秒")
 
-            overall_elapsed_time = time.time() - overall_start_time
-            formatted_added_time = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(added_time))
-            message_text = f"最近一次入库时间：{formatted_added_time}，演员信息刮削完成，用时 {overall_elapsed_time:.2f} 秒"
-            self.__send_message(title="【媒体库演员信息刮削】", text=message_text)
-            logger.info(message_text)
+                rating_key = rating_item.get("ratingKey")
+                if not rating_key:
+                    continue
+
+                rating_type = rating_item.get("type")
+                # 先获取show和movie的key，后续直接进行刮削
+                if rating_type in ["show", "movie"]:
+                    rating_items[rating_key] = rating_item
+                # 如果是季，这里直接当成show进行处理
+                elif rating_type == "season":
+                    parent_key = scrape_helper.extract_key_from_url(rating_item.get("parentKey"))
+                    if parent_key and parent_key not in rating_items:
+                        try:
+                            rating_items[parent_key] = scrape_helper.fetch_item(rating_key=parent_key)
+                        except Exception as e:
+                            logger.error(f"媒体项 {rating_item.get('parentTitle')} 获取详细信息失败，{e}")
+                # 如果是集的，先判断对应的父级key是否已经在rating_keys中增加，如果是，则忽略，如果不是，则追加到集的key中，后续独立进行刮削
+                elif rating_type == "episode":
+                    parent_key = scrape_helper.extract_key_from_url(rating_item.get("grandparentKey"))
+                    if parent_key and parent_key not in rating_items:
+                        episode_items.setdefault(parent_key, []).append(rating_item)
+
+            logger.info(f"开始刮削媒体库 {library.title} 最近入库的演员信息 ...")
+            if not rating_items and not episode_items:
+                logger.info(f"媒体库 {library.title} 最近入库没有找到任何符合条件的媒体信息，跳过刮削")
+                return scrape_helper
+            try:
+                scrape_helper.scrape_rating_items(rating_items=list(rating_items.values()))
+                scrape_helper.scrape_episode_items(episode_items=episode_items)
+            except Exception as e:
+                logger.error(f"媒体库 {library.title} 刮削过程中出现异常，{str(e)}")
+            finally:
+                self.__save_stores()
+            return scrape_helper
+
+        def scrape_service(service: ServiceInfo, libraries: Dict[int, Any]):
+            service_start_time = time.time()
+            logger.info(f"开始处理媒体服务器 {service.name} 的媒体库")
+            # 最近入库的媒体在所有媒体库中只获取一次，再按媒体库分别刮削
+            scrape_helper = ScrapeHelper(config=plugin_config, event=self._event, chain=self.chain,
+                                         service=service, libraries=libraries)
+            try:
+                recent_added_items = scrape_helper.list_rating_items_by_added(added_time=added_time)
+            except Exception as e:
+                logger.error(f"媒体服务器 {service.name} 获取最近入库媒体失败，{str(e)}")
+                return
+            scrape_helpers = self.__run_libraries(plugin_config=plugin_config, service=service,
+                                                  libraries=libraries,
+                                                  handler=lambda *args: scrape_library(*args, recent_added_items))
+            self.__log_helper_stats(service=service, scrape_helpers=scrape_helpers)
+            service_elapsed_time = time.time() - service_start_time
+            logger.info(f"媒体服务器 {service.name} 处理完成，耗时 {service_elapsed_time:.2f} 秒")
+
+        self.__run_services(plugin_config=plugin_config, handler=scrape_service)
+
+        overall_elapsed_time = time.time() - overall_start_time
+        formatted_added_time = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(added_time))
+        message_text = f"最近一次入库时间：{formatted_added_time}，演员信息刮削完成，用时 {overall_elapsed_time:.2f} 秒"
+        self.__send_message(title="【媒体库演员信息刮削】", text=message_text)
+        logger.info(message_text)
+        self.__log_stats()
+
+    def scrape_notified_items(self, service: ServiceInfo, libraries: Dict[int, Any], rating_keys: List[str]) -> bool:
+        """
+        刮削 Plex 通知的媒体项
+        :return: 媒体服务器正在运行其他刮削任务时返回 False，由通知监听稍后重新提交
+        """
+        server_lock = self.__server_lock(service.name)
+        if not server_lock.acquire(blocking=False):
+            logger.debug(f"媒体服务器 {service.name} 正在运行其他刮削任务，稍后刮削通知的媒体项")
+            return False
+        try:
+            start_time = time.time()
+            scrape_helper = ScrapeHelper(config=self.get_config(), event=self._event, chain=self.chain,
+                                         service=service, libraries=libraries,
+                                         fingerprints=self._fingerprints, persons=self._persons,
+                                         failures=self._failures)
+            logger.info(f"开始刮削媒体服务器 {service.name} 通知的 {len(rating_keys)} 个媒体项 ...")
+            try:
+                with scrape_metrics.run():
+                    scrape_helper.scrape_rating_keys(rating_keys=rating_keys)
+            finally:
+                self.__save_stores()
+            self.__log_helper_stats(service=service, scrape_helpers=[scrape_helper])
+            logger.info(f"媒体服务器 {service.name} 通知的媒体项刮削完成，用时 {time.time() - start_time:.2f} 秒")
+        finally:
+            server_lock.release()
+        return True
+
+    def __start_listeners(self):
+        """为各媒体服务器启动 Plex 通知监听"""
+        self.__stop_listeners()
+        listeners = []
+        for service_name, libraries in (self.__get_service_libraries() or {}).items():
+            service = self.service_info(name=service_name)
+            if not service or not service.instance:
+                logger.info(f"获取媒体服务器 {service_name} 实例失败，跳过通知监听")
+                continue
+            listener = PlexNotificationListener(service=service, libraries=libraries,
+                                                handler=self.scrape_notified_items,
+                                                debounce=self._notification_debounce)
+            if listener.start():
+                listeners.append(listener)
+        self._listeners = listeners
+
+    def __stop_listeners(self):
+        """停止所有 Plex 通知监听"""
+        listeners, self._listeners = self._listeners or [], None
+        for listener in listeners:
+            listener.stop()
+
+    def __run_services(self, plugin_config: dict, handler: Callable[[ServiceInfo, Dict[int, Any]], Any]) -> list:
+        """
+        并发处理各媒体服务器，同一媒体服务器同一时间只运行一个刮削任务
+        :param handler: 处理单个媒体服务器的函数，参数为媒体服务器及其需要处理的媒体库
+        :return: 各媒体服务器的处理结果
+        """
+        service_libraries = self.__get_service_libraries() or {}
+        services = []
+        for service_name, libraries in service_libraries.items():
+            service = self.service_info(name=service_name)
+            if not service or not service.instance:
+                logger.info(f"获取媒体服务器 {service_name} 实例失败，跳过处理")
+                continue
+            services.append((service, libraries))
+        if not services:
+            return []
+
+        def run(service: ServiceInfo, libraries: Dict[int, Any]):
+            server_lock = self.__server_lock(service.name)
+            if server_lock.locked():
+                logger.info(f"媒体服务器 {service.name} 正在运行其他刮削任务，等待其完成")
+            with server_lock:
+                return handler(service, libraries)
+
+        server_workers = min(to_int(plugin_config.get("server_workers"), 2, minimum=1), len(services))
+        with scrape_metrics.run(), ThreadPoolExecutor(max_workers=server_workers,
+                                                      thread_name_prefix="plexpersonmeta-server") as executor:
+            futures = [executor.submit(run, service, libraries) for service, libraries in services]
+        return [self.__future_result(future) for future in futures]
+
+    def __run_libraries(self, plugin_config: dict, service: ServiceInfo, libraries: Dict[int, Any],
+                        handler: Callable[..., Optional[ScrapeHelper]]) -> List[ScrapeHelper]:
+        """
+        并发处理媒体服务器中的各媒体库，每个媒体库使用独立的 ScrapeHelper
+        :param handler: 处理单个媒体库的函数，参数为媒体服务器、媒体库字典、媒体库 ID 及媒体库
+        :return: 各媒体库使用的 ScrapeHelper
+        """
+        library_workers = min(to_int(plugin_config.get("library_workers"), 1, minimum=1), max(len(libraries), 1))
+        with ThreadPoolExecutor(max_workers=library_workers,
+                                thread_name_prefix=f"plexpersonmeta-{service.name}") as executor:
+            futures = [executor.submit(handler, service, libraries, library_id, library)
+                       for library_id, library in libraries.items()]
+        return [helper for helper in (self.__future_result(future) for future in futures) if helper]
+
+    @staticmethod
+    def __future_result(future: Future) -> Any:
+        """获取并发任务的结果，任务异常时记录日志"""
+        try:
+            return future.result()
+        except Exception as e:
+            logger.error(f"刮削任务执行失败，{str(e)}")
+            return None
+
+    @staticmethod
+    def __server_lock(service_name: str) -> threading.Lock:
+        """获取媒体服务器的刮削锁"""
+        with server_locks_lock:
+            return server_locks[service_name]
+
+    @staticmethod
+    def __log_helper_stats(service: ServiceInfo, scrape_helpers: List[ScrapeHelper]):
+        """输出媒体服务器的跳过统计"""
+        unchanged_count = sum(scrape_helper.unchanged_count for scrape_helper in scrape_helpers)
+        skipped_write_count = sum(scrape_helper.skipped_write_count for scrape_helper in scrape_helpers)
+        backoff_count = sum(scrape_helper.backoff_count for scrape_helper in scrape_helpers)
+        if unchanged_count:
+            logger.info(f"媒体服务器 {service.name} 共 {unchanged_count} 个媒体项自上次刮削后未发生变化，已跳过")
+        if skipped_write_count:
+            logger.info(f"媒体服务器 {service.name} 共 {skipped_write_count} 个媒体项的人物信息无变化，已跳过写回")
+        if backoff_count:
+            logger.info(f"媒体服务器 {service.name} 共 {backoff_count} 个媒体项此前刮削失败且尚未到重试时间，已跳过")
 
     def __send_message(self, title: str, text: str):
         """
@@ -992,6 +1818,26 @@ class PlexPersonMeta(_PluginBase):
 
         self.post_message(mtype=NotificationType.SiteMessage, title=title, text=text)
 
+    def __log_stats(self):
+        """输出缓存命中、外部依赖耗时、豆瓣限流、人物翻译库及刮削失败记录统计"""
+        summary = cache_stats.summary()
+        if summary:
+            logger.info(f"缓存统计：{summary}")
+        summary = scrape_metrics.summary()
+        if summary:
+            logger.info(f"性能统计：{summary}")
+        limiter_stats = douban_limiter.stats()
+        logger.info(f"豆瓣限流：当前速率 {limiter_stats['rate']} 次/分钟，等待中的请求 {limiter_stats['waiting']} 个")
+        if self._persons:
+            counts = self._persons.count()
+            logger.info(f"本地人物翻译库：共 {counts['names']} 个人物名称，{counts['roles']} 个角色")
+        if self._failures:
+            counts = self._failures.count()
+            if counts["items"] or counts["lookups"]:
+                logger.info(f"刮削失败记录：共 {counts['items']} 个媒体项（{counts['items_backing_off']} 个等待重试），"
+                            f"{counts['lookups']} 个查询（{counts['lookups_backing_off']} 个等待重试），"
+                            f"{'，'.join(f'{reason} {count} 个' for reason, count in counts['reasons'].items())}")
+
     def __check_plex_media_server(self) -> bool:
         """检查Plex媒体服务器配置"""
         service_libraries = self.__get_service_libraries()
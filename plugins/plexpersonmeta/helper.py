@@ -4,15 +4,24 @@ helper.py
 这个模块定义了用于存储媒体项目信息的 `RatingInfo` 数据类以及缓存、限流等装饰器
 """
 import functools
-from dataclasses import dataclass
-from typing import Optional
+import inspect
+import threading
+import time
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
 
 from app.core.cache import Cache
 from app.log import logger
+from app.schemas.types import MediaType
+from app.utils.string import StringUtils
 
 # 创建全局缓存实例
 cache_backend = Cache()
 
+# 缓存键版本，缓存键格式或缓存数据结构变化时递增，旧缓存将自然过期
+CACHE_KEY_VERSION = 2
+
 
 @dataclass
 class RatingInfo:
@@ -26,38 +35,429 @@ class RatingInfo:
     tmdbid: Optional[int] = None  # TMDB 的唯一标识，可选
 
 
-def cache_with_logging(region, source):
+@dataclass
+class ScrapeJob:
+    """
+    刮削流水线中流转的任务
+    """
+    info: RatingInfo  # 媒体项目信息
+    item: Optional[dict] = None  # 从 Plex 获取到的条目详情
+    actors: Optional[list] = None  # 识别后需要写回 Plex 的人物信息
+    done: Optional[Callable[[], None]] = None  # 任务处理完成后的回调，用于推进检查点
+
+
+@dataclass
+class TransferTarget:
+    """
+    入库完成后需要刮削的媒体，同一媒体的多次入库会合并为一个
+    """
+    mtype: MediaType  # 媒体类型
+    tmdbid: int  # TMDB 的唯一标识
+    title: str  # 用于日志及通知的标题
+    titles: List[str] = field(default_factory=list)  # 用于在媒体服务器中搜索的标题
+    episodes: Optional[Dict[int, Set[int]]] = None  # 需要刮削的季及集，集为空时刮削整季，为 None 时刮削全部
+
+    @property
+    def key(self) -> Tuple[MediaType, int]:
+        """合并入库媒体时使用的键"""
+        return self.mtype, self.tmdbid
+
+    def merge(self, other: "TransferTarget"):
+        """合并同一媒体的另一次入库"""
+        self.titles = list(dict.fromkeys(self.titles + other.titles))
+        if self.episodes is None or other.episodes is None:
+            self.episodes = None
+            return
+        for season, episodes in other.episodes.items():
+            current = self.episodes.get(season)
+            if current is None:
+                self.episodes[season] = set(episodes)
+            elif not current or not episodes:
+                self.episodes[season] = set()
+            else:
+                current.update(episodes)
+
+    def match_episode(self, episode: dict) -> bool:
+        """判断剧集是否属于本次入库"""
+        if self.episodes is None:
+            return True
+        episodes = self.episodes.get(episode.get("parentIndex"))
+        if episodes is None:
+            return False
+        return not episodes or episode.get("index") in episodes
+
+
+class CastMap:
+    """
+    剧集级别的人物翻译映射，记录 原始人物名称 → 翻译后的名称及头像、（原始人物名称，原始角色）→ 翻译后的角色，
+    以及已识别过但未能完整翻译的人物，同一剧集的各集共用，各集只需识别映射未覆盖且未识别过的客串人物
+    """
+
+    def __init__(self):
+        # 仅保护映射的读写，人物识别在锁外进行，同一剧集的各集可以并发识别
+        self.lock = threading.Lock()
+        self._names: Dict[str, Tuple[str, Optional[str]]] = {}
+        self._roles: Dict[Tuple[str, str], str] = {}
+        # 已识别过但未能完整翻译的（原始人物名称，原始角色）
+        self._misses: Set[Tuple[str, Optional[str]]] = set()
+
+    def learn(self, originals: list, actors: list):
+        """
+        记录翻译结果
+        :param originals: Plex 中原始的人物信息
+        :param actors: 翻译后的人物信息
+        """
+        trans_actors = {actor.get("id"): actor for actor in actors or [] if actor.get("id")}
+        for original in originals:
+            tag, role = original.get("tag"), original.get("role")
+            if not tag:
+                continue
+            actor = trans_actors.get(original.get("id")) or {}
+            tag_value, role_value = actor.get("tag"), actor.get("role")
+            if tag_value and tag_value != tag and StringUtils.is_chinese(tag_value):
+                self._names[tag] = (tag_value, actor.get("thumb"))
+            if role and role_value and role_value != role and StringUtils.is_chinese(role_value):
+                self._roles[(tag, role)] = role_value
+            if not StringUtils.is_chinese(tag_value) or (role and not StringUtils.is_chinese(role_value)):
+                self._misses.add((tag, role))
+
+    def is_attempted(self, actor: dict) -> bool:
+        """人物是否已识别过但未能完整翻译，无需在其他集中再次识别"""
+        return (actor.get("tag"), actor.get("role")) in self._misses
+
+    def apply(self, item: dict) -> Optional[dict]:
+        """
+        使用映射翻译条目的人物信息
+        :return: 翻译后的条目副本，没有任何人物被翻译时返回 None
+        """
+        if not self._names and not self._roles:
+            return None
+        translated = False
+        trans_actors = []
+        for actor in item.get("Role", []):
+            tag, role = actor.get("tag"), actor.get("role")
+            trans_actor = dict(actor)
+            if tag in self._names and not StringUtils.is_chinese(tag):
+                trans_actor["tag"], thumb = self._names[tag]
+                if thumb:
+                    trans_actor["thumb"] = thumb
+                translated = True
+            if role and (tag, role) in self._roles and not StringUtils.is_chinese(role):
+                trans_actor["role"] = self._roles[(tag, role)]
+                translated = True
+            trans_actors.append(trans_actor)
+        if not translated:
+            return None
+        return {**item, "Role": trans_actors}
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+
+class BudgetEvent:
+    """
+    带时间预算的退出事件，外部事件触发或超出时间预算时均视为已触发，可代替 threading.Event 使用
+    """
+
+    def __init__(self, event: threading.Event, budget: Optional[float] = None):
+        """
+        :param event: 外部退出事件
+        :param budget: 时间预算（秒），为空时不限制
+        """
+        self._event = event
+        self._deadline = time.monotonic() + budget if budget else None
+
+    @property
+    def expired(self) -> bool:
+        """是否已超出时间预算"""
+        return self._deadline is not None and time.monotonic() >= self._deadline
+
+    def is_set(self) -> bool:
+        return self._event.is_set() or self.expired
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        if self._deadline is not None:
+            remaining = max(self._deadline - time.monotonic(), 0)
+            timeout = remaining if timeout is None else min(timeout, remaining)
+        self._event.wait(timeout)
+        return self.is_set()
+
+
+def to_int(value: Any, default: int, minimum: Optional[int] = None) -> int:
+    """
+    将配置项转换为整数，转换失败时返回默认值
+    :param value: 配置项的值
+    :param default: 默认值
+    :param minimum: 最小值，可选，小于该值时使用最小值
+    :return: 整数值
+    """
+    try:
+        result = int(value)
+    except (TypeError, ValueError):
+        result = default
+    if minimum is not None and result < minimum:
+        result = minimum
+    return result
+
+
+class _NegativeResult:
+    """
+    负缓存标记，表示上一次查询没有获取到结果
+    """
+
+    def __reduce__(self):
+        # 序列化时按模块级单例处理，确保从 Redis 等后端反序列化后仍是同一个对象
+        return "NEGATIVE_RESULT"
+
+    def __repr__(self):
+        return "NEGATIVE_RESULT"
+
+
+# 负缓存标记单例
+NEGATIVE_RESULT = _NegativeResult()
+
+
+class CacheStats:
+    """
+    缓存统计，按缓存区记录命中、未命中次数以及耗时
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._regions: Dict[str, Dict[str, float]] = {}
+
+    def record(self, region: str, outcome: str, elapsed: float):
+        """
+        记录一次缓存访问
+        :param region: 缓存区
+        :param outcome: 访问结果，hit、negative_hit 或 miss
+        :param elapsed: 耗时（秒），命中时为读取缓存的耗时，未命中时为加载数据的耗时
+        """
+        with self._lock:
+            stats = self._regions.setdefault(region, {
+                "hit": 0, "negative_hit": 0, "miss": 0, "hit_time": 0.0, "miss_time": 0.0
+            })
+            stats[outcome] += 1
+            if outcome == "miss":
+                stats["miss_time"] += elapsed
+            else:
+                stats["hit_time"] += elapsed
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """
+        获取各缓存区的统计数据
+        """
+        with self._lock:
+            result = {}
+            for region, stats in self._regions.items():
+                hits = stats["hit"] + stats["negative_hit"]
+                total = hits + stats["miss"]
+                result[region] = {
+                    "hit": stats["hit"],
+                    "negative_hit": stats["negative_hit"],
+                    "miss": stats["miss"],
+                    "hit_ratio": round(hits / total, 4) if total else 0.0,
+                    "avg_hit_ms": round(stats["hit_time"] * 1000 / hits, 2) if hits else 0.0,
+                    "avg_miss_ms": round(stats["miss_time"] * 1000 / stats["miss"], 2) if stats["miss"] else 0.0,
+                }
+            return result
+
+    def summary(self) -> str:
+        """
+        获取统计摘要，用于日志输出
+        """
+        return "；".join(f"{region} 命中 {stats['hit']} 次，负缓存命中 {stats['negative_hit']} 次，"
+                        f"未命中 {stats['miss']} 次，命中率 {stats['hit_ratio']:.2%}，"
+                        f"未命中平均耗时 {stats['avg_miss_ms']} 毫秒"
+                        for region, stats in self.snapshot().items())
+
+    def reset(self):
+        """
+        重置统计数据
+        """
+        with self._lock:
+            self._regions.clear()
+
+
+# 全局缓存统计实例
+cache_stats = CacheStats()
+
+
+class AdaptiveRateLimiter:
+    """
+    自适应限流器（AIMD），按当前速率均匀发放请求时机，
+    请求成功时线性提高速率，出错时速率减半，返回空结果时小幅降低速率
+    """
+
+    def __init__(self, name: str, rate: float, min_rate: float = 1.0, max_rate: Optional[float] = None,
+                 increase: float = 1.0, error_decrease: float = 0.5, empty_decrease: float = 0.8):
+        """
+        :param name: 限流器名称，用于日志记录
+        :param rate: 初始速率（次/分钟）
+        :param min_rate: 最低速率（次/分钟）
+        :param max_rate: 最高速率（次/分钟），默认为初始速率的 2 倍
+        :param increase: 每次成功后提高的速率（次/分钟）
+        :param error_decrease: 出错后速率的乘数
+        :param empty_decrease: 返回空结果后速率的乘数
+        """
+        self.name = name
+        self._lock = threading.Lock()
+        self._increase = increase
+        self._error_decrease = error_decrease
+        self._empty_decrease = empty_decrease
+        self._configured_rate = None
+        self._rate = rate
+        self._min_rate = min_rate
+        self._max_rate = max_rate or rate * 2
+        self._next_time = 0.0
+        self._waiting = 0
+        self.configure(rate=rate, min_rate=min_rate, max_rate=max_rate)
+
+    def configure(self, rate: float, min_rate: Optional[float] = None, max_rate: Optional[float] = None):
+        """
+        设置初始速率，与当前配置一致时保留已自适应调整的速率
+        """
+        with self._lock:
+            if rate == self._configured_rate:
+                return
+            self._configured_rate = rate
+            self._rate = rate
+            self._min_rate = min(min_rate or self._min_rate, rate)
+            self._max_rate = max(max_rate or rate * 2, rate)
+
+    def acquire(self, event: Optional[threading.Event] = None) -> bool:
+        """
+        等待下一个请求时机
+        :param event: 外部中断事件，等待期间被设置时立即返回
+        :return: 是否获取成功，外部中断时返回 False
+        """
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_time)
+            self._next_time = slot + 60 / self._rate
+            self._waiting += 1
+        try:
+            delay = slot - time.monotonic()
+            if delay <= 0:
+                return not (event and event.is_set())
+            logger.debug(f"{self.name} 限流等待 {delay:.2f} 秒，当前速率 {self._rate:.2f} 次/分钟")
+            if event:
+                return not event.wait(delay)
+            time.sleep(delay)
+            return True
+        finally:
+            with self._lock:
+                self._waiting -= 1
+
+    def on_success(self):
+        """请求成功，线性提高速率"""
+        with self._lock:
+            self._rate = min(self._rate + self._increase, self._max_rate)
+
+    def on_error(self):
+        """请求出错，速率减半"""
+        self.__decrease(self._error_decrease)
+
+    def on_empty(self):
+        """请求返回空结果，可能已被限流，小幅降低速率"""
+        self.__decrease(self._empty_decrease)
+
+    def __decrease(self, factor: float):
+        with self._lock:
+            rate = max(self._rate * factor, self._min_rate)
+            if rate < self._rate:
+                # 已经排好的请求时机同样按新的速率顺延
+                self._next_time = max(self._next_time, time.monotonic() + 60 / rate)
+            self._rate = rate
+        logger.debug(f"{self.name} 速率降低至 {self._rate:.2f} 次/分钟")
+
+    @property
+    def rate(self) -> float:
+        """当前速率（次/分钟）"""
+        return self._rate
+
+    @property
+    def waiting(self) -> int:
+        """正在等待的请求数量"""
+        return self._waiting
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        获取限流器状态
+        """
+        with self._lock:
+            return {
+                "rate": round(self._rate, 2),
+                "min_rate": round(self._min_rate, 2),
+                "max_rate": round(self._max_rate, 2),
+                "waiting": self._waiting,
+            }
+
+
+# 豆瓣请求限流器，所有刮削任务共享
+douban_limiter = AdaptiveRateLimiter(name="豆瓣", rate=10)
+
+
+def _normalize_key_part(value: Any) -> str:
+    """
+    将缓存键的参数值转换为稳定的字符串
+    """
+    if isinstance(value, Enum):
+        return str(value.value)
+    if isinstance(value, (list, tuple)):
+        return "(" + ",".join(_normalize_key_part(v) for v in value) + ")"
+    if isinstance(value, str):
+        return value.strip()
+    return str(value)
+
+
+def cache_with_logging(region, source, key_params: Optional[Tuple[str, ...]] = None):
     """
     装饰器，用于在函数执行时处理缓存逻辑和日志记录。
     :param region: 缓存区，用于存储和检索缓存数据
     :param source: 数据来源，用于日志记录（例如：PERSON 或 MEDIA）
+    :param key_params: 参与生成缓存键的参数名，为空时使用除 self 外的全部参数
     :return: 装饰器函数
     """
 
     def decorator(func):
+        signature = inspect.signature(func)
+
+        def make_key(args, kwargs) -> str:
+            """生成与实例无关的缓存键，格式为 v{版本}:{函数名}:{参数}"""
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            arguments = bound.arguments
+            names = key_params or [name for name in arguments if name != "self"]
+            params = "&".join(f"{name}={_normalize_key_part(arguments.get(name))}" for name in names)
+            return f"v{CACHE_KEY_VERSION}:{func.__name__}:{params}"
 
         @functools.wraps(func)
         def wrapped_func(*args, **kwargs):
             # 生成缓存键
-            from cachetools.keys import hashkey
-            key = str(hashkey(*args, **kwargs))
-            exists_cache = cache_backend.exists(key=key, region=region)
-            if exists_cache:
-                value = cache_backend.get(key=key, region=region)
-                if value is not None:
-                    if source == "PERSON":
-                        logger.info(f"从缓存中获取到 {source} 人物信息")
-                    else:
-                        logger.info(f"从缓存中获取到 {source} 媒体信息: {kwargs.get('title', 'Unknown Title')}")
-                    return value
-                return None
+            key = make_key(args, kwargs)
+            # 仅读取一次缓存，未命中时后端返回 None
+            start_time = time.perf_counter()
+            value = cache_backend.get(key=key, region=region)
+            if value is not None:
+                if isinstance(value, _NegativeResult):
+                    cache_stats.record(region, "negative_hit", time.perf_counter() - start_time)
+                    return None
+                cache_stats.record(region, "hit", time.perf_counter() - start_time)
+                if source == "PERSON":
+                    logger.info(f"从缓存中获取到 {source} 人物信息")
+                else:
+                    logger.info(f"从缓存中获取到 {source} 媒体信息: {kwargs.get('title', 'Unknown Title')}")
+                return value
 
             # 执行被装饰的函数
+            start_time = time.perf_counter()
             result = func(*args, **kwargs)
+            cache_stats.record(region, "miss", time.perf_counter() - start_time)
 
             if result is None:
                 # 如果结果为 None，说明触发限流或网络等异常，缓存5分钟，以免高频次调用
-                cache_backend.set(key, "None", ttl=60 * 5, region=region, maxsize=100000)
+                cache_backend.set(key, NEGATIVE_RESULT, ttl=60 * 5, region=region, maxsize=100000)
             else:
                 # 结果不为 None，使用默认 TTL 缓存
                 cache_backend.set(key, result, ttl=60 * 60 * 24 * 3, region=region, maxsize=100000)
@@ -0,0 +1,216 @@
+"""
+metrics.py
+
+这个模块定义了刮削过程的性能统计，包括各外部依赖的调用次数、失败次数、耗时分布以及刮削吞吐量
+"""
+import bisect
+import contextlib
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional
+
+from app.plugins.plexpersonmeta.helper import cache_stats
+
+# 各外部依赖的显示名称
+DEPENDENCY_NAMES = {
+    "plex_get": "Plex 读取",
+    "plex_put": "Plex 写入",
+    "tmdb_media": "TMDB 媒体",
+    "tmdb_person": "TMDB 人物",
+    "tmdb_season": "TMDB 季",
+    "douban": "豆瓣",
+}
+
+# 各计数器的显示名称
+COUNTER_NAMES = {
+    "items_resolved": "识别媒体项",
+    "items_written": "写回媒体项",
+    "items_skipped": "未变化媒体项",
+    "writes_skipped": "跳过写回",
+    "items_backoff": "退避跳过媒体项",
+}
+
+
+class TimedCall:
+    """
+    一次计时的调用，调用方可在代码块内将 failed 置为 True，标记调用失败（例如返回了错误状态码）
+    """
+
+    def __init__(self):
+        self.failed = False
+
+
+class LatencyHistogram:
+    """
+    耗时分布，按固定的毫秒区间计数，分位数按区间上限估算
+    """
+    # 区间上限（毫秒），超过最后一个上限的计入溢出区间
+    bounds: List[float] = [10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000]
+
+    def __init__(self):
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, elapsed: float, error: bool = False):
+        """
+        记录一次调用
+        :param elapsed: 耗时（秒）
+        :param error: 调用是否失败
+        """
+        elapsed_ms = elapsed * 1000
+        self.counts[bisect.bisect_left(self.bounds, elapsed_ms)] += 1
+        self.count += 1
+        self.total += elapsed_ms
+        self.max = max(self.max, elapsed_ms)
+        if error:
+            self.errors += 1
+
+    def percentile(self, percent: float) -> float:
+        """估算分位数（毫秒），落在溢出区间时返回最大耗时"""
+        if not self.count:
+            return 0.0
+        threshold = self.count * percent
+        cumulative = 0
+        for index, count in enumerate(self.counts):
+            cumulative += count
+            if cumulative >= threshold:
+                return float(self.bounds[index]) if index < len(self.bounds) else round(self.max, 2)
+        return round(self.max, 2)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """获取统计数据"""
+        labels = [f"<={bound}ms" for bound in self.bounds] + [f">{self.bounds[-1]}ms"]
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "total_ms": round(self.total, 2),
+            "avg_ms": round(self.total / self.count, 2) if self.count else 0.0,
+            "p50_ms": self.percentile(0.5),
+            "p95_ms": self.percentile(0.95),
+            "max_ms": round(self.max, 2),
+            "buckets": {label: count for label, count in zip(labels, self.counts) if count},
+        }
+
+
+class ScrapeMetrics:
+    """
+    刮削性能统计，记录各外部依赖的耗时分布、媒体项计数以及刮削运行时长，用于判断刮削瓶颈并调整并发数
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms: Dict[str, LatencyHistogram] = {}
+        self._counters: Dict[str, int] = {}
+        # 正在运行的刮削任务数量，多个任务并发运行时，运行时长按时间并集计算
+        self._active_runs = 0
+        self._busy_since: Optional[float] = None
+        self._busy_time = 0.0
+        self._runs = 0
+        self._reset_at = time.time()
+
+    @contextlib.contextmanager
+    def timer(self, name: str) -> Iterator[TimedCall]:
+        """
+        统计代码块的耗时，代码块抛出异常或将 failed 置为 True 时记为失败
+        :param name: 外部依赖名称
+        """
+        call = TimedCall()
+        start = time.perf_counter()
+        try:
+            yield call
+        except Exception:
+            self.record(name, time.perf_counter() - start, error=True)
+            raise
+        self.record(name, time.perf_counter() - start, error=call.failed)
+
+    def record(self, name: str, elapsed: float, error: bool = False):
+        """
+        记录一次外部依赖调用
+        :param name: 外部依赖名称
+        :param elapsed: 耗时（秒）
+        :param error: 调用是否失败
+        """
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = LatencyHistogram()
+            histogram.record(elapsed, error=error)
+
+    def incr(self, name: str, value: int = 1):
+        """增加计数器"""
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    @contextlib.contextmanager
+    def run(self) -> Iterator[None]:
+        """统计一次刮削运行的时长，用于计算吞吐量"""
+        with self._lock:
+            self._runs += 1
+            self._active_runs += 1
+            if self._active_runs == 1:
+                self._busy_since = time.monotonic()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._active_runs -= 1
+                if self._active_runs == 0 and self._busy_since is not None:
+                    self._busy_time += time.monotonic() - self._busy_since
+                    self._busy_since = None
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        获取统计数据
+        """
+        with self._lock:
+            busy_time = self._busy_time
+            if self._busy_since is not None:
+                busy_time += time.monotonic() - self._busy_since
+            dependencies = {name: histogram.snapshot() for name, histogram in self._histograms.items()}
+            counters = dict(self._counters)
+            runs, active_runs, reset_at = self._runs, self._active_runs, self._reset_at
+        # 处理的媒体项包括识别的以及因未变化而跳过的
+        processed = counters.get("items_resolved", 0) + counters.get("items_skipped", 0)
+        return {
+            "since": reset_at,
+            "runs": runs,
+            "active_runs": active_runs,
+            "busy_seconds": round(busy_time, 2),
+            "items_per_second": round(processed / busy_time, 2) if busy_time else 0.0,
+            "counters": counters,
+            "dependencies": dependencies,
+            "cache": cache_stats.snapshot(),
+        }
+
+    def summary(self) -> str:
+        """
+        获取统计摘要，用于日志输出
+        """
+        snapshot = self.snapshot()
+        parts = [f"{DEPENDENCY_NAMES.get(name, name)} {stats['count']} 次，失败 {stats['errors']} 次，"
+                 f"平均 {stats['avg_ms']} 毫秒，P95 {stats['p95_ms']} 毫秒"
+                 for name, stats in snapshot["dependencies"].items()]
+        if snapshot["busy_seconds"]:
+            parts.append(f"吞吐量 {snapshot['items_per_second']} 个/秒")
+        return "；".join(parts)
+
+    def reset(self):
+        """
+        重置统计数据，正在运行的刮削任务从当前时间重新计时
+        """
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+            self._busy_time = 0.0
+            self._runs = self._active_runs
+            if self._busy_since is not None:
+                self._busy_since = time.monotonic()
+            self._reset_at = time.time()
+        cache_stats.reset()
+
+
+# 全局刮削性能统计实例
+scrape_metrics = ScrapeMetrics()
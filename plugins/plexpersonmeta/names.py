@@ -0,0 +1,104 @@
+"""
+names.py
+
+这个模块定义了人物名称的规范化函数以及用于匹配人物的名称索引，规范化结果均进行了缓存，
+相同名称的拼音转换等操作只会执行一次
+"""
+import functools
+import re
+import unicodedata
+from typing import Any, Dict, Iterable, Optional
+
+import pypinyin
+
+from app.utils.string import StringUtils
+
+# 规范化结果的缓存数量
+_CACHE_SIZE = 65536
+
+
+@functools.lru_cache(maxsize=_CACHE_SIZE)
+def to_pinyin(name: str) -> str:
+    """将中文字符串转换为拼音，没有空格分隔"""
+    return pypinyin.slug(name, separator="", style=pypinyin.Style.NORMAL, strict=False).lower()
+
+
+@functools.lru_cache(maxsize=_CACHE_SIZE)
+def remove_spaces_and_lower(name: str) -> str:
+    """去除字符串中的空格并转换为小写"""
+    return name.replace(" ", "").lower()
+
+
+@functools.lru_cache(maxsize=_CACHE_SIZE)
+def standardize_name_order(name: str) -> str:
+    """将英文名标准化为统一的顺序（姓在前，名在后）"""
+    parts = name.split()
+    if len(parts) == 2:
+        return f"{parts[1]} {parts[0]}"
+    return name
+
+
+@functools.lru_cache(maxsize=_CACHE_SIZE)
+def normalize_name(name: str) -> str:
+    """规范化名称：NFKC 归一化、去除变音符号、转为小写并去除空格及标点"""
+    name = unicodedata.normalize("NFKD", unicodedata.normalize("NFKC", name))
+    name = "".join(char for char in name if not unicodedata.combining(char))
+    return re.sub(r"[\s\W_]+", "", name.lower())
+
+
+@functools.lru_cache(maxsize=_CACHE_SIZE)
+def name_variants(name: str, with_order: bool = False) -> tuple:
+    """
+    获取名称的所有规范化形式，按优先级排序
+    :param name: 名称
+    :param with_order: 是否包含姓名顺序调换后的形式
+    """
+    variants = [remove_spaces_and_lower(name), normalize_name(name)]
+    if StringUtils.is_chinese(name):
+        variants.append(to_pinyin(name))
+    if with_order:
+        variants.append(normalize_name(standardize_name_order(name)))
+    return tuple(dict.fromkeys(variant for variant in variants if variant and variant != name))
+
+
+class NameIndex:
+    """
+    人物名称索引，以名称原值及其规范化形式为键，查询时优先匹配原值
+    """
+
+    def __init__(self):
+        self._exact: Dict[str, Any] = {}
+        self._normalized: Dict[str, Any] = {}
+
+    def add(self, name: Optional[str], value: Any, with_order: bool = False):
+        """
+        添加名称，同名时后添加的覆盖先添加的
+        :param name: 名称
+        :param value: 名称对应的人物信息
+        :param with_order: 是否同时索引姓名顺序调换后的形式
+        """
+        if not name:
+            return
+        self._exact[name] = value
+        for variant in name_variants(name, with_order):
+            self._normalized[variant] = value
+
+    def find(self, names: Iterable[Optional[str]]) -> Optional[Any]:
+        """
+        按顺序查找名称，先匹配所有名称的原值，再匹配规范化形式
+        """
+        names = [name for name in names if name]
+        for name in names:
+            if name in self._exact:
+                return self._exact[name]
+        for name in names:
+            for variant in (name, *name_variants(name)):
+                if variant in self._normalized:
+                    return self._normalized[variant]
+        return None
+
+    def __len__(self) -> int:
+        return len(self._exact)
+
+    def __bool__(self) -> bool:
+        return bool(self._exact)
@@ -0,0 +1,240 @@
+"""
+notification.py
+
+这个模块定义了 Plex 通知监听，订阅 Plex 的 /:/websockets/notifications 通知流，将配置的媒体库中新建或刷新了元数据的
+媒体项按 ratingKey 去抖后批量交给刮削任务处理，无需等待入库事件或定时全量扫描
+"""
+import json
+import re
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from plexapi.alert import AlertListener
+
+from app.log import logger
+from app.schemas import ServiceInfo
+
+
+class PlexNotificationListener:
+    """
+    Plex 通知监听，每个媒体服务器一个实例，连接断开后按指数退避自动重连
+
+    处理的通知：
+    - timeline：媒体库时间线中处理完成（state=5）的电影、剧集及集，按 sectionID 过滤媒体库
+    - activity：结束的媒体项元数据刷新活动，通知中不包含媒体库，由刮削任务读取详情后过滤
+
+    同一媒体项在去抖时间内的多次通知只处理一次，刮削任务繁忙时保留待处理的媒体项，下次再提交
+    """
+    # 通知流的路径
+    url_path = AlertListener.key
+    # 媒体库时间线通知的标识
+    library_identifier = "com.plexapp.plugins.library"
+    # 时间线通知中媒体项处理完成的状态
+    processed_state = 5
+    # 时间线通知中媒体项已删除的状态
+    deleted_state = 9
+    # 需要处理的时间线条目类型：1 电影，2 剧集，4 集
+    item_types = {1, 2, 4}
+    # 需要处理的活动类型
+    activity_types = {"library.refresh.items", "library.update.item.metadata"}
+    # 检查待处理媒体项的间隔（秒）
+    poll_interval: float = 1.0
+    # 重连的初始间隔及上限（秒）
+    reconnect_delay: float = 5
+    max_reconnect_delay: float = 300
+    # 单次提交给刮削任务的媒体项数量上限
+    batch_size: int = 100
+
+    def __init__(self, service: ServiceInfo, libraries: Dict[int, Any],
+                 handler: Callable[[ServiceInfo, Dict[int, Any], List[str]], bool], debounce: float = 30):
+        """
+        :param service: 媒体服务器
+        :param libraries: 需要处理的媒体库，键为媒体库 ID
+        :param handler: 刮削任务，参数为媒体服务器、媒体库及 ratingKey 列表，刮削任务繁忙未处理时返回 False
+        :param debounce: 去抖时间（秒），媒体项最后一次通知后经过该时间才提交刮削
+        """
+        self.service = service
+        self.libraries = libraries
+        self.handler = handler
+        self.debounce = max(debounce, 0)
+        self._section_ids = {str(library_id) for library_id in libraries}
+        self._stop_event = threading.Event()
+        self._lock = threading.Lock()
+        # ratingKey -> 最后一次通知的时间
+        self._pending: Dict[str, float] = {}
+        self._ws = None
+        self._threads: List[threading.Thread] = []
+        self.received_count = 0
+        self.submitted_count = 0
+
+    @property
+    def running(self) -> bool:
+        return any(thread.is_alive() for thread in self._threads)
+
+    def start(self) -> bool:
+        """
+        启动监听，未安装 websocket-client 时无法启动
+        """
+        try:
+            import websocket  # noqa: F401
+        except ImportError:
+            logger.error("未安装 websocket-client，无法监听 Plex 通知")
+            return False
+        self._stop_event.clear()
+        self._threads = [
+            threading.Thread(target=self.__listen, name=f"plexpersonmeta-notify-{self.service.name}", daemon=True),
+            threading.Thread(target=self.__flush_loop, name=f"plexpersonmeta-flush-{self.service.name}",
+                             daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+        logger.info(f"开始监听媒体服务器 {self.service.name} 的通知")
+        return True
+
+    def stop(self, timeout: float = 5):
+        """停止监听，未提交的媒体项将被丢弃"""
+        self._stop_event.set()
+        ws = self._ws
+        if ws:
+            try:
+                ws.close()
+            except Exception as e:
+                logger.debug(f"关闭媒体服务器 {self.service.name} 的通知连接失败：{str(e)}")
+        for thread in self._threads:
+            thread.join(timeout=timeout)
+        self._threads = []
+        with self._lock:
+            self._pending.clear()
+        logger.info(f"已停止监听媒体服务器 {self.service.name} 的通知")
+
+    def url(self) -> Optional[str]:
+        """通知流的 websocket 地址"""
+        plex = self.service.instance
+        plex_server = plex.get_plex() if plex else None
+        if not plex_server:
+            return None
+        return re.sub(r"^http", "ws", plex_server.url(self.url_path, includeToken=True))
+
+    def handle_message(self, message: str):
+        """解析通知消息，记录需要刮削的媒体项"""
+        try:
+            container = json.loads(message).get("NotificationContainer") or {}
+        except (ValueError, AttributeError):
+            return
+        notification_type = container.get("type")
+        if notification_type == "timeline":
+            for entry in container.get("TimelineEntry") or []:
+                self.__handle_timeline(entry)
+        elif notification_type == "activity":
+            for notification in container.get("ActivityNotification") or []:
+                self.__handle_activity(notification)
+
+    def __handle_timeline(self, entry: dict):
+        if entry.get("identifier") != self.library_identifier:
+            return
+        if entry.get("type") not in self.item_types or str(entry.get("sectionID")) not in self._section_ids:
+            return
+        rating_key = str(entry.get("itemID") or "")
+        if not rating_key:
+            return
+        if entry.get("state") == self.deleted_state:
+            with self._lock:
+                self._pending.pop(rating_key, None)
+        elif entry.get("state") == self.processed_state:
+            self.add(rating_key)
+
+    def __handle_activity(self, notification: dict):
+        activity = notification.get("Activity") or {}
+        if notification.get("event") != "ended" or activity.get("type") not in self.activity_types:
+            return
+        key = (activity.get("Context") or {}).get("key") or ""
+        match = re.fullmatch(r"/library/metadata/(\d+)", key)
+        if match:
+            self.add(match.group(1))
+
+    def add(self, rating_key: str):
+        """记录媒体项的通知，去抖时间从最后一次通知开始计算"""
+        with self._lock:
+            self._pending[str(rating_key)] = time.monotonic()
+            self.received_count += 1
+
+    def pending_count(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def flush(self, force: bool = False) -> int:
+        """
+        将超过去抖时间的媒体项提交给刮削任务
+        :param force: 是否忽略去抖时间
+        :return: 提交的媒体项数量
+        """
+        now = time.monotonic()
+        with self._lock:
+            rating_keys = [rating_key for rating_key, notified_at in self._pending.items()
+                           if force or now - notified_at >= self.debounce]
+            for rating_key in rating_keys:
+                del self._pending[rating_key]
+        submitted = 0
+        for start in range(0, len(rating_keys), self.batch_size):
+            batch = rating_keys[start:start + self.batch_size]
+            if self._stop_event.is_set() or not self.__submit(batch):
+                self.__requeue(rating_keys[start:])
+                break
+            submitted += len(batch)
+        return submitted
+
+    def __submit(self, rating_keys: List[str]) -> bool:
+        try:
+            handled = self.handler(self.service, self.libraries, rating_keys)
+        except Exception as e:
+            logger.error(f"媒体服务器 {self.service.name} 刮削通知的媒体项失败，{str(e)}")
+            return True
+        if handled is False:
+            return False
+        with self._lock:
+            self.submitted_count += len(rating_keys)
+        return True
+
+    def __requeue(self, rating_keys: Iterable[str]):
+        """刮削任务繁忙时放回待处理的媒体项，期间收到的新通知保持不变"""
+        now = time.monotonic()
+        with self._lock:
+            for rating_key in rating_keys:
+                self._pending.setdefault(rating_key, now)
+
+    def __flush_loop(self):
+        while not self._stop_event.wait(self.poll_interval):
+            self.flush()
+
+    def __listen(self):
+        import websocket
+
+        delay = self.reconnect_delay
+        while not self._stop_event.is_set():
+            started_at = time.monotonic()
+            try:
+                url = self.url()
+                if url:
+                    self._ws = websocket.WebSocketApp(url,
+                                                      on_open=lambda _: logger.info(
+                                                          f"已连接媒体服务器 {self.service.name} 的通知流"),
+                                                      on_message=lambda _, message: self.handle_message(message),
+                                                      on_error=lambda _, error: logger.warning(
+                                                          f"媒体服务器 {self.service.name} 的通知流出现错误：{error}"))
+                    self._ws.run_forever(ping_interval=30, ping_timeout=10)
+                else:
+                    logger.warning(f"获取媒体服务器 {self.service.name} 的通知地址失败")
+            except Exception as e:
+                logger.error(f"监听媒体服务器 {self.service.name} 的通知失败：{str(e)}")
+            finally:
+                self._ws = None
+            if self._stop_event.is_set():
+                break
+            # 连接保持了一段时间后断开时从初始间隔重连，否则按指数退避
+            if time.monotonic() - started_at > self.max_reconnect_delay:
+                delay = self.reconnect_delay
+            logger.info(f"媒体服务器 {self.service.name} 的通知流已断开，{delay:.0f} 秒后重连")
+            if self._stop_event.wait(delay):
+                break
+            delay = min(delay * 2, self.max_reconnect_delay)
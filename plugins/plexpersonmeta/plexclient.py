@@ -0,0 +1,165 @@
+"""
+plexclient.py
+
+这个模块定义了刮削专用的 Plex HTTP 客户端，同一媒体服务器的所有刮削任务共用保持连接的会话，
+避免大量请求反复建立 TCP/TLS 连接
+"""
+import random
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+import plexapi
+import requests
+from requests import Response
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+
+from app.log import logger
+from app.schemas import ServiceInfo
+
+# 各媒体服务器共用的客户端，键为 （媒体服务器名称，服务器地址）
+_clients: Dict[Tuple[str, str], "PlexClient"] = {}
+_clients_lock = threading.Lock()
+
+
+class PlexClient:
+    """
+    Plex HTTP 客户端，接口与 MoviePilot Plex 模块的 get_data/put_data 一致，请求失败时返回 None
+
+    - 使用保持连接的 requests.Session，连接池大小与刮削并发数匹配
+    - 5xx 响应、已建立的连接被中断及读取超时按带随机抖动的指数退避重试，无法建立连接时不重试，立即失败
+    - 请求 gzip 压缩的 JSON 响应
+    """
+    # 需要重试的响应状态码
+    retry_statuses = {500, 502, 503, 504}
+    # 重试次数
+    retries: int = 3
+    # 重试的基础间隔（秒），第 n 次重试的间隔在 0 到 backoff * 2^n 之间随机选取
+    backoff: float = 0.5
+    # 建立连接的超时（秒），不超过请求的超时，服务器无法连接时尽快失败
+    connect_timeout: float = 5
+
+    def __init__(self, base_url: str, headers: Optional[Dict[str, str]] = None, pool_size: int = 10,
+                 verify: Any = True):
+        """
+        :param base_url: 服务器地址
+        :param headers: 请求头，包括 X-Plex-Token
+        :param pool_size: 连接池大小
+        :param verify: TLS 证书校验，与 requests 的 verify 参数一致
+        """
+        self.base_url = base_url.rstrip("/")
+        self.pool_size = 0
+        self._lock = threading.Lock()
+        self._session = requests.Session()
+        self._session.verify = verify
+        self._session.headers.update(headers or {})
+        self._session.headers.update({"Accept": "application/json", "Accept-Encoding": "gzip, deflate"})
+        self.ensure_pool_size(pool_size)
+
+    @classmethod
+    def for_service(cls, service: ServiceInfo, pool_size: int = 10) -> Optional["PlexClient"]:
+        """
+        获取媒体服务器共用的客户端，连接池小于需要的大小时扩大连接池
+        :return: 无法获取服务器地址时返回 None，调用方应继续使用媒体服务器实例
+        """
+        plex = service.instance if service else None
+        try:
+            plex_server = plex.get_plex() if plex and hasattr(plex, "get_plex") else None
+            token = service.config.config.get("token") if service.config and service.config.config else None
+            if not plex_server or not token:
+                return None
+            base_url = plex_server.url("")
+            # 与 plexapi 使用相同的客户端标识，服务器上显示为同一设备
+            headers = {**plexapi.BASE_HEADERS, "X-Plex-Token": token}
+            session = getattr(plex_server, "_session", None)
+            verify = session.verify if session is not None else True
+        except Exception as e:
+            logger.warning(f"获取媒体服务器 {service.name} 的连接信息失败：{str(e)}")
+            return None
+
+        key = (service.name, base_url)
+        with _clients_lock:
+            client = _clients.get(key)
+            if client is None or client.headers_changed(headers):
+                if client:
+                    client.close()
+                client = _clients[key] = cls(base_url=base_url, headers=headers, pool_size=pool_size, verify=verify)
+        client.ensure_pool_size(pool_size)
+        return client
+
+    @staticmethod
+    def close_all():
+        """关闭所有共用的客户端"""
+        with _clients_lock:
+            clients = list(_clients.values())
+            _clients.clear()
+        for client in clients:
+            client.close()
+
+    def headers_changed(self, headers: Dict[str, str]) -> bool:
+        """请求头（例如 X-Plex-Token）是否已变化"""
+        return any(self._session.headers.get(name) != value for name, value in headers.items())
+
+    def ensure_pool_size(self, pool_size: int):
+        """
+        连接池小于指定大小时重新挂载更大的连接池，并关闭原连接池的空闲连接，
+        进行中的请求不受影响，完成后其连接随原连接池关闭
+        """
+        with self._lock:
+            if pool_size <= self.pool_size:
+                return
+            old_adapters = {id(adapter): adapter for prefix, adapter in self._session.adapters.items()
+                            if prefix in ("http://", "https://")}
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+            self._session.mount("http://", adapter)
+            self._session.mount("https://", adapter)
+            self.pool_size = pool_size
+        for old_adapter in old_adapters.values():
+            old_adapter.close()
+
+    def get_data(self, endpoint: str, timeout: Optional[float] = None) -> Optional[Response]:
+        """读取数据"""
+        return self.request("GET", endpoint=endpoint, timeout=timeout)
+
+    def put_data(self, endpoint: str, params: Optional[dict] = None,
+                 timeout: Optional[float] = None) -> Optional[Response]:
+        """写入数据，写入人物信息是幂等的，可以安全重试"""
+        return self.request("PUT", endpoint=endpoint, params=params, timeout=timeout)
+
+    def request(self, method: str, endpoint: str, params: Optional[dict] = None,
+                timeout: Optional[float] = None) -> Optional[Response]:
+        """
+        发送请求，5xx 响应、已建立的连接被中断及读取超时时重试
+        :return: 响应，无法建立连接、重试后仍然连接中断或超时时返回 None
+        """
+        url = f"{self.base_url}/{endpoint.lstrip('/')}"
+        connect_timeout = min(self.connect_timeout, timeout) if timeout else self.connect_timeout
+        for attempt in range(self.retries + 1):
+            try:
+                response = self._session.request(method, url, params=params, timeout=(connect_timeout, timeout))
+            except (requests.ConnectionError, requests.Timeout) as e:
+                # 服务器无法连接时重试只会让每个请求多等待数个超时
+                if attempt >= self.retries or self.is_connect_error(e):
+                    logger.error(f"请求 Plex 失败：{method} {endpoint}，{str(e)}")
+                    return None
+            except requests.RequestException as e:
+                logger.error(f"请求 Plex 失败：{method} {endpoint}，{str(e)}")
+                return None
+            else:
+                if response.status_code not in self.retry_statuses or attempt >= self.retries:
+                    return response
+                response.close()
+            time.sleep(random.uniform(0, self.backoff * 2 ** attempt))
+        return None
+
+    @staticmethod
+    def is_connect_error(error: requests.RequestException) -> bool:
+        """是否为无法建立连接（连接被拒绝、主机不可达、连接超时），而不是已建立的连接被中断"""
+        if isinstance(error, requests.ConnectTimeout):
+            return True
+        reason = getattr(error.args[0], "reason", None) if error.args else None
+        return isinstance(reason, NewConnectionError)
+
+    def close(self):
+        self._session.close()
@@ -1,14 +1,19 @@
 import copy
+import functools
+import queue
 import re
 import threading
 import time
-from typing import Any, Dict, List, Optional
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+from urllib.parse import quote
 
 import plexapi
 import plexapi.utils
-import pypinyin
 import zhconv
 from plexapi.library import LibrarySection
+from requests import Response
 
 from app.chain.mediaserver import MediaServerChain
 from app.chain.tmdb import TmdbChain
@@ -19,19 +24,48 @@ cache_backend = Cache()
 from app.core.context import MediaInfo
 from app.log import logger
 from app.plugins import PluginChian
-from app.plugins.plexpersonmeta.helper import RatingInfo, cache_with_logging
+from app.plugins.plexpersonmeta import names
+from app.plugins.plexpersonmeta.helper import CastMap, RatingInfo, ScrapeJob, TransferTarget, \
+    cache_with_logging, douban_limiter, to_int
+from app.plugins.plexpersonmeta.metrics import scrape_metrics
+from app.plugins.plexpersonmeta.names import NameIndex
+from app.plugins.plexpersonmeta.plexclient import PlexClient
+from app.plugins.plexpersonmeta.store import CheckpointStore, FailureStore, FingerprintStore, PersonStore
 from app.schemas import MediaPerson, ServiceInfo
 from app.schemas.types import MediaType
 from app.utils.string import StringUtils
 
-lock = threading.Lock()
-
 
 class ScrapeHelper:
     timeout: int = 10
+    # 批量获取条目时 URL 的最大长度
+    max_url_length: int = 2000
+    # 批量获取条目时单次响应体的最大字节数
+    max_response_size: int = 8 * 1024 * 1024
+    # 批量获取条目时表示 URL 或请求过长的状态码，此时后续批次同样缩小
+    oversized_request_statuses = (413, 414)
+    # 缓存的人物索引数量上限
+    max_name_indexes: int = 64
+    # 缓存的剧集人物翻译映射数量上限
+    max_cast_maps: int = 64
+    # 从检查点继续时回溯的媒体项数量，媒体库内容变化导致位置偏移时，在该范围内查找检查点对应的媒体项
+    checkpoint_lookback: int = 100
+    # 检查点的最小保存间隔（秒）
+    checkpoint_interval: float = 30
+    # 全量刮削的处理顺序及对应的 Plex 排序参数
+    scrape_orders: Dict[str, Optional[str]] = {
+        "default": None,
+        "added": "addedAt:desc",
+        "viewed": "viewCount:desc",
+        "played": "lastViewedAt:desc",
+    }
 
     def __init__(self, config: dict, event: threading.Event, chain: PluginChian,
-                 service: ServiceInfo, libraries: dict[int, Any]):
+                 service: ServiceInfo, libraries: dict[int, Any],
+                 fingerprints: Optional[FingerprintStore] = None,
+                 persons: Optional[PersonStore] = None,
+                 checkpoints: Optional[CheckpointStore] = None,
+                 failures: Optional[FailureStore] = None):
         self.tmdb_chain = TmdbChain()
         self.mediaserver_chain = MediaServerChain()
         self.chain = chain
@@ -39,8 +73,39 @@ class ScrapeHelper:
         self.service = service
         self.plex = service.instance if service else None
         self.libraries = libraries
+        self.fingerprints = fingerprints
+        self.persons = persons
+        self.checkpoints = checkpoints
+        self.failures = failures
+        self._checkpoint_saved_at = time.monotonic()
+        # 因指纹未变化而跳过的媒体项数量
+        self.unchanged_count = 0
+        # 因人物信息与 Plex 中一致而跳过写回的媒体项数量
+        self.skipped_write_count = 0
+        # 因此前刮削失败且仍在退避期间而跳过的媒体项数量
+        self.backoff_count = 0
+        self._count_lock = threading.Lock()
+        # 按媒体缓存的人物索引，剧集的各集共用
+        self._name_indexes: OrderedDict = OrderedDict()
+        self._name_index_lock = threading.Lock()
+        # 正在构建的人物索引，同一媒体的索引只由一个线程构建
+        self._name_index_builds: Dict[tuple, threading.Lock] = {}
+        # 按剧集缓存的人物翻译映射，剧集本身及各集共用
+        self._cast_maps: OrderedDict = OrderedDict()
+        self._cast_map_lock = threading.Lock()
+        # 读取阶段的各线程共用批量获取条目的批次大小
+        self._fetch_batch_lock = threading.Lock()
+        self._fetch_workers = 4
+        self._resolve_workers = 4
+        self._write_workers = 2
+        self._page_size = 200
+        self._batch_size = 50
+        self._person_workers = 8
+        self._scrape_order = "default"
+        self.plex_client: Optional[PlexClient] = None
 
         if not config:
+            self._fetch_batch_size = self._batch_size
             return
         self._lock = config.get("lock")
         self._execute_transfer = config.get("execute_transfer")
@@ -48,84 +113,465 @@ class ScrapeHelper:
         self._remove_no_zh = config.get("remove_no_zh", False)
         self._douban_scrape = config.get("douban_scrape", True)
         # self._reserve_tag_key = config.get("reserve_tag_key", False)
-        try:
-            self._delay = int(config.get("delay", 200))
-        except ValueError:
-            self._delay = 200
-
-    def scrape_rating_items(self, rating_items: list):
+        self._delay = to_int(config.get("delay"), 200)
+        self._fetch_workers = to_int(config.get("fetch_workers"), self._fetch_workers, minimum=1)
+        self._resolve_workers = to_int(config.get("resolve_workers"), self._resolve_workers, minimum=1)
+        self._write_workers = to_int(config.get("write_workers"), self._write_workers, minimum=1)
+        self._page_size = to_int(config.get("page_size"), self._page_size, minimum=1)
+        self._batch_size = to_int(config.get("batch_size"), self._batch_size, minimum=1)
+        self._person_workers = to_int(config.get("person_workers"), self._person_workers, minimum=1)
+        if config.get("scrape_order") in self.scrape_orders:
+            self._scrape_order = config.get("scrape_order")
+        douban_limiter.configure(rate=to_int(config.get("douban_rate"), 10, minimum=1))
+        # 批量获取条目时实际使用的批次大小，请求或响应过大时会自动缩小
+        self._fetch_batch_size = self._batch_size
+        # 刮削专用的保持连接的 Plex 客户端，无法创建时使用媒体服务器实例；同一媒体服务器并发刮削的各媒体库共用客户端，
+        # 连接池按所有媒体库访问 Plex 的并发数设置：读取阶段的每个线程在读取条目的同时可能在后台预读下一页剧集，
+        # 另有一个线程预读媒体库的下一页
+        library_workers = to_int(config.get("library_workers"), 1, minimum=1)
+        self.plex_client = PlexClient.for_service(
+            service, pool_size=library_workers * (self._fetch_workers * 2 + self._write_workers + 1))
+
+    def pipeline(self) -> "ScrapePipeline":
+        """创建刮削流水线"""
+        return ScrapePipeline(helper=self,
+                              fetch_workers=self._fetch_workers,
+                              resolve_workers=self._resolve_workers,
+                              write_workers=self._write_workers)
+
+    def scrape_rating_items(self, rating_items: Iterable[dict]):
         """刮削媒体库中的媒体项"""
+        self.pipeline().run(functools.partial(self.iter_item_jobs, batch)
+                            for batch in self.batched(rating_items, self._batch_size))
+
+    def scrape_episode_items(self, episode_items: dict):
+        """刮削剧集的媒体信息"""
+        self.pipeline().run(functools.partial(self.iter_parent_episode_jobs, parent_key, episodes)
+                            for parent_key, episodes in episode_items.items())
+
+    def scrape_episodes(self, item: dict, episodes: Optional[dict] = None):
+        """刮削剧集"""
+        self.pipeline().run([functools.partial(self.iter_episode_jobs, item, episodes)])
+
+    def scrape_rating_keys(self, rating_keys: List[str]):
+        """刮削指定的媒体项，剧集的集仅刮削指定的集，不刮削整部剧集"""
+        self.pipeline().run(functools.partial(self.iter_rating_key_jobs, batch)
+                            for batch in self.batched(rating_keys, self._batch_size))
+
+    def scrape_library(self, library: LibrarySection) -> bool:
+        """
+        刮削媒体库，存在检查点时从检查点继续，处理过程中持续推进检查点
+        :return: 媒体库是否已全部处理完成
+        """
+        checkpoint_key = self.__checkpoint_key(library)
+        checkpoint = self.checkpoints.get(server=self.service.name, library_key=checkpoint_key) \
+            if self.checkpoints else None
+        if checkpoint:
+            logger.info(f"媒体库 {library.title} 从上次的检查点（第 {checkpoint[0]} 个媒体项）继续刮削")
+
+        progress = ScrapeProgress(on_advance=functools.partial(self.__advance_checkpoint, checkpoint_key))
+
+        def tasks() -> Iterator[Callable[[], Iterable[ScrapeJob]]]:
+            items = self.__iter_prioritized_items(
+                library=library, items=self.__iter_resume_items(library=library, checkpoint=checkpoint))
+            for batch in self.batched(items, self._batch_size):
+                position, rating_key, _ = batch[-1]
+                batch_id = progress.add_batch(position=position + 1, rating_key=rating_key)
+                yield functools.partial(self.__iter_progress_jobs, progress, batch_id,
+                                        [item for _, _, item in batch])
+
+        self.pipeline().run(tasks())
+
+        completed = progress.completed and not self.event.is_set()
+        if completed and self.checkpoints:
+            self.checkpoints.remove(server=self.service.name, library_key=checkpoint_key)
+        return completed
+
+    def __checkpoint_key(self, library: LibrarySection) -> str:
+        """检查点的键，不同处理顺序下媒体项的位置不同，按处理顺序分别记录检查点"""
+        if self._scrape_order == "default":
+            return str(library.key)
+        return f"{library.key}:{self._scrape_order}"
+
+    def __iter_prioritized_items(self, library: LibrarySection,
+                                 items: Iterable[Tuple[int, dict]]) -> Iterator[Tuple[int, str, dict]]:
+        """
+        将此前刮削失败的媒体项延后到最后处理，延后的媒体项使用最后一个正常媒体项的位置推进检查点，
+        中断后从检查点继续时会再次遇到并延后处理
+        :return: 媒体项推进检查点使用的位置及 ratingKey，以及媒体项
+        """
+        deferred = []
+        position, rating_key = -1, None
+        for index, rating_item in items:
+            if self.failures and self.failures.contains(server=self.service.name,
+                                                        rating_key=rating_item.get("ratingKey")):
+                deferred.append(rating_item)
+                continue
+            position, rating_key = index, rating_item.get("ratingKey")
+            yield position, rating_key, rating_item
+        if not deferred or self.event.is_set():
+            return
+        logger.info(f"媒体库 {library.title} 开始处理 {len(deferred)} 个此前刮削失败的媒体项")
+        for rating_item in deferred:
+            yield position, rating_key or rating_item.get("ratingKey"), rating_item
+
+    def __iter_resume_items(self, library: LibrarySection,
+                            checkpoint: Optional[Tuple[int, str]]) -> Iterator[Tuple[int, dict]]:
+        """
+        从检查点回溯一定数量后开始分页获取媒体项，查找到检查点对应的媒体项后从其下一个开始处理，
+        回溯范围内未找到时（媒体项已被删除或位置偏移过大），处理回溯范围内的所有媒体项
+        :return: 媒体项在媒体库中的位置以及媒体项
+        """
+        if not checkpoint:
+            yield from enumerate(self.iter_rating_items(library=library))
+            return
+
+        position, anchor = checkpoint
+        start = max(position - self.checkpoint_lookback, 0)
+        pending = []
+        for index, rating_item in enumerate(self.iter_rating_items(library=library, start=start), start=start):
+            if anchor:
+                if str(rating_item.get("ratingKey")) == anchor:
+                    pending, anchor = [], None
+                    continue
+                if index < position + self.checkpoint_lookback:
+                    pending.append((index, rating_item))
+                    continue
+                yield from pending
+                pending, anchor = [], None
+            yield index, rating_item
+        yield from pending
+
+    def __iter_progress_jobs(self, progress: "ScrapeProgress", batch_id: int,
+                             rating_items: List[dict]) -> Iterator[ScrapeJob]:
+        """读取一批媒体项，并跟踪其产出的任务的处理进度"""
+        for job in self.iter_item_jobs(rating_items):
+            progress.add_job(batch_id)
+            job.done = functools.partial(progress.done_job, batch_id)
+            yield job
+        if not self.event.is_set():
+            progress.finish_batch(batch_id)
+
+    def __advance_checkpoint(self, checkpoint_key: str, position: int, rating_key: str):
+        """推进检查点，并按间隔保存检查点及指纹"""
+        if not self.checkpoints:
+            return
+        self.checkpoints.update(server=self.service.name, library_key=checkpoint_key,
+                                position=position, rating_key=rating_key)
+        now = time.monotonic()
+        if now - self._checkpoint_saved_at < self.checkpoint_interval:
+            return
+        self._checkpoint_saved_at = now
+        if self.fingerprints:
+            self.fingerprints.save()
+        if self.failures:
+            self.failures.save()
+        self.checkpoints.save()
+
+    def scrape_transfer_targets(self, targets: Iterable[TransferTarget]) -> Set[tuple]:
+        """
+        定位入库媒体在媒体服务器中的条目，仅刮削对应的媒体项及剧集
+        :return: 已定位到的入库媒体的键
+        """
+        tasks = []
+        resolved = set()
+        for target in targets:
+            if self.event.is_set():
+                break
+            try:
+                rating_items = self.find_transfer_items(target=target)
+            except Exception as e:
+                logger.error(f"{target.title} 定位媒体项失败，{str(e)}")
+                continue
+            if not rating_items:
+                logger.info(f"{target.title} 未在媒体服务器 {self.service.name} 中找到对应的媒体项")
+                continue
+            resolved.add(target.key)
+            tasks.extend(functools.partial(self.iter_transfer_jobs, rating_item, target)
+                         for rating_item in rating_items)
+        if tasks:
+            self.pipeline().run(tasks)
+        return resolved
+
+    def find_transfer_items(self, target: TransferTarget) -> List[dict]:
+        """
+        按标题在对应类型的媒体库中搜索，并通过 TMDB guid 过滤出入库媒体的条目
+        """
+        libtype = "movie" if target.mtype == MediaType.MOVIE else "show"
+        rating_items = {}
+        for library in (self.libraries or {}).values():
+            if library.TYPE != libtype:
+                continue
+            for title in target.titles:
+                endpoint = (f"/library/sections/{library.key}/all?type={plexapi.utils.searchType(libtype=libtype)}"
+                            f"&title={quote(title)}&includeGuids=1")
+                response = self.get_data(endpoint=endpoint)
+                if response is None:
+                    continue
+                for data in response.json().get("MediaContainer", {}).get("Metadata", []):
+                    if self.get_tmdb_id(data) == target.tmdbid and data.get("ratingKey"):
+                        rating_items[str(data.get("ratingKey"))] = data
+                if rating_items:
+                    break
+        return list(rating_items.values())
+
+    def iter_transfer_jobs(self, rating_item: dict, target: TransferTarget) -> Iterator[ScrapeJob]:
+        """读取入库媒体的详情，如果是 show 类型，仅继续读取本次入库的剧集"""
+        item = self.fetch_item(rating_key=rating_item.get("ratingKey"))
+        if not item:
+            logger.warning(f"媒体项 {target.title} 未获取到详细信息")
+            return
+        info = self.get_rating_info(item=item)
+        if not info:
+            return
+        if self.match_roles(item):
+            logger.debug(f"{info.title} 的演员信息自上次刮削后未发生变化，跳过")
+        else:
+            yield ScrapeJob(info=info, item=item)
+
+        if info.type != "show" or self.event.is_set():
+            return
+        episodes = [episode for episode in self.iter_episodes(rating_key=info.key) if target.match_episode(episode)]
+        yield from self.iter_episode_jobs(item=item, episodes=episodes)
+
+    def iter_item_jobs(self, rating_items: List[dict]) -> Iterator[ScrapeJob]:
+        """批量读取媒体项详情，如果是 show 类型，继续读取其下的所有剧集"""
+        infos: Dict[str, RatingInfo] = {}
+        unchanged_shows: List[dict] = []
         for rating_item in rating_items:
-            if self.check_external_interrupt():
-                return
             info = self.get_rating_info(item=rating_item)
             if not info or info.type not in ["movie", "show"]:
                 continue
-            item = {}
-            try:
-                item = self.fetch_item(rating_key=info.key)
-                if not item:
-                    continue
-                logger.info(f"开始刮削 {info.title} 的演员信息 ...")
-                self.scrape_item(item=item)
-                logger.info(f"{info.title} 的演员信息刮削完成")
-            except Exception as e:
-                logger.error(f"媒体项 {info.title} 刮削过程中出现异常，{str(e)}")
+            # 媒体项自上次刮削后未变化，无需读取详情；剧集的指纹不反映各集的处理情况，仍需逐集检查
+            if self.is_unchanged(rating_item):
+                logger.debug(f"{info.title} 自上次刮削后未发生变化，跳过")
+                if info.type == "show":
+                    unchanged_shows.append(rating_item)
+                continue
+            if self.is_backing_off(rating_item):
+                logger.debug(f"{info.title} 此前刮削失败，尚未到重试时间，跳过")
+                continue
+            infos[str(info.key)] = info
+
+        for rating_item in unchanged_shows:
+            if self.event.is_set():
+                return
+            yield from self.iter_unchanged_show_jobs(rating_item)
+        if not infos:
+            return
+
+        try:
+            items = self.fetch_items(rating_keys=list(infos.keys()))
+        except Exception as e:
+            logger.error(f"批量获取 {len(infos)} 个媒体项详细信息失败，{str(e)}")
+            return
+
+        for key, info in infos.items():
+            if self.event.is_set():
+                return
+            item = items.get(key)
+            if not item:
+                logger.warning(f"媒体项 {info.title} 未获取到详细信息")
+                continue
+            if self.match_roles(item):
+                logger.debug(f"{info.title} 的演员信息自上次刮削后未发生变化，跳过")
+            else:
+                yield ScrapeJob(info=self.get_rating_info(item=item), item=item)
 
             if info.type != "show":
-                logger.info(f"<{info.title}> 类型为 {info.type}，非show类型，跳过剧集刮削")
+                logger.debug(f"<{info.title}> 类型为 {info.type}，非show类型，跳过剧集刮削")
                 continue
             logger.info(f"<{info.title}> 类型为 show，准备进行剧集刮削")
-            self.scrape_episodes(item=item)
+            yield from self.iter_episode_jobs(item=item)
 
-    def scrape_episode_items(self, episode_items: dict):
-        """刮削剧集的媒体信息"""
-        for parent_key, episodes in episode_items.items():
-            if self.check_external_interrupt():
+    def iter_unchanged_show_jobs(self, rating_item: dict) -> Iterator[ScrapeJob]:
+        """
+        剧集本身自上次刮削后未变化时，按各集自身的指纹过滤剧集，仅在存在需要刮削的集时读取剧集详情；
+        剧集的指纹在剧集本身处理完成时即已记录，此时其下的集可能尚未处理完成（中断、失败重试）或之后单独发生了变化，
+        各集均已处理完成后记录到剧集的指纹中，重新检查的间隔内不再列出各集
+        """
+        info = self.get_rating_info(item=rating_item)
+        if not info or not rating_item.get("leafCount"):
+            return
+        if self.is_episodes_done(rating_item):
+            logger.debug(f"{info.title} 的所有集均已处理完成，跳过剧集刮削")
+            return
+        # 剧集已被删除或无法访问时只跳过这部剧集，不影响同一批次中的其他媒体项
+        try:
+            yield from self.__iter_unchanged_show_jobs(info=info, rating_item=rating_item)
+        except Exception as e:
+            logger.error(f"媒体项 {info.title} 获取剧集过程中出现异常，{str(e)}")
+
+    def __iter_unchanged_show_jobs(self, info: RatingInfo, rating_item: dict) -> Iterator[ScrapeJob]:
+        """列出未变化剧集的所有集，读取其中需要刮削的集"""
+        pending = []
+        retry_times = []
+        for episode in self.iter_episodes(rating_key=info.key):
+            if self.event.is_set():
                 return
-            item = self.fetch_item(rating_key=parent_key)
+            episode_info = self.get_rating_info(item=episode, parent_item=rating_item)
+            if not episode_info or episode_info.type != "episode":
+                continue
+            if self.is_unchanged(episode):
+                logger.debug(f"{episode_info.title} 自上次刮削后未发生变化，跳过")
+                continue
+            if self.is_backing_off(episode):
+                logger.debug(f"{episode_info.title} 此前刮削失败，尚未到重试时间，跳过")
+                retry_times.append(self.retry_at(episode))
+                continue
+            pending.append(episode)
+        if not pending:
+            # 仍在退避的集到期后需要重试，最晚在最早的重试时间重新检查
+            self.mark_episodes_done(rating_item, retry_at=min(filter(None, retry_times), default=None))
+            return
+
+        item = self.fetch_item(rating_key=info.key)
+        if not item:
+            logger.warning(f"媒体项 {info.title} 未获取到详细信息")
+            return
+        logger.info(f"<{info.title}> 共计 {len(pending)} 集需要刮削，准备进行剧集刮削")
+        yield from self.__iter_episode_jobs(item=item, episodes=pending)
+
+    def iter_rating_key_jobs(self, rating_keys: List[str]) -> Iterator[ScrapeJob]:
+        """批量读取指定媒体项的详情，集需要再读取其所属剧集以获取 tmdbid，不在配置的媒体库中的媒体项将被忽略"""
+        try:
+            items = self.fetch_items(rating_keys=rating_keys)
+        except Exception as e:
+            logger.error(f"批量获取 {len(rating_keys)} 个媒体项详细信息失败，{str(e)}")
+            return
+
+        episodes: Dict[str, List[dict]] = {}
+        for rating_key in rating_keys:
+            item = items.get(str(rating_key))
             if not item:
                 continue
-            self.scrape_episodes(item=item, episodes=episodes)
+            if self.libraries and item.get("librarySectionID") not in self.libraries:
+                continue
+            if item.get("type") == "episode":
+                parent_key = item.get("grandparentRatingKey") or \
+                             self.extract_key_from_url(item.get("grandparentKey") or "")
+                if parent_key:
+                    episodes.setdefault(str(parent_key), []).append(item)
+                continue
+            info = self.get_rating_info(item=item)
+            if not info or info.type not in ["movie", "show"]:
+                continue
+            if self.match_roles(item):
+                logger.debug(f"{info.title} 的演员信息自上次刮削后未发生变化，跳过")
+                continue
+            yield ScrapeJob(info=info, item=item)
 
-    def scrape_episodes(self, item: dict, episodes: Optional[dict] = None):
-        """刮削剧集"""
+        if not episodes or self.event.is_set():
+            return
+        try:
+            parents = self.fetch_items(rating_keys=list(episodes.keys()))
+        except Exception as e:
+            logger.error(f"批量获取 {len(episodes)} 个剧集详细信息失败，{str(e)}")
+            return
+        for parent_key, episode_items in episodes.items():
+            parent = parents.get(parent_key)
+            if not parent:
+                continue
+            for episode_item in episode_items:
+                episode_info = self.get_rating_info(item=episode_item, parent_item=parent)
+                if not episode_info:
+                    continue
+                if self.match_roles(episode_item):
+                    logger.debug(f"{episode_info.title} 的演员信息自上次刮削后未发生变化，跳过")
+                    continue
+                yield ScrapeJob(info=episode_info, item=episode_item)
+
+    def iter_parent_episode_jobs(self, parent_key: str, episodes: list) -> Iterator[ScrapeJob]:
+        """读取父级条目后，再读取指定的剧集"""
+        item = self.fetch_item(rating_key=parent_key)
+        if not item:
+            return
+        yield from self.iter_episode_jobs(item=item, episodes=episodes)
+
+    def iter_episode_jobs(self, item: dict, episodes: Optional[list] = None) -> Iterator[ScrapeJob]:
+        """读取剧集详情"""
         info = self.get_rating_info(item=item)
         if not info or info.type != "show":
             return
 
-        try:
-            # 如果 episodes 为空，这里获取所有的 episodes 进行刮削
-            episodes_provided_all = episodes is None
-            if episodes_provided_all:
-                episodes = self.list_episodes(rating_key=info.key)
-
-            if not episodes:
+        # 如果 episodes 为空，这里分页获取所有的 episodes 进行刮削
+        if episodes is None:
+            if not item.get("leafCount"):
                 logger.info(f"<{info.title}> 没有找到任何剧集信息，取消剧集刮削")
-            else:
-                if episodes_provided_all:
-                    logger.info(
-                        f"<{info.title}> 共计 {item.get('childCount', 0)} 季 {len(episodes)} 集，准备进行剧集刮削")
-                else:
-                    logger.info(f"<{info.title}> 共计 {len(episodes)} 集，准备进行剧集刮削")
+                return
+            logger.info(f"<{info.title}> 共计 {item.get('childCount', 0)} 季 {item.get('leafCount')} 集，准备进行剧集刮削")
+            episodes = self.iter_episodes(rating_key=info.key)
+        elif not episodes:
+            logger.info(f"<{info.title}> 没有找到任何剧集信息，取消剧集刮削")
+            return
+        else:
+            logger.info(f"<{info.title}> 共计 {len(episodes)} 集，准备进行剧集刮削")
+
+        try:
+            yield from self.__iter_episode_jobs(item=item, episodes=episodes)
+        except Exception as e:
+            logger.error(f"媒体项 {info.title} 获取剧集过程中出现异常，{str(e)}")
 
-            for episode in episodes:
-                if self.check_external_interrupt():
-                    return
+    def __iter_episode_jobs(self, item: dict, episodes: Iterable[dict]) -> Iterator[ScrapeJob]:
+        """分批读取剧集详情"""
+        for batch in self.batched(episodes, self._batch_size):
+            if self.event.is_set():
+                return
+            infos: Dict[str, RatingInfo] = {}
+            for episode in batch:
                 episode_info = self.get_rating_info(item=episode, parent_item=item)
                 if not episode_info or episode_info.type != "episode":
                     continue
-                try:
-                    episode_item = self.fetch_item(rating_key=episode_info.key)
-                    if not episode_item:
-                        continue
-                    logger.info(f"开始刮削 {episode_info.title} 的演员信息 ...")
-                    self.scrape_item(item=episode_item, info=episode_info)
-                    logger.info(f"{episode_info.title} 的演员信息刮削完成")
-                except Exception as e:
-                    logger.error(f"媒体项 {episode_info.title} 刮削过程中出现异常，{str(e)}")
+                if self.is_unchanged(episode):
+                    logger.debug(f"{episode_info.title} 自上次刮削后未发生变化，跳过")
+                    continue
+                if self.is_backing_off(episode):
+                    logger.debug(f"{episode_info.title} 此前刮削失败，尚未到重试时间，跳过")
+                    continue
+                infos[str(episode_info.key)] = episode_info
+            if not infos:
+                continue
+
+            try:
+                episode_items = self.fetch_items(rating_keys=list(infos.keys()))
+            except Exception as e:
+                logger.error(f"批量获取 {len(infos)} 个剧集详细信息失败，{str(e)}")
+                continue
+
+            for key, episode_info in infos.items():
+                episode_item = episode_items.get(key)
+                if not episode_item:
+                    logger.warning(f"媒体项 {episode_info.title} 未获取到详细信息")
+                    continue
+                if self.match_roles(episode_item):
+                    logger.debug(f"{episode_info.title} 的演员信息自上次刮削后未发生变化，跳过")
+                    continue
+                yield ScrapeJob(info=episode_info, item=episode_item)
+
+    def resolve_job(self, job: ScrapeJob) -> Optional[ScrapeJob]:
+        """识别任务中的人物信息，需要写回 Plex 时返回该任务"""
+        logger.info(f"开始刮削 {job.info.title} 的演员信息 ...")
+        job.actors = self.resolve_item(item=job.item, info=job.info)
+        scrape_metrics.incr("items_resolved")
+        if job.actors and not self.need_put_actors(item=job.item, actors=job.actors,
+                                                         title=job.info.title):
+            job.actors = None
+        if not job.actors:
+            logger.info(f"{job.info.title} 的演员信息刮削完成")
+            return None
+        return job
+
+    def write_job(self, job: ScrapeJob):
+        """将任务中识别完成的人物信息写回 Plex"""
+        try:
+            self.put_actors(item=job.item, actors=job.actors)
+            self.remember(item=job.item, actors=job.actors)
+            scrape_metrics.incr("items_written")
+            logger.info(f"{job.info.title} 的中文人物信息更新完成")
         except Exception as e:
-            logger.error(f"媒体项 {info.title} 刮削剧集过程中出现异常，{str(e)}")
+            logger.error(f"{job.info.title} 的中文人物信息更新失败：{str(e)}")
+            self.record_failure(item=job.item, reason="write_error")
+        logger.info(f"{job.info.title} 的演员信息刮削完成")
 
     def scrape_item(self, item: dict, info: Optional[RatingInfo] = None):
         """
@@ -133,13 +579,72 @@ class ScrapeHelper:
         """
         if not item:
             return
+        if not info:
+            info = self.get_rating_info(item=item)
+        job = self.resolve_job(ScrapeJob(info=info, item=item))
+        if job:
+            self.write_job(job)
+
+    def resolve_item(self, item: dict, info: Optional[RatingInfo] = None) -> Optional[list]:
+        """
+        识别媒体服务器中的条目，返回需要更新的人物信息
+        """
+        if not item:
+            return None
 
         if not info:
             info = self.get_rating_info(item=item)
 
         if not info or not info.tmdbid:
             logger.warning(f"{info.title} 未找到tmdbid，无法识别媒体信息")
-            return
+            self.record_failure(item=item, reason="no_tmdbid")
+            return None
+
+        if not self.need_trans_actor(item):
+            logger.info(f"{info.title} 的人物信息已是中文，无需更新")
+            self.remember(item=item)
+            return None
+
+        cast_map = self.get_cast_map(info=info)
+        if cast_map is None:
+            return self.__resolve_actors(item=item, info=info)
+
+        # 剧集的各集优先使用剧集人物翻译映射，只需识别映射未覆盖且未识别过的客串人物
+        with cast_map.lock:
+            mapped_item = cast_map.apply(item=item)
+            actors = (mapped_item or item).get("Role", [])
+            guests = [original for original, actor in zip(item.get("Role", []), actors)
+                      if self.need_trans_people(actor) and not cast_map.is_attempted(original)]
+        if not guests:
+            logger.info(f"{info.title} 的人物信息已从剧集人物翻译映射中获取")
+            return actors
+
+        logger.info(f"{info.title} 有 {len(guests)} 个人物未被剧集人物翻译映射覆盖，开始识别")
+        trans_guests = self.__resolve_actors(item=item, info=info, base_item={**item, "Role": guests})
+        if not trans_guests:
+            # 客串人物识别失败时仍写回已从剧集人物翻译映射中获取的人物，映射未翻译任何人物时保留失败记录
+            return actors if mapped_item else trans_guests
+        with cast_map.lock:
+            cast_map.learn(originals=guests, actors=trans_guests)
+        trans_actors = {actor.get("id"): actor for actor in trans_guests if actor.get("id")}
+        return [trans_actors.get(actor.get("id"), actor) for actor in actors]
+
+    def __resolve_actors(self, item: dict, info: RatingInfo, base_item: Optional[dict] = None) -> Optional[list]:
+        """
+        依次使用本地人物翻译库、TMDB 及豆瓣识别人物信息
+        :param item: Plex 中的条目详情
+        :param info: 媒体项目信息
+        :param base_item: 需要翻译的条目副本，可以只包含部分人物，为空时翻译条目详情中的所有人物
+        """
+        base_item = base_item or item
+
+        # 优先使用本地人物翻译库，全部翻译完成时无需再请求 TMDB 及豆瓣
+        local_item = self.translate_by_store(item=base_item)
+        if local_item:
+            if not self.need_trans_actor(local_item):
+                logger.info(f"{info.title} 的人物信息已从本地人物翻译库中获取")
+                return local_item.get("Role")
+            logger.info(f"{info.title} 的部分人物信息已从本地人物翻译库中获取")
 
         logger.info(f"{info.title} 正在获取 TMDB 媒体信息")
         mediainfo = self.get_tmdb_media(tmdbid=info.tmdbid,
@@ -147,24 +652,183 @@ class ScrapeHelper:
                                         mtype=MediaType.MOVIE if item.get("type") == "movie" else MediaType.TV)
         if not mediainfo:
             logger.warning(f"{info.title} TMDB 未识别到媒体信息")
-            return
+            self.record_failure(item=item, reason="tmdb_not_found")
+            return None
 
         try:
-            if self.need_trans_actor(item):
-                self.update_peoples(item=item, mediainfo=mediainfo, info=info)
-            else:
-                logger.info(f"{info.title} 的人物信息已是中文，无需更新")
+            trans_actors = self.translate_peoples(item=local_item or base_item, mediainfo=mediainfo, info=info)
         except Exception as e:
             logger.error(f"{info.title} 更新人物信息时出错：{str(e)}")
+            self.record_failure(item=item, reason="resolve_error")
+            return None
+        if not trans_actors:
+            if not self.event.is_set():
+                self.remember(item=item)
+            return trans_actors
+        self.remember_persons(originals=item.get("Role", []), actors=trans_actors)
+        return trans_actors
+
+    def get_cast_map(self, info: RatingInfo) -> Optional[CastMap]:
+        """
+        获取剧集的人物翻译映射，不存在时创建，超过上限时淘汰最久未使用的映射
+        :return: 电影返回 None
+        """
+        if info.type not in ("show", "episode") or not info.tmdbid:
+            return None
+        with self._cast_map_lock:
+            cast_map = self._cast_maps.get(info.tmdbid)
+            if cast_map is None:
+                cast_map = self._cast_maps[info.tmdbid] = CastMap()
+            self._cast_maps.move_to_end(info.tmdbid)
+            while len(self._cast_maps) > self.max_cast_maps:
+                self._cast_maps.popitem(last=False)
+            return cast_map
+
+    def translate_by_store(self, item: dict) -> Optional[dict]:
+        """
+        使用本地人物翻译库批量翻译人物信息
+        :return: 翻译后的条目副本，没有任何人物被翻译时返回 None
+        """
+        if not self.persons:
+            return None
+        actors = item.get("Role", [])
+        actor_keys = [PersonStore.person_keys(actor) for actor in actors]
+        person_keys = [key for keys in actor_keys for key in keys]
+        if not person_keys:
+            return None
+        try:
+            cn_names = self.persons.get_names(person_keys)
+            cn_roles = self.persons.get_roles(person_keys)
+        except Exception as e:
+            logger.error(f"查询本地人物翻译库失败：{str(e)}")
+            return None
+        if not cn_names and not cn_roles:
+            return None
+
+        translated = False
+        trans_actors = copy.deepcopy(actors)
+        for actor, keys in zip(trans_actors, actor_keys):
+            tag_value = actor.get("tag")
+            if tag_value and not StringUtils.is_chinese(tag_value):
+                cn_name = next((cn_names[key] for key in keys if key in cn_names), None)
+                if cn_name:
+                    actor["tag"] = cn_name
+                    translated = True
+            role_value = actor.get("role")
+            if role_value and not StringUtils.is_chinese(role_value):
+                cn_role = next((cn_roles[(key, role_value)] for key in keys if (key, role_value) in cn_roles), None)
+                if cn_role:
+                    actor["role"] = cn_role
+                    translated = True
+        if not translated:
+            return None
+        return {**item, "Role": trans_actors}
+
+    def remember_persons(self, originals: list, actors: list):
+        """
+        将翻译结果保存到本地人物翻译库
+        :param originals: Plex 中原始的人物信息
+        :param actors: 翻译后的人物信息
+        """
+        if not self.persons or not actors:
+            return
+        original_actors = {original.get("id"): original for original in originals if original.get("id")}
+        cn_names, cn_roles = {}, {}
+        for actor in actors:
+            original = original_actors.get(actor.get("id"))
+            if not original:
+                continue
+            keys = PersonStore.person_keys(original)
+            tag_value = actor.get("tag")
+            if tag_value and tag_value != original.get("tag") and StringUtils.is_chinese(tag_value):
+                if actor.get("person_tmdbid"):
+                    cn_names[f"tmdb:{actor.get('person_tmdbid')}"] = tag_value
+                for key in keys:
+                    cn_names[key] = tag_value
+            role_value, original_role = actor.get("role"), original.get("role")
+            if original_role and role_value and role_value != original_role and StringUtils.is_chinese(role_value):
+                for key in keys:
+                    cn_roles[(key, original_role)] = role_value
+        try:
+            self.persons.save(names=cn_names, roles=cn_roles)
+        except Exception as e:
+            logger.error(f"保存本地人物翻译库失败：{str(e)}")
+
+    def is_unchanged(self, item: dict) -> bool:
+        """判断媒体项自上次刮削后是否未发生变化"""
+        if not self.fingerprints or not self.service:
+            return False
+        if not self.fingerprints.is_unchanged(server=self.service.name, item=item):
+            return False
+        with self._count_lock:
+            self.unchanged_count += 1
+        scrape_metrics.incr("items_skipped")
+        return True
+
+    def match_roles(self, item: dict) -> bool:
+        """判断媒体项的演员信息自上次刮削后是否未发生变化"""
+        if not self.fingerprints or not self.service:
+            return False
+        if not self.fingerprints.match_roles(server=self.service.name, item=item):
+            return False
+        with self._count_lock:
+            self.unchanged_count += 1
+        scrape_metrics.incr("items_skipped")
+        return True
+
+    def is_episodes_done(self, item: dict) -> bool:
+        """判断未变化的剧集其下所有集是否均已处理完成"""
+        if not self.fingerprints or not self.service:
+            return False
+        return self.fingerprints.is_episodes_done(server=self.service.name, item=item)
+
+    def mark_episodes_done(self, item: dict, retry_at: Optional[int] = None):
+        """记录剧集其下所有集均已处理完成，重新检查前无需再列出各集"""
+        if self.fingerprints and self.service:
+            self.fingerprints.mark_episodes_done(server=self.service.name, item=item, retry_at=retry_at)
+
+    def retry_at(self, item: dict) -> Optional[int]:
+        """媒体项仍在退避期间时下次重试的时间"""
+        if not self.failures or not self.service:
+            return None
+        return self.failures.retry_at(server=self.service.name, item=item)
+
+    def remember(self, item: dict, actors: Optional[list] = None):
+        """记录媒体项的指纹，下次运行时未发生变化的媒体项将被跳过"""
+        if not self.service:
+            return
+        if self.failures:
+            self.failures.discard(server=self.service.name, rating_key=item.get("ratingKey"))
+        if self.fingerprints:
+            self.fingerprints.update(server=self.service.name, item=item, actors=actors)
+
+    def record_failure(self, item: Optional[dict], reason: str):
+        """记录媒体项刮削失败，退避期间跳过，退避结束后在全量刮削时延后处理"""
+        if not self.failures or not self.service or not item or self.event.is_set():
+            return
+        self.failures.record(server=self.service.name, item=item, reason=reason)
+
+    def is_backing_off(self, item: dict) -> bool:
+        """媒体项此前刮削失败且仍在退避期间"""
+        if not self.failures or not self.service:
+            return False
+        if not self.failures.is_backing_off(server=self.service.name, item=item):
+            return False
+        with self._count_lock:
+            self.backoff_count += 1
+        scrape_metrics.incr("items_backoff")
+        return True
 
     def need_trans_actor(self, item: dict) -> bool:
         """
         是否需要处理人物信息
         """
-        actors = item.get("Role", [])
-        if not actors:
-            return False
+        return any(self.need_trans_people(actor) for actor in item.get("Role", []))
 
+    def need_trans_people(self, actor: dict) -> bool:
+        """
+        是否需要处理单个人物的信息
+        """
         field_to_check = None
         if self._scrape_type == "name":
             field_to_check = "tag"
@@ -172,24 +836,30 @@ class ScrapeHelper:
             field_to_check = "role"
 
         if field_to_check:
-            for actor in actors:
-                # 检查特定字段，且字段不能为空
-                field_value = actor.get(field_to_check)
-                if field_value and not StringUtils.is_chinese(field_value):
-                    return True
-        else:
-            for actor in actors:
-                # 刮削为 all 时，检查 tag 和 role 两个字段，且字段不能均为空
-                tag_value = actor.get("tag")
-                role_value = actor.get("role")
-                if (tag_value and not StringUtils.is_chinese(tag_value)) or \
-                        (role_value and not StringUtils.is_chinese(role_value)):
-                    return True
+            # 检查特定字段，且字段不能为空
+            field_value = actor.get(field_to_check)
+            return bool(field_value) and not StringUtils.is_chinese(field_value)
 
-        return False
+        # 刮削为 all 时，检查 tag 和 role 两个字段，且字段不能均为空
+        tag_value = actor.get("tag")
+        role_value = actor.get("role")
+        return bool((tag_value and not StringUtils.is_chinese(tag_value)) or
+                    (role_value and not StringUtils.is_chinese(role_value)))
 
     def update_peoples(self, item: dict, mediainfo: MediaInfo, info: Optional[RatingInfo] = None):
-        """处理媒体项中的人物信息"""
+        """处理媒体项中的人物信息，并写回 Plex"""
+        trans_actors = self.translate_peoples(item=item, mediainfo=mediainfo, info=info)
+        title = info.title if info and info.title else item.get("title")
+        if trans_actors and self.need_put_actors(item=item, actors=trans_actors, title=title):
+            try:
+                self.put_actors(item=item, actors=trans_actors)
+                logger.info(f"{title} 的中文人物信息更新完成")
+            except Exception as e:
+                logger.error(f"{title} 的中文人物信息更新失败：{str(e)}")
+
+    def translate_peoples(self, item: dict, mediainfo: MediaInfo,
+                          info: Optional[RatingInfo] = None) -> Optional[list]:
+        """识别媒体项中的人物信息，返回翻译后的人物列表"""
         """
         item 的数据结构：
         {
@@ -225,47 +895,27 @@ class ScrapeHelper:
         }
         """
         if not mediainfo:
-            return
+            return None
 
         title = info.title if info and info.title else item.get("title")
-        actors = item.get("Role", [])
+        # 使用副本进行翻译，保留条目中原始的人物信息
+        actors = copy.deepcopy(item.get("Role", []))
         trans_actors = []
 
-        # 将 mediainfo.actors 转换为字典，以 original_name、name、alias 和拼音为键
-        actor_dict = {}
-        for actor in mediainfo.actors:
-            name = actor.get("name")
-            original_name = actor.get("original_name")
-            if name:
-                actor_dict[name] = actor
-                if StringUtils.is_chinese(name):
-                    actor_dict[self.to_pinyin(name)] = actor
-            if original_name:
-                actor_dict[original_name] = actor
-            person_tmdbid = actor.get("id")
-            if person_tmdbid:
-                logger.info(f"{name} 正在获取 TMDB 人物信息")
-                person_detail = self.get_tmdb_person_detail(person_tmdbid=person_tmdbid)
-                if person_detail:
-                    cn_name = self.get_chinese_name(person=person_detail)
-                    if cn_name:
-                        actor["name"] = cn_name
-                    if person_detail.also_known_as:
-                        actor["also_known_as"] = person_detail.also_known_as
-                        for alias in person_detail.also_known_as:
-                            actor_dict[alias] = actor
+        # 以 original_name、name、alias 及其规范化形式为键的 TMDB 人物索引，同一部剧集的所有集共用
+        actor_index = self.get_tmdb_name_index(mediainfo=mediainfo)
 
         # 使用TMDB信息更新人物
         for actor in actors:
-            if self.check_external_interrupt():
-                return
+            if self.event.is_set():
+                return None
             tag_value = actor.get("tag")
             role_value = actor.get("role")
             if not tag_value:
                 continue
 
             # 批量赋值 original_name 属性，以便后续能够拿到原始值，避免翻译不一致时，豆瓣无法正确获取值
-            original_actor = actor_dict.get(tag_value)
+            original_actor = actor_index.find([tag_value])
             if original_actor:
                 actor["original_name"] = original_actor.get("original_name")
 
@@ -274,7 +924,7 @@ class ScrapeHelper:
                 trans_actors.append(actor)
                 continue
             try:
-                trans_actor = self.update_people_by_tmdb(people=actor, people_dict=actor_dict)
+                trans_actor = self.update_people_by_tmdb(people=actor, people_index=actor_index)
                 if trans_actor:
                     trans_actors.append(trans_actor)
                 else:
@@ -290,30 +940,11 @@ class ScrapeHelper:
                 logger.info(f"{title} 的人物信息已是中文，无需使用豆瓣信息更新")
             else:
                 # 存在人物信息还不是中文数据，使用豆瓣信息进行更新
-                logger.info(f"{title} 正在获取豆瓣媒体信息")
-                douban_actors = self.get_douban_actors(imdbid=mediainfo.imdb_id,
-                                                       title=mediainfo.title,
-                                                       mtype=mediainfo.type,
-                                                       year=mediainfo.year,
-                                                       season=mediainfo.season,
-                                                       season_years=tuple(sorted(mediainfo.season_years.items())))
-                if douban_actors:
-                    # 将 douban_actors 转换为字典，以 latin_name 和 name 和拼音为键
-                    douban_actor_dict = {}
-                    for actor in douban_actors:
-                        name = actor.get("name")
-                        latin_name = actor.get("latin_name")
-                        if name:
-                            douban_actor_dict[name] = actor
-                            if StringUtils.is_chinese(name):
-                                douban_actor_dict[self.to_pinyin(name)] = actor
-                        if latin_name:
-                            douban_actor_dict[latin_name] = actor
-                            douban_actor_dict[self.standardize_name_order(latin_name)] = actor
-
+                douban_actor_index = self.get_douban_name_index(mediainfo=mediainfo, title=title)
+                if douban_actor_index:
                     for actor in trans_actors:
-                        if self.check_external_interrupt():
-                            return
+                        if self.event.is_set():
+                            return None
                         try:
                             tag_value = actor.get("tag")
                             role_value = actor.get("role")
@@ -322,18 +953,143 @@ class ScrapeHelper:
                                 continue
 
                             updated_actor = self.update_people_by_douban(people=actor,
-                                                                         people_dict=douban_actor_dict)
+                                                                         people_index=douban_actor_index)
                             if updated_actor:
                                 actor.update(updated_actor)
                         except Exception as e:
                             logger.error(f"{title} 豆瓣更新人物信息失败：{str(e)}")
 
-        if trans_actors:
+        return trans_actors
+
+    def get_tmdb_name_index(self, mediainfo: MediaInfo) -> NameIndex:
+        """
+        构建 TMDB 人物索引，以 original_name、name、alias 及其规范化形式为键，
+        同一媒体只构建一次，剧集的各集直接复用
+        """
+        index_key = ("tmdb", mediainfo.type, mediainfo.tmdb_id) if mediainfo.tmdb_id else None
+        return self.__get_or_build_name_index(index_key, functools.partial(self.__build_tmdb_name_index, mediainfo))
+
+    def __build_tmdb_name_index(self, mediainfo: MediaInfo) -> NameIndex:
+        """构建 TMDB 人物索引，剧集的索引同时包含各集的客串演员"""
+        cast_ids = {actor.get("id") for actor in mediainfo.actors}
+        actors = list(mediainfo.actors) + [guest for guest in self.prefetch_tmdb_guest_stars(mediainfo=mediainfo)
+                                           if guest.get("id") not in cast_ids]
+        # 并发预取所有人物的 TMDB 信息，结果写入同一缓存区域
+        person_details = self.prefetch_tmdb_person_details(person_tmdbids=[actor.get("id") for actor in actors])
+
+        actor_index = NameIndex()
+        tmdb_names = {}
+        for actor in actors:
+            name = actor.get("name")
+            actor_index.add(name, actor)
+            actor_index.add(actor.get("original_name"), actor)
+            person_tmdbid = actor.get("id")
+            if person_tmdbid:
+                person_detail = person_details.get(person_tmdbid)
+                if person_detail:
+                    cn_name = self.get_chinese_name(person=person_detail)
+                    if cn_name:
+                        actor["name"] = cn_name
+                        tmdb_names[f"tmdb:{person_tmdbid}"] = cn_name
+                    if person_detail.also_known_as:
+                        actor["also_known_as"] = person_detail.also_known_as
+                        for alias in person_detail.also_known_as:
+                            actor_index.add(alias, actor)
+
+        if self.persons and tmdb_names:
             try:
-                self.put_actors(item=item, actors=trans_actors)
-                logger.info(f"{title} 的中文人物信息更新完成")
+                self.persons.save(names=tmdb_names, roles={})
             except Exception as e:
-                logger.error(f"{title} 的中文人物信息更新失败：{str(e)}")
+                logger.error(f"保存本地人物翻译库失败：{str(e)}")
+        return actor_index
+
+    def get_douban_name_index(self, mediainfo: MediaInfo, title: Optional[str] = None) -> NameIndex:
+        """
+        构建豆瓣人物索引，以 name、latin_name 及其规范化形式、姓名顺序调换后的形式为键，
+        同一媒体只构建一次，剧集的各集直接复用
+        """
+        index_key = ("douban", mediainfo.type, mediainfo.tmdb_id) if mediainfo.tmdb_id else None
+        return self.__get_or_build_name_index(
+            index_key, functools.partial(self.__build_douban_name_index, mediainfo, title))
+
+    def __build_douban_name_index(self, mediainfo: MediaInfo, title: Optional[str] = None) -> NameIndex:
+        """构建豆瓣人物索引"""
+        logger.info(f"{title or mediainfo.title} 正在获取豆瓣媒体信息")
+        douban_actors = self.get_douban_actors(imdbid=mediainfo.imdb_id,
+                                               title=mediainfo.title,
+                                               mtype=mediainfo.type,
+                                               year=mediainfo.year,
+                                               season=mediainfo.season,
+                                               season_years=tuple(sorted(mediainfo.season_years.items())))
+        actor_index = NameIndex()
+        for actor in douban_actors or []:
+            actor_index.add(actor.get("name"), actor)
+            actor_index.add(actor.get("latin_name"), actor, with_order=True)
+        return actor_index
+
+    def __get_or_build_name_index(self, index_key: Optional[tuple], build: Callable[[], NameIndex]) -> NameIndex:
+        """获取已构建的人物索引，不存在时构建；剧集的各集并发识别时，由首个线程构建，其余线程等待后直接复用"""
+        actor_index = self.__get_name_index(index_key)
+        if actor_index is not None:
+            return actor_index
+        if not index_key:
+            return build()
+        with self._name_index_lock:
+            build_lock = self._name_index_builds.setdefault(index_key, threading.Lock())
+        try:
+            with build_lock:
+                actor_index = self.__get_name_index(index_key)
+                if actor_index is None:
+                    actor_index = build()
+                    self.__put_name_index(index_key, actor_index)
+        finally:
+            with self._name_index_lock:
+                if self._name_index_builds.get(index_key) is build_lock:
+                    self._name_index_builds.pop(index_key)
+        return actor_index
+
+    def __get_name_index(self, index_key: Optional[tuple]) -> Optional[NameIndex]:
+        """获取已构建的人物索引"""
+        if not index_key:
+            return None
+        with self._name_index_lock:
+            actor_index = self._name_indexes.get(index_key)
+            if actor_index is not None:
+                self._name_indexes.move_to_end(index_key)
+            return actor_index
+
+    def __put_name_index(self, index_key: Optional[tuple], actor_index: NameIndex):
+        """缓存已构建的人物索引，超过上限时淘汰最久未使用的索引"""
+        if not index_key:
+            return
+        with self._name_index_lock:
+            self._name_indexes[index_key] = actor_index
+            self._name_indexes.move_to_end(index_key)
+            while len(self._name_indexes) > self.max_name_indexes:
+                self._name_indexes.popitem(last=False)
+
+    def need_put_actors(self, item: dict, actors: list, title: Optional[str] = None) -> bool:
+        """
+        比较待写回的人物信息与 Plex 中当前的 Role 标签，完全一致时无需写回，并记录指纹
+        """
+        if not self.actors_changed(roles=item.get("Role", []), actors=actors):
+            logger.info(f"{title or item.get('title')} 的人物信息与媒体服务器中一致，跳过写回")
+            with self._count_lock:
+                self.skipped_write_count += 1
+            scrape_metrics.incr("writes_skipped")
+            self.remember(item=item, actors=actors)
+            return False
+        return True
+
+    @staticmethod
+    def actors_changed(roles: list, actors: list) -> bool:
+        """按写回的字段逐一比较人物信息是否发生变化"""
+        roles = roles or []
+        if len(roles) != len(actors):
+            return True
+        fields = ("tag", "role", "thumb", "tagKey")
+        return any(any((role.get(field) or "") != (actor.get(field) or "") for field in fields)
+                   for role, actor in zip(roles, actors))
 
     def put_actors(self, item: dict, actors: list):
         """更新演员信息"""
@@ -366,13 +1122,27 @@ class ScrapeHelper:
         params.update(actors_param)
 
         endpoint = f"library/metadata/{rating_key}"
-        self.plex.put_data(
-            endpoint=endpoint,
-            params=params,
-            timeout=self.timeout
-        )
-
-    def update_people_by_tmdb(self, people: dict, people_dict: dict) -> Optional[dict]:
+        response = self.put_data(endpoint=endpoint, params=params)
+        if response is None or response.status_code >= 400:
+            # 写入失败时不能记录指纹，否则下次运行时会被视为已刮削而跳过
+            raise RuntimeError(f"状态码：{response.status_code if response is not None else '无响应'}")
+
+    def get_data(self, endpoint: str) -> Optional[Response]:
+        """读取 Plex 数据，并记录耗时"""
+        with scrape_metrics.timer("plex_get") as call:
+            response = (self.plex_client or self.plex).get_data(endpoint=endpoint, timeout=self.timeout)
+            call.failed = response is None or response.status_code >= 400
+        return response
+
+    def put_data(self, endpoint: str, params: dict) -> Optional[Response]:
+        """向 Plex 写入数据，并记录耗时"""
+        with scrape_metrics.timer("plex_put") as call:
+            response = (self.plex_client or self.plex).put_data(endpoint=endpoint, params=params,
+                                                                timeout=self.timeout)
+            call.failed = response is None or response.status_code >= 400
+        return response
+
+    def update_people_by_tmdb(self, people: dict, people_index: NameIndex) -> Optional[dict]:
         """更新人物信息，返回替换后的人物信息"""
         """
         people 的数据结构:
@@ -385,7 +1155,7 @@ class ScrapeHelper:
             "thumb": "https://metadata-static.plex.tv/e/people/ef539a37a16672a1a8d20f272b338c6b.jpg"
         }
 
-        people_dict 的数据结构:
+        people_index 中的人物数据结构:
         [{
             "adult": False,
             "gender": 2,
@@ -414,26 +1184,24 @@ class ScrapeHelper:
             "order": 1
         }]
         """
-        if not people_dict:
+        if not people_index:
             return None
 
         # 返回的人物信息
         ret_people = copy.deepcopy(people)
 
-        # 查找对应的 TMDB 人物信息
+        # 查找对应的 TMDB 人物信息，依次匹配原值、小写去空格、规范化及拼音形式
         person_name = people.get("tag")
-        person_name_lower = self.remove_spaces_and_lower(person_name)
-        person_pinyin = self.to_pinyin(person_name)
-
-        # 构建一个包含所有潜在键的列表后，再进行逐一获取
-        potential_keys = [person_name, person_name_lower, person_pinyin]
-        person_detail = next((people_dict[key] for key in potential_keys if key in people_dict), None)
+        person_detail = people_index.find([person_name])
 
         # 从 TMDB 演员中匹配中文名称、角色和简介
         if not person_detail:
             logger.debug(f"人物 {person_name} 未找到中文数据")
             return None
 
+        if person_detail.get("id"):
+            ret_people["person_tmdbid"] = person_detail.get("id")
+
         # 名称
         if StringUtils.is_chinese(person_name):
             logger.debug(f"{person_name} 已是中文名称，无需更新")
@@ -459,7 +1227,7 @@ class ScrapeHelper:
 
         return ret_people
 
-    def update_people_by_douban(self, people: dict, people_dict: dict) -> Optional[dict]:
+    def update_people_by_douban(self, people: dict, people_index: NameIndex) -> Optional[dict]:
         """从豆瓣信息中更新人物信息"""
         """
         people 的数据结构:
@@ -473,7 +1241,7 @@ class ScrapeHelper:
             "original_name": "Cillian Murphy"
         }
 
-        people_dict 的数据结构
+        people_index 中的人物数据结构
         {
           "name": "丹尼尔·克雷格",
           "roles": [
@@ -496,22 +1264,17 @@ class ScrapeHelper:
           "latin_name": "Daniel Craig"
         }
         """
-        if not people_dict:
+        if not people_index:
             return people
 
         # 返回的人物信息
         ret_people = copy.deepcopy(people)
 
-        # 查找对应的豆瓣人物信息
+        # 查找对应的豆瓣人物信息，先匹配所有名称的原值，再匹配规范化及拼音形式
         person_name = people.get("tag")
         original_name = people.get("original_name")
         also_known_as = people.get("also_known_as", [])
-        person_name_lower = self.remove_spaces_and_lower(person_name)
-        person_pinyin = self.to_pinyin(person_name)
-
-        # 构建一个包含所有潜在键的列表后，再进行逐一获取
-        potential_keys = [person_name, original_name] + also_known_as + [person_name_lower, person_pinyin]
-        person_detail = next((people_dict[key] for key in potential_keys if key in people_dict), None)
+        person_detail = people_index.find([person_name, original_name, *also_known_as])
 
         # 从豆瓣演员中匹配中文名称、角色和简介
         if not person_detail:
@@ -549,25 +1312,98 @@ class ScrapeHelper:
 
         return ret_people
 
-    @cache_with_logging("plex_tmdb_person", "PERSON")
+    def prefetch_tmdb_person_details(self, person_tmdbids: Iterable[Any]) -> Dict[Any, Optional[MediaPerson]]:
+        """
+        通过有界线程池并发获取多个人物的 TMDB 信息
+        :param person_tmdbids: 人物的 TMDB ID
+        :return: 以人物 TMDB ID 为键的人物信息字典
+        """
+        person_tmdbids = list(dict.fromkeys(person_tmdbid for person_tmdbid in person_tmdbids if person_tmdbid))
+        if not person_tmdbids:
+            return {}
+        logger.info(f"正在获取 {len(person_tmdbids)} 个人物的 TMDB 信息")
+        workers = min(self._person_workers, len(person_tmdbids))
+        if workers <= 1:
+            return {person_tmdbid: self.get_tmdb_person_detail(person_tmdbid=person_tmdbid)
+                    for person_tmdbid in person_tmdbids}
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="plexpersonmeta-person") as executor:
+            futures = {person_tmdbid: executor.submit(self.__get_tmdb_person_detail, person_tmdbid)
+                       for person_tmdbid in person_tmdbids}
+        return {person_tmdbid: future.result() for person_tmdbid, future in futures.items()}
+
+    def prefetch_tmdb_guest_stars(self, mediainfo: MediaInfo) -> List[dict]:
+        """
+        通过有界线程池并发获取剧集各季所有集的 TMDB 客串演员
+        :param mediainfo: 剧集的媒体信息
+        :return: 按人物 TMDB ID 去重后的客串演员
+        """
+        if mediainfo.type != MediaType.TV or not mediainfo.tmdb_id or not mediainfo.seasons:
+            return []
+        seasons = sorted(mediainfo.seasons)
+        logger.info(f"正在获取 {mediainfo.title} {len(seasons)} 季的 TMDB 客串演员")
+        workers = min(self._person_workers, len(seasons))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="plexpersonmeta-season") as executor:
+            futures = [executor.submit(self.__get_tmdb_season_guests, mediainfo, season) for season in seasons]
+        guests = {}
+        for future in futures:
+            for guest in future.result() or []:
+                if guest.get("id") and guest.get("id") not in guests:
+                    guests[guest.get("id")] = dict(guest)
+        return list(guests.values())
+
+    def __get_tmdb_season_guests(self, mediainfo: MediaInfo, season: int) -> Optional[List[dict]]:
+        """在预取线程中获取一季的客串演员，外部中断后不再发起请求"""
+        if self.event.is_set():
+            return None
+        return self.get_tmdb_season_guests(tmdbid=mediainfo.tmdb_id, season=season, title=mediainfo.title)
+
+    @cache_with_logging("plex_tmdb_media", "TMDB", key_params=("tmdbid", "season"))
+    def get_tmdb_season_guests(self, tmdbid: int, season: int, title: str) -> Optional[List[dict]]:
+        """获取 TMDB 中剧集一季所有集的客串演员"""
+        try:
+            with scrape_metrics.timer("tmdb_season"):
+                episodes = self.tmdb_chain.tmdb_episodes(tmdbid=int(tmdbid), season=int(season))
+        except Exception as e:
+            logger.error(f"{title} 第 {season} 季 TMDB 获取客串演员时出错：{str(e)}")
+            return None
+        return [dict(guest) for episode in episodes or [] for guest in getattr(episode, "guest_stars", None) or []]
+
+    def __get_tmdb_person_detail(self, person_tmdbid: Any) -> Optional[MediaPerson]:
+        """在预取线程中获取人物信息，外部中断后不再发起请求"""
+        if self.event.is_set():
+            return None
+        return self.get_tmdb_person_detail(person_tmdbid=person_tmdbid)
+
+    @cache_with_logging("plex_tmdb_person", "PERSON", key_params=("person_tmdbid",))
     def get_tmdb_person_detail(self,
                                person_tmdbid: int) -> Optional[MediaPerson]:
         """获取TMDB媒体信息"""
         try:
-            person_detail = self.tmdb_chain.person_detail(int(person_tmdbid))
+            with scrape_metrics.timer("tmdb_person"):
+                person_detail = self.tmdb_chain.person_detail(int(person_tmdbid))
             return person_detail
         except Exception as e:
             logger.error(f"{person_tmdbid} TMDB 识别人员信息时出错：{str(e)}")
             return None
 
-    @cache_with_logging("plex_tmdb_media", "TMDB")
+    @cache_with_logging("plex_tmdb_media", "TMDB", key_params=("tmdbid", "mtype"))
     def get_tmdb_media(self,
                        tmdbid: int,
                        title: str,
                        mtype: MediaType = MediaType.TV) -> Optional[MediaInfo]:
-        """获取TMDB媒体信息"""
+        """获取TMDB媒体信息，未识别到时记录查询失败，退避期间不再请求"""
+        lookup_key = f"tmdb:{mtype.value if mtype else ''}:{tmdbid}"
+        if self.failures and self.failures.is_lookup_backing_off(lookup_key):
+            logger.info(f"{title} 此前 TMDB 未识别到媒体信息，尚未到重试时间，跳过")
+            return None
         try:
-            mediainfo = self.chain.recognize_media(mtype=mtype, tmdbid=tmdbid)
+            with scrape_metrics.timer("tmdb_media"):
+                mediainfo = self.chain.recognize_media(mtype=mtype, tmdbid=tmdbid)
+            if self.failures:
+                if mediainfo:
+                    self.failures.discard_lookup(lookup_key)
+                elif not self.event.is_set():
+                    self.failures.record_lookup(lookup_key, reason="tmdb_not_found")
             return mediainfo
         except Exception as e:
             logger.error(f"{title} TMDB 识别媒体信息时出错：{str(e)}")
@@ -613,27 +1449,45 @@ class ScrapeHelper:
         :param fetch_season: 季，可选
         :return: 包含演员信息的字典列表，或 None
         """
+        # 豆瓣未匹配的查询记录失败，退避期间不再请求
+        lookup_key = f"douban:{fetch_mtype.value if fetch_mtype else ''}:{fetch_title}:{fetch_year}:{fetch_season}"
+        if self.failures and self.failures.is_lookup_backing_off(lookup_key):
+            logger.info(f"{fetch_title} 此前豆瓣未匹配到媒体信息，尚未到重试时间，跳过")
+            return None
         try:
-            sleep_time = 5 + int(time.time()) % 7
-            logger.debug(f"随机休眠 {sleep_time}秒 ...")
-            time.sleep(sleep_time)
-            doubaninfo = self.chain.match_doubaninfo(name=fetch_title,
-                                                     imdbid=fetch_imdbid,
-                                                     mtype=fetch_mtype,
-                                                     year=fetch_year,
-                                                     season=fetch_season,
-                                                     raise_exception=True)
-            if doubaninfo:
-                item = self.chain.douban_info(doubaninfo.get("id"), raise_exception=True) or {}
-                if item:
-                    return (item.get("actors") or []) + (item.get("directors") or [])
-                else:
-                    logger.debug(f"未找到豆瓣详情：{fetch_title}({fetch_year})")
-                    return None
-            else:
+            if not douban_limiter.acquire(event=self.event):
+                return None
+            with scrape_metrics.timer("douban"):
+                doubaninfo = self.chain.match_doubaninfo(name=fetch_title,
+                                                         imdbid=fetch_imdbid,
+                                                         mtype=fetch_mtype,
+                                                         year=fetch_year,
+                                                         season=fetch_season,
+                                                         raise_exception=True)
+            if not doubaninfo:
+                douban_limiter.on_empty()
                 logger.debug(f"未找到豆瓣信息：{fetch_title}({fetch_year})")
+                if self.failures:
+                    self.failures.record_lookup(lookup_key, reason="douban_not_found")
+                return None
+            douban_limiter.on_success()
+
+            if not douban_limiter.acquire(event=self.event):
                 return None
+            with scrape_metrics.timer("douban"):
+                item = self.chain.douban_info(doubaninfo.get("id"), raise_exception=True) or {}
+            if not item:
+                douban_limiter.on_empty()
+                logger.debug(f"未找到豆瓣详情：{fetch_title}({fetch_year})")
+                if self.failures:
+                    self.failures.record_lookup(lookup_key, reason="douban_not_found")
+                return None
+            douban_limiter.on_success()
+            if self.failures:
+                self.failures.discard_lookup(lookup_key)
+            return (item.get("actors") or []) + (item.get("directors") or [])
         except Exception as e:
+            douban_limiter.on_error()
             logger.error(f"{fetch_title} 豆瓣识别媒体信息时出错：{str(e)}")
             return None
 
@@ -723,53 +1577,87 @@ class ScrapeHelper:
                           search_title=search_title,
                           tmdbid=tmdbid)
 
-    def list_rating_items(self, library: LibrarySection):
+    def list_rating_items(self, library: LibrarySection) -> List[dict]:
         """获取所有媒体项目"""
+        return list(self.iter_rating_items(library=library))
+
+    def iter_rating_items(self, library: LibrarySection, start: int = 0) -> Iterator[dict]:
+        """分页获取所有媒体项目，首页返回后即可开始处理"""
         if not library:
-            return []
+            return
 
         endpoint = f"/library/sections/{library.key}/all?type={plexapi.utils.searchType(libtype=library.TYPE)}"
-
-        response = self.plex.get_data(endpoint=endpoint, timeout=self.timeout)
-        datas = (response
-                 .json()
-                 .get("MediaContainer", {})
-                 .get("Metadata", []))
-
-        if len(datas):
-            logger.info(f"<{library.title} {library.TYPE}> "
-                        f"类型共计 {len(datas)} 个")
-
-        return datas
-
-    def list_rating_items_by_added(self, added_time: int):
+        # 按配置的处理顺序由 Plex 排序，最近添加或经常观看的媒体优先刮削
+        sort = self.scrape_orders.get(self._scrape_order)
+        if sort:
+            endpoint = f"{endpoint}&sort={sort}"
+
+        for index, (datas, total) in enumerate(self.iter_pages(endpoint=endpoint, start=start)):
+            if index == 0 and total:
+                logger.info(f"<{library.title} {library.TYPE}> "
+                            f"类型共计 {total} 个")
+            yield from datas
+
+    def list_rating_items_by_added(self, added_time: int) -> List[dict]:
         """获取最近入库媒体"""
         endpoint = f"/library/all?addedAt>={added_time}"
-        response = self.plex.get_data(endpoint=endpoint, timeout=self.timeout)
-        datas = (response
-                 .json()
-                 .get("MediaContainer", {})
-                 .get("Metadata", []))
-        return datas
+        return [data for datas, _ in self.iter_pages(endpoint=endpoint) for data in datas]
 
-    def list_episodes(self, rating_key, ):
+    def list_episodes(self, rating_key) -> List[dict]:
         """获取show的所有剧集"""
-        endpoint = f"/library/metadata/{rating_key}/allLeaves"
+        return list(self.iter_episodes(rating_key=rating_key))
 
-        response = self.plex.get_data(endpoint=endpoint, timeout=self.timeout)
-        datas = (response
-                 .json()
-                 .get("MediaContainer", {})
-                 .get("Metadata", []))
+    def iter_episodes(self, rating_key) -> Iterator[dict]:
+        """分页获取show的所有剧集"""
+        endpoint = f"/library/metadata/{rating_key}/allLeaves"
+        for datas, _ in self.iter_pages(endpoint=endpoint):
+            yield from datas
 
-        return datas
+    def iter_pages(self, endpoint: str, start: int = 0) -> Iterator[tuple]:
+        """
+        使用 X-Plex-Container-Start/X-Plex-Container-Size 分页获取数据，处理当前页的同时在后台预读下一页
+        :param endpoint: 端点
+        :param start: 起始位置
+        :return: 每页的数据列表以及总数
+        """
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix="plexpersonmeta-page") as executor:
+            future = executor.submit(self.fetch_page, endpoint, start, self._page_size)
+            while future:
+                datas, total = future.result()
+                start += len(datas)
+                has_more = (len(datas) >= self._page_size
+                            and (total is None or start < total)
+                            and not self.event.is_set())
+                future = executor.submit(self.fetch_page, endpoint, start, self._page_size) if has_more else None
+                if datas:
+                    yield datas, total
+
+    def fetch_page(self, endpoint: str, start: int, size: int) -> tuple:
+        """
+        获取一页数据
+        :return: 当前页的数据列表以及总数，服务器未返回总数时为 None
+        """
+        separator = "&" if "?" in endpoint else "?"
+        endpoint = f"{endpoint}{separator}X-Plex-Container-Start={start}&X-Plex-Container-Size={size}"
+        response = self.get_data(endpoint=endpoint)
+        if response is None or response.status_code >= 400:
+            # 不能当作空页返回，否则媒体库会被视为已处理完成并移除检查点
+            raise RuntimeError(f"获取 {endpoint} 失败，"
+                               f"状态码：{response.status_code if response is not None else '无响应'}")
+        container = response.json().get("MediaContainer", {})
+        total = container.get("totalSize")
+        return container.get("Metadata", []), int(total) if total is not None else None
 
     def fetch_item(self, rating_key):
         """
         获取条目信息
         """
         endpoint = f"/library/metadata/{rating_key}"
-        response = self.plex.get_data(endpoint=endpoint, timeout=self.timeout)
+        response = self.get_data(endpoint=endpoint)
+        if response is None or response.status_code >= 400:
+            logger.warning(f"获取条目 {rating_key} 失败，"
+                           f"状态码：{response.status_code if response is not None else '无响应'}")
+            return None
         datas = (response
                  .json()
                  .get("MediaContainer", {})
@@ -782,14 +1670,68 @@ class ScrapeHelper:
         :param rating_keys: 需要获取的条目的评级键列表。
         :return: 获取的所有条目列表。
         """
-        endpoint = f"/library/metadata/{','.join(rating_keys)}"
-        response = self.plex.get_data(endpoint=endpoint, timeout=self.timeout)
-        items = (response
-                 .json()
-                 .get("MediaContainer", {})
-                 .get("Metadata", []))
+        return list(self.fetch_items(rating_keys=rating_keys).values())
+
+    def fetch_items(self, rating_keys: List[str]) -> Dict[str, dict]:
+        """
+        通过 /library/metadata/{k1,k2,...} 分批获取条目，URL 过长或请求失败时将批次一分为二后重试，
+        请求或响应体过大时缩小后续批次的大小，其他失败（超时、5xx 等）只拆分当前批次
+        :param rating_keys: 需要获取的条目的评级键列表
+        :return: 以 ratingKey 为键的条目字典
+        """
+        items = {}
+        with self._fetch_batch_lock:
+            batch_size = self._fetch_batch_size
+        pending = list(self.batched([str(key) for key in rating_keys], batch_size))
+        while pending:
+            if self.event.is_set():
+                break
+            keys = pending.pop(0)
+            endpoint = f"/library/metadata/{','.join(keys)}"
+            if len(keys) > 1 and len(endpoint) > self.max_url_length:
+                middle = len(keys) // 2
+                pending[:0] = [keys[:middle], keys[middle:]]
+                continue
+
+            response = self.get_data(endpoint=endpoint)
+            if response is None or response.status_code >= 400:
+                if len(keys) > 1:
+                    middle = len(keys) // 2
+                    if response is not None and response.status_code in self.oversized_request_statuses:
+                        # 请求过长与批次大小有关，后续批次同样缩小，避免每个批次都先失败一次
+                        self.__shrink_fetch_batch(middle)
+                    logger.debug(f"批量获取 {len(keys)} 个条目失败，拆分为两批后重试")
+                    pending[:0] = [keys[:middle], keys[middle:]]
+                else:
+                    logger.warning(f"获取条目 {keys[0]} 失败，"
+                                   f"状态码：{response.status_code if response is not None else '无响应'}")
+                continue
+
+            if len(response.content) > self.max_response_size and len(keys) > 1:
+                logger.debug(f"批量获取条目的响应过大，后续批次大小调整为 {self.__shrink_fetch_batch(len(keys) // 2)}")
+
+            for data in response.json().get("MediaContainer", {}).get("Metadata", []):
+                items[str(data.get("ratingKey"))] = data
         return items
 
+    def __shrink_fetch_batch(self, size: int) -> int:
+        """缩小后续批量获取条目的批次大小，返回缩小后的大小"""
+        with self._fetch_batch_lock:
+            self._fetch_batch_size = max(min(self._fetch_batch_size, size), 1)
+            return self._fetch_batch_size
+
+    @staticmethod
+    def batched(iterable: Iterable, size: int) -> Iterator[list]:
+        """按指定大小将可迭代对象拆分为多个批次"""
+        batch = []
+        for element in iterable:
+            batch.append(element)
+            if len(batch) >= size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
     @staticmethod
     def get_tmdb_id(item) -> Optional[int]:
         """获取 tmdb_id"""
@@ -818,20 +1760,17 @@ class ScrapeHelper:
     @staticmethod
     def to_pinyin(string) -> str:
         """将中文字符串转换为拼音，没有空格分隔"""
-        return pypinyin.slug(string, separator="", style=pypinyin.Style.NORMAL, strict=False).lower()
+        return names.to_pinyin(string)
 
     @staticmethod
     def standardize_name_order(name) -> str:
         """将英文名标准化为统一的顺序（姓在前，名在后）"""
-        parts = name.split()
-        if len(parts) == 2:
-            return f"{parts[1]} {parts[0]}"
-        return name
+        return names.standardize_name_order(name)
 
     @staticmethod
     def remove_spaces_and_lower(string) -> str:
         """去除字符串中的空格并转换为小写"""
-        return string.replace(" ", "").lower()
+        return names.remove_spaces_and_lower(string)
 
     @staticmethod
     def extract_key_from_url(url: str) -> Optional[str]:
@@ -847,3 +1786,190 @@ class ScrapeHelper:
         cache_backend.clear(region="plex_tmdb_media")
         cache_backend.clear(region="plex_tmdb_person")
         cache_backend.clear(region="plex_douban_media")
+
+
+class ScrapeProgress:
+    """
+    媒体库刮削进度，按批次跟踪任务的处理情况，计算已连续处理完成的位置（低水位）
+
+    批次的读取任务全部产出且产出的任务全部处理完成后视为完成，外部中断时未完成的批次不会推进低水位
+    """
+
+    def __init__(self, on_advance: Callable[[int, str], None]):
+        """
+        :param on_advance: 低水位推进时的回调，参数为已处理完成的位置及该位置最后一个媒体项的 ratingKey
+        """
+        self._on_advance = on_advance
+        self._lock = threading.Lock()
+        # 批次 ID -> [结束位置, 最后一个媒体项的 ratingKey, 未完成的任务数, 是否已全部产出]
+        self._batches: OrderedDict = OrderedDict()
+        self._next_id = 0
+
+    @property
+    def completed(self) -> bool:
+        """所有批次是否均已处理完成"""
+        with self._lock:
+            return not self._batches
+
+    def add_batch(self, position: int, rating_key: Any) -> int:
+        """登记一个批次，批次需按位置顺序登记"""
+        with self._lock:
+            batch_id = self._next_id
+            self._next_id += 1
+            self._batches[batch_id] = [position, str(rating_key), 0, False]
+        return batch_id
+
+    def add_job(self, batch_id: int):
+        """批次产出一个任务"""
+        with self._lock:
+            self._batches[batch_id][2] += 1
+
+    def done_job(self, batch_id: int):
+        """批次的一个任务处理完成"""
+        with self._lock:
+            self._batches[batch_id][2] -= 1
+            advanced = self.__advance()
+        if advanced:
+            self._on_advance(*advanced)
+
+    def finish_batch(self, batch_id: int):
+        """批次的任务已全部产出"""
+        with self._lock:
+            self._batches[batch_id][3] = True
+            advanced = self.__advance()
+        if advanced:
+            self._on_advance(*advanced)
+
+    def __advance(self) -> Optional[Tuple[int, str]]:
+        """移除开头连续完成的批次，返回推进后的低水位，调用方需持有锁"""
+        advanced = None
+        while self._batches:
+            position, rating_key, pending, finished = next(iter(self._batches.values()))
+            if pending or not finished:
+                break
+            self._batches.popitem(last=False)
+            advanced = position, rating_key
+        return advanced
+
+
+class ScrapePipeline:
+    """
+    分阶段并发刮削流水线：读取（Plex） → 识别（TMDB/豆瓣） → 写入（Plex）
+
+    每个阶段拥有独立的工作线程数，阶段之间通过有界队列连接，下游处理不过来时上游会被阻塞（背压），
+    外部中断事件触发后，各阶段会尽快退出
+    """
+    # 队列读写的轮询间隔，用于及时响应外部中断
+    poll_interval: float = 0.5
+    # 阶段结束标记
+    _stop = object()
+
+    def __init__(self, helper: ScrapeHelper, fetch_workers: int = 4, resolve_workers: int = 4,
+                 write_workers: int = 2):
+        self.helper = helper
+        self.event = helper.event
+        self.fetch_workers = max(fetch_workers, 1)
+        self.resolve_workers = max(resolve_workers, 1)
+        self.write_workers = max(write_workers, 1)
+
+    def run(self, tasks: Iterable[Callable[[], Iterable[ScrapeJob]]]):
+        """
+        执行流水线，直到所有任务处理完成或者触发外部中断
+        :param tasks: 读取任务，每个任务被调用后返回需要识别的 ScrapeJob
+        """
+        # 每个阶段的输入队列长度按照该阶段的线程数设置，保证内存占用有上限
+        fetch_queue = queue.Queue(maxsize=self.fetch_workers * 2)
+        resolve_queue = queue.Queue(maxsize=self.resolve_workers * 4)
+        write_queue = queue.Queue(maxsize=self.write_workers * 4)
+
+        stages = [
+            self.__start_stage(name="fetch", workers=self.fetch_workers, inbox=fetch_queue,
+                               outbox=resolve_queue, handler=lambda task: task()),
+            self.__start_stage(name="resolve", workers=self.resolve_workers, inbox=resolve_queue,
+                               outbox=write_queue, handler=self.__resolve),
+            self.__start_stage(name="write", workers=self.write_workers, inbox=write_queue,
+                               outbox=None, handler=self.__write),
+        ]
+
+        try:
+            for task in tasks:
+                if self.helper.check_external_interrupt():
+                    break
+                if not self.__put(fetch_queue, task):
+                    break
+        finally:
+            # 按阶段顺序逐个结束，保证上游产生的任务都能被下游处理完
+            for inbox, threads in stages:
+                for _ in threads:
+                    if not self.__put(inbox, self._stop):
+                        break
+                for thread in threads:
+                    thread.join()
+
+    def __start_stage(self, name: str, workers: int, inbox: queue.Queue, outbox: Optional[queue.Queue],
+                      handler: Callable[[Any], Optional[Iterable[ScrapeJob]]]) -> tuple:
+        """启动阶段的工作线程"""
+        threads = []
+        for index in range(workers):
+            thread = threading.Thread(target=self.__work,
+                                      args=(name, inbox, outbox, handler),
+                                      name=f"plexpersonmeta-{name}-{index}",
+                                      daemon=True)
+            thread.start()
+            threads.append(thread)
+        return inbox, threads
+
+    def __work(self, name: str, inbox: queue.Queue, outbox: Optional[queue.Queue],
+               handler: Callable[[Any], Optional[Iterable[ScrapeJob]]]):
+        """工作线程，从输入队列获取任务处理后放入输出队列"""
+        while not self.event.is_set():
+            try:
+                task = inbox.get(timeout=self.poll_interval)
+            except queue.Empty:
+                continue
+            if task is self._stop:
+                return
+            try:
+                for output in handler(task) or []:
+                    if outbox is None:
+                        continue
+                    if not self.__put(outbox, output):
+                        return
+            except Exception as e:
+                logger.error(f"刮削流水线 {name} 阶段处理任务时出现异常，{str(e)}")
+
+    def __resolve(self, job: ScrapeJob) -> List[ScrapeJob]:
+        """识别阶段"""
+        try:
+            resolved = self.helper.resolve_job(job)
+        except Exception as e:
+            logger.error(f"媒体项 {job.info.title} 刮削过程中出现异常，{str(e)}")
+            resolved = None
+        if resolved:
+            return [resolved]
+        # 外部中断导致的识别结束不视为处理完成
+        if not self.event.is_set():
+            self.__done(job)
+        return []
+
+    def __write(self, job: ScrapeJob) -> List[ScrapeJob]:
+        """写入阶段"""
+        self.helper.write_job(job)
+        self.__done(job)
+        return []
+
+    @staticmethod
+    def __done(job: ScrapeJob):
+        """任务处理完成"""
+        if job.done:
+            job.done()
+
+    def __put(self, target: queue.Queue, item: Any) -> bool:
+        """放入队列，队列已满时阻塞等待，期间响应外部中断"""
+        while not self.event.is_set():
+            try:
+                target.put(item, timeout=self.poll_interval)
+                return True
+            except queue.Full:
+                continue
+        return False
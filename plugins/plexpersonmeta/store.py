@@ -0,0 +1,566 @@
+"""
+store.py
+
+这个模块定义了插件的持久化存储，包括保存在插件数据目录中的刮削状态数据库（媒体项指纹、检查点及失败记录）及人物翻译库
+"""
+import hashlib
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from app.log import logger
+from app.plugins import _PluginBase
+from app.plugins.plexpersonmeta import names
+
+
+class StateDatabase:
+    """
+    刮削状态数据库，使用 SQLite 保存在插件数据目录中，各状态存储共用同一个连接，
+    修改按行写入当前事务，调用存储的 save 时提交，中断时最多丢失上次保存后的修改
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(str(path), check_same_thread=False)
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+
+    def create_table(self, sql: str):
+        """建表并提交"""
+        with self._lock, self._conn:
+            self._conn.execute(sql)
+
+    def fetchone(self, sql: str, parameters: Iterable[Any] = ()) -> Optional[tuple]:
+        """查询一行"""
+        with self._lock:
+            return self._conn.execute(sql, tuple(parameters)).fetchone()
+
+    def fetchall(self, sql: str, parameters: Iterable[Any] = ()) -> List[tuple]:
+        """查询所有行"""
+        with self._lock:
+            return self._conn.execute(sql, tuple(parameters)).fetchall()
+
+    def execute(self, sql: str, parameters: Iterable[Any] = ()) -> int:
+        """
+        在当前事务中执行修改，不立即提交
+        :return: 受影响的行数
+        """
+        with self._lock:
+            return self._conn.execute(sql, tuple(parameters)).rowcount
+
+    def executemany(self, sql: str, rows: Iterable[Iterable[Any]]):
+        """在当前事务中批量执行修改，不立即提交"""
+        with self._lock:
+            self._conn.executemany(sql, [tuple(row) for row in rows])
+
+    def commit(self):
+        """提交当前事务"""
+        with self._lock:
+            if self._conn.in_transaction:
+                self._conn.commit()
+
+    def close(self):
+        """
+        提交未保存的修改并关闭数据库连接
+        """
+        with self._lock:
+            self._conn.commit()
+            self._conn.close()
+
+
+class FingerprintStore:
+    """
+    媒体项指纹存储，按 服务器 + ratingKey 记录 updatedAt、Role 标签哈希以及剧集数量，用于增量刮削；
+    剧集另外记录其下所有集均已处理完成后下次重新检查各集的时间，剧集的指纹变化时清除
+    """
+    # 旧版本保存指纹的插件数据的键，首次打开时导入数据库
+    data_key = "fingerprints"
+    # 剧集的所有集处理完成后，间隔该时长（秒）再重新检查各集，以发现单独发生变化的集
+    episodes_recheck_interval: int = 7 * 24 * 60 * 60
+
+    def __init__(self, database: StateDatabase, plugin: Optional[_PluginBase] = None):
+        self._database = database
+        self._database.create_table("CREATE TABLE IF NOT EXISTS fingerprint ("
+                                    "server TEXT NOT NULL, rating_key TEXT NOT NULL, updated_at INTEGER, "
+                                    "roles_hash TEXT NOT NULL, leaf_count INTEGER, episodes_recheck_at INTEGER, "
+                                    "PRIMARY KEY (server, rating_key))")
+        if plugin:
+            self.__import(plugin)
+
+    def __import(self, plugin: _PluginBase):
+        """导入旧版本保存在插件数据中的指纹：{服务器名称: {ratingKey: [updatedAt, Role 标签哈希, leafCount]}}"""
+        servers = plugin.get_data(self.data_key)
+        if not servers:
+            return
+        self._database.executemany("INSERT OR REPLACE INTO fingerprint "
+                                   "(server, rating_key, updated_at, roles_hash, leaf_count) VALUES (?, ?, ?, ?, ?)",
+                                   [(server, rating_key, *fingerprint)
+                                    for server, fingerprints in servers.items()
+                                    for rating_key, fingerprint in fingerprints.items()])
+        self._database.commit()
+        plugin.del_data(self.data_key)
+        logger.info(f"已将 {sum(len(fingerprints) for fingerprints in servers.values())} 个媒体项指纹导入刮削状态数据库")
+
+    def is_unchanged(self, server: str, item: dict) -> bool:
+        """
+        根据列表接口返回的 updatedAt 和 leafCount 判断媒体项自上次刮削后是否未发生变化
+        """
+        rating_key = item.get("ratingKey") if item else None
+        if not rating_key:
+            return False
+        fingerprint = self._database.fetchone("SELECT updated_at, leaf_count FROM fingerprint "
+                                              "WHERE server = ? AND rating_key = ?", (server, str(rating_key)))
+        if not fingerprint:
+            return False
+        updated_at, leaf_count = fingerprint
+        if updated_at != item.get("updatedAt"):
+            return False
+        return leaf_count == item.get("leafCount")
+
+    def match_roles(self, server: str, item: dict) -> bool:
+        """
+        判断媒体项的 Role 标签是否与上次刮削后的一致，一致时同步刷新 updatedAt，
+        用于识别仅因插件自身写入导致 updatedAt 变化的媒体项
+        """
+        rating_key = item.get("ratingKey") if item else None
+        if not rating_key:
+            return False
+        return self._database.execute("UPDATE fingerprint SET updated_at = ?, leaf_count = ?, "
+                                      "episodes_recheck_at = NULL "
+                                      "WHERE server = ? AND rating_key = ? AND roles_hash = ?",
+                                      (item.get("updatedAt"), item.get("leafCount"), server, str(rating_key),
+                                       self.roles_hash(item.get("Role", [])))) > 0
+
+    def update(self, server: str, item: dict, actors: Optional[list] = None):
+        """
+        记录媒体项的指纹
+        :param server: 服务器名称
+        :param item: 媒体项详情
+        :param actors: 写回 Plex 的人物信息，为空时使用媒体项当前的 Role 标签
+        """
+        rating_key = item.get("ratingKey") if item else None
+        if not rating_key:
+            return
+        roles = actors if actors is not None else item.get("Role", [])
+        self._database.execute("INSERT OR REPLACE INTO fingerprint "
+                               "(server, rating_key, updated_at, roles_hash, leaf_count) VALUES (?, ?, ?, ?, ?)",
+                               (server, str(rating_key), item.get("updatedAt"), self.roles_hash(roles),
+                                item.get("leafCount")))
+
+    def is_episodes_done(self, server: str, item: dict) -> bool:
+        """
+        未变化的剧集其下所有集是否均已处理完成，到达重新检查的时间后视为未完成
+        """
+        rating_key = item.get("ratingKey") if item else None
+        if not rating_key:
+            return False
+        row = self._database.fetchone("SELECT episodes_recheck_at FROM fingerprint "
+                                      "WHERE server = ? AND rating_key = ?", (server, str(rating_key)))
+        return bool(row and row[0]) and time.time() < row[0]
+
+    def mark_episodes_done(self, server: str, item: dict, retry_at: Optional[int] = None):
+        """
+        记录剧集其下所有集均已处理完成，剧集的指纹与记录时不一致时不记录
+        :param server: 服务器名称
+        :param item: 剧集
+        :param retry_at: 仍在退避的集中最早的重试时间，早于重新检查的间隔时在该时间重新检查
+        """
+        rating_key = item.get("ratingKey") if item else None
+        if not rating_key:
+            return
+        recheck_at = int(time.time()) + self.episodes_recheck_interval
+        if retry_at:
+            recheck_at = min(recheck_at, int(retry_at))
+        self._database.execute("UPDATE fingerprint SET episodes_recheck_at = ? "
+                               "WHERE server = ? AND rating_key = ? AND updated_at IS ? AND leaf_count IS ?",
+                               (recheck_at, server, str(rating_key), item.get("updatedAt"), item.get("leafCount")))
+
+    def save(self):
+        """
+        提交指纹的修改
+        """
+        self._database.commit()
+
+    def clear(self):
+        """
+        清理所有指纹数据，下次运行时将全量刮削
+        """
+        self._database.execute("DELETE FROM fingerprint")
+        self._database.commit()
+        logger.info("已清理媒体项指纹，下次运行时将全量刮削")
+
+    @staticmethod
+    def roles_hash(roles: list) -> str:
+        """计算 Role 标签的哈希"""
+        content = "\n".join(f"{role.get('tag', '')}\t{role.get('role', '')}\t{role.get('tagKey', '')}"
+                            for role in roles or [])
+        return hashlib.md5(content.encode("utf-8")).hexdigest()
+
+
+class CheckpointStore:
+    """
+    媒体库刮削检查点存储，按 服务器 + 媒体库 记录已连续处理完成的位置及该位置最后一个媒体项的 ratingKey，
+    中断后的下次运行从检查点继续
+    """
+    # 旧版本保存检查点的插件数据的键，首次打开时导入数据库
+    data_key = "checkpoints"
+
+    def __init__(self, database: StateDatabase, plugin: Optional[_PluginBase] = None):
+        self._database = database
+        self._database.create_table("CREATE TABLE IF NOT EXISTS checkpoint ("
+                                    "server TEXT NOT NULL, library_key TEXT NOT NULL, position INTEGER NOT NULL, "
+                                    "rating_key TEXT NOT NULL, PRIMARY KEY (server, library_key))")
+        if plugin:
+            self.__import(plugin)
+
+    def __import(self, plugin: _PluginBase):
+        """导入旧版本保存在插件数据中的检查点：{服务器名称: {媒体库 key: [位置, ratingKey]}}"""
+        servers = plugin.get_data(self.data_key)
+        if not servers:
+            return
+        self._database.executemany("INSERT OR REPLACE INTO checkpoint (server, library_key, position, rating_key) "
+                                   "VALUES (?, ?, ?, ?)",
+                                   [(server, library_key, int(position), str(rating_key))
+                                    for server, checkpoints in servers.items()
+                                    for library_key, (position, rating_key) in checkpoints.items()])
+        self._database.commit()
+        plugin.del_data(self.data_key)
+        logger.info(f"已将 {sum(len(checkpoints) for checkpoints in servers.values())} 个媒体库刮削检查点导入刮削状态数据库")
+
+    def get(self, server: str, library_key: Any) -> Optional[Tuple[int, str]]:
+        """
+        获取媒体库的检查点
+        :return: 已处理完成的位置及该位置最后一个媒体项的 ratingKey，没有检查点时返回 None
+        """
+        checkpoint = self._database.fetchone("SELECT position, rating_key FROM checkpoint "
+                                             "WHERE server = ? AND library_key = ?", (server, str(library_key)))
+        if not checkpoint:
+            return None
+        position, rating_key = checkpoint
+        return int(position), str(rating_key)
+
+    def update(self, server: str, library_key: Any, position: int, rating_key: Any):
+        """记录媒体库的检查点"""
+        self._database.execute("INSERT OR REPLACE INTO checkpoint (server, library_key, position, rating_key) "
+                               "VALUES (?, ?, ?, ?)", (server, str(library_key), position, str(rating_key)))
+
+    def remove(self, server: str, library_key: Any):
+        """媒体库已全部处理完成，移除检查点"""
+        self._database.execute("DELETE FROM checkpoint WHERE server = ? AND library_key = ?",
+                               (server, str(library_key)))
+
+    def save(self):
+        """
+        提交检查点的修改
+        """
+        self._database.commit()
+
+    def clear(self):
+        """
+        清理所有检查点，下次运行时从头开始刮削
+        """
+        self._database.execute("DELETE FROM checkpoint")
+        self._database.commit()
+        logger.info("已清理媒体库刮削检查点，下次运行时将从头开始刮削")
+
+
+# 刮削失败原因的显示名称
+FAILURE_REASONS = {
+    "no_tmdbid": "未找到 tmdbid",
+    "tmdb_not_found": "TMDB 未识别到媒体信息",
+    "douban_not_found": "豆瓣未匹配到媒体信息",
+    "resolve_error": "识别人物信息出错",
+    "write_error": "写回人物信息失败",
+}
+
+
+class FailureStore:
+    """
+    刮削失败记录，记录失败原因及失败次数，并按指数退避安排下次重试的时间，退避期间跳过对应的请求，
+    超过退避上限后仍会定期重试
+
+    - 媒体项：按 服务器 + ratingKey 记录，媒体项的 updatedAt 变化（例如修正了匹配）后立即重试，
+      全量刮削时失败过的媒体项延后处理，刮削成功后移除记录
+    - 查询：按查询键（例如 tmdb:电视剧:1396）记录 TMDB、豆瓣未匹配的查询，不同媒体项及媒体服务器共用
+    """
+    # 旧版本保存失败记录的插件数据的键，首次打开时导入数据库
+    data_key = "failures"
+    lookup_data_key = "lookup_failures"
+    # 首次失败后的退避时长（秒），之后每次失败翻倍
+    backoff_base: int = 6 * 60 * 60
+    # 退避时长的上限（秒）
+    backoff_ceiling: int = 30 * 24 * 60 * 60
+
+    def __init__(self, database: StateDatabase, plugin: Optional[_PluginBase] = None):
+        self._database = database
+        # 保证累加失败次数时读取与写入之间不被其他线程打断
+        self._lock = threading.Lock()
+        self._database.create_table("CREATE TABLE IF NOT EXISTS item_failure ("
+                                    "server TEXT NOT NULL, rating_key TEXT NOT NULL, reason TEXT, "
+                                    "attempts INTEGER NOT NULL, failed_at INTEGER NOT NULL, "
+                                    "retry_at INTEGER NOT NULL, updated_at INTEGER, "
+                                    "PRIMARY KEY (server, rating_key))")
+        self._database.create_table("CREATE TABLE IF NOT EXISTS lookup_failure ("
+                                    "lookup_key TEXT PRIMARY KEY, reason TEXT, attempts INTEGER NOT NULL, "
+                                    "failed_at INTEGER NOT NULL, retry_at INTEGER NOT NULL)")
+        if plugin:
+            self.__import(plugin)
+
+    def __import(self, plugin: _PluginBase):
+        """
+        导入旧版本保存在插件数据中的失败记录：
+        - failures：{服务器名称: {ratingKey: [失败原因, 失败次数, 失败时间, 重试时间, updatedAt]}}
+        - lookup_failures：{查询键: [失败原因, 失败次数, 失败时间, 重试时间]}
+        """
+        servers = plugin.get_data(self.data_key)
+        lookups = plugin.get_data(self.lookup_data_key)
+        if servers:
+            # 更早的版本只记录了失败时间，导入后不再退避
+            self._database.executemany("INSERT OR REPLACE INTO item_failure "
+                                       "(server, rating_key, reason, attempts, failed_at, retry_at, updated_at) "
+                                       "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                       [(server, rating_key, *(entry if isinstance(entry, list)
+                                                               else [None, 1, int(entry or 0), 0, None]))
+                                        for server, failures in servers.items()
+                                        for rating_key, entry in failures.items()])
+        if lookups:
+            self._database.executemany("INSERT OR REPLACE INTO lookup_failure "
+                                       "(lookup_key, reason, attempts, failed_at, retry_at) VALUES (?, ?, ?, ?, ?)",
+                                       [(lookup_key, *entry) for lookup_key, entry in lookups.items()])
+        if servers or lookups:
+            self._database.commit()
+            logger.info(f"已将 {sum(len(failures) for failures in (servers or {}).values())} 个媒体项及 "
+                        f"{len(lookups or {})} 个查询的失败记录导入刮削状态数据库")
+        if servers is not None:
+            plugin.del_data(self.data_key)
+        if lookups is not None:
+            plugin.del_data(self.lookup_data_key)
+
+    def retry_delay(self, attempts: int) -> int:
+        """第 attempts 次失败后的退避时长（秒）"""
+        return min(self.backoff_base * 2 ** max(attempts - 1, 0), self.backoff_ceiling)
+
+    def __next_entry(self, attempts: Optional[int], reason: str) -> List[Any]:
+        """在已有记录的基础上增加一次失败，计算下次重试的时间"""
+        attempts = (attempts or 0) + 1
+        now = int(time.time())
+        return [reason, attempts, now, now + self.retry_delay(attempts)]
+
+    def contains(self, server: str, rating_key: Any) -> bool:
+        """媒体项此前是否刮削失败"""
+        if not rating_key:
+            return False
+        return self._database.fetchone("SELECT 1 FROM item_failure WHERE server = ? AND rating_key = ?",
+                                       (server, str(rating_key))) is not None
+
+    def is_backing_off(self, server: str, item: dict) -> bool:
+        """
+        媒体项是否仍在退避期间，媒体项的 updatedAt 与失败时不一致时视为已变化，不再退避
+        """
+        rating_key = item.get("ratingKey") if item else None
+        if not rating_key:
+            return False
+        entry = self._database.fetchone("SELECT retry_at, updated_at FROM item_failure "
+                                        "WHERE server = ? AND rating_key = ?", (server, str(rating_key)))
+        if not entry:
+            return False
+        retry_at, updated_at = entry
+        if updated_at != item.get("updatedAt"):
+            return False
+        return time.time() < retry_at
+
+    def retry_at(self, server: str, item: dict) -> Optional[int]:
+        """
+        媒体项仍在退避期间时下次重试的时间，不在退避期间时返回 None
+        """
+        if not self.is_backing_off(server=server, item=item):
+            return None
+        row = self._database.fetchone("SELECT retry_at FROM item_failure WHERE server = ? AND rating_key = ?",
+                                      (server, str(item.get("ratingKey"))))
+        return row[0] if row else None
+
+    def record(self, server: str, item: dict, reason: str):
+        """记录媒体项刮削失败"""
+        rating_key = item.get("ratingKey") if item else None
+        if not rating_key:
+            return
+        with self._lock:
+            row = self._database.fetchone("SELECT attempts FROM item_failure WHERE server = ? AND rating_key = ?",
+                                          (server, str(rating_key)))
+            self._database.execute("INSERT OR REPLACE INTO item_failure "
+                                   "(server, rating_key, reason, attempts, failed_at, retry_at, updated_at) "
+                                   "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                   (server, str(rating_key), *self.__next_entry(row[0] if row else None, reason),
+                                    item.get("updatedAt")))
+
+    def discard(self, server: str, rating_key: Any):
+        """媒体项刮削成功，移除失败记录"""
+        if not rating_key:
+            return
+        self._database.execute("DELETE FROM item_failure WHERE server = ? AND rating_key = ?",
+                               (server, str(rating_key)))
+
+    def is_lookup_backing_off(self, lookup_key: str) -> bool:
+        """查询是否仍在退避期间"""
+        entry = self._database.fetchone("SELECT retry_at FROM lookup_failure WHERE lookup_key = ?", (lookup_key,))
+        return bool(entry) and time.time() < entry[0]
+
+    def record_lookup(self, lookup_key: str, reason: str):
+        """记录查询未匹配"""
+        with self._lock:
+            row = self._database.fetchone("SELECT attempts FROM lookup_failure WHERE lookup_key = ?", (lookup_key,))
+            self._database.execute("INSERT OR REPLACE INTO lookup_failure "
+                                   "(lookup_key, reason, attempts, failed_at, retry_at) VALUES (?, ?, ?, ?, ?)",
+                                   (lookup_key, *self.__next_entry(row[0] if row else None, reason)))
+
+    def discard_lookup(self, lookup_key: str):
+        """查询匹配成功，移除失败记录"""
+        self._database.execute("DELETE FROM lookup_failure WHERE lookup_key = ?", (lookup_key,))
+
+    def count(self) -> Dict[str, int]:
+        """
+        获取媒体项及查询失败记录的数量、其中仍在退避期间的数量，以及按失败原因统计的数量
+        """
+        now = time.time()
+        items = self._database.fetchall("SELECT reason, retry_at FROM item_failure")
+        lookups = self._database.fetchall("SELECT reason, retry_at FROM lookup_failure")
+        reasons: Dict[str, int] = {}
+        for reason, _ in items + lookups:
+            reason = FAILURE_REASONS.get(reason, reason) if reason else "未知原因"
+            reasons[reason] = reasons.get(reason, 0) + 1
+        return {
+            "items": len(items),
+            "items_backing_off": sum(1 for _, retry_at in items if now < retry_at),
+            "lookups": len(lookups),
+            "lookups_backing_off": sum(1 for _, retry_at in lookups if now < retry_at),
+            "reasons": reasons,
+        }
+
+    def save(self):
+        """
+        提交失败记录的修改
+        """
+        self._database.commit()
+
+    def clear(self):
+        """
+        清理所有失败记录，下次运行时立即重试
+        """
+        self._database.execute("DELETE FROM item_failure")
+        self._database.execute("DELETE FROM lookup_failure")
+        self._database.commit()
+        logger.info("已清理刮削失败记录，下次运行时将立即重试")
+
+
+class PersonStore:
+    """
+    人物翻译库，使用 SQLite 保存在插件数据目录中，不受缓存过期及清理缓存的影响
+
+    人物键的格式：
+    - tmdb:{TMDB 人物 ID}
+    - tag:{Plex tagKey}
+    - name:{规范化后的拉丁名称}
+    """
+    # SQLite 单条语句的参数数量上限
+    max_variables = 500
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(path), check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS person_name ("
+                               "person_key TEXT PRIMARY KEY, name TEXT NOT NULL, updated_at INTEGER NOT NULL)")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS person_role ("
+                               "person_key TEXT NOT NULL, role TEXT NOT NULL, translated TEXT NOT NULL, "
+                               "updated_at INTEGER NOT NULL, PRIMARY KEY (person_key, role))")
+
+    def get_names(self, person_keys: Iterable[str]) -> Dict[str, str]:
+        """
+        批量获取人物的中文名称
+        :param person_keys: 人物键
+        :return: 以人物键为键的中文名称字典
+        """
+        return dict(self.__select("SELECT person_key, name FROM person_name WHERE person_key IN ({})",
+                                  person_keys))
+
+    def get_roles(self, person_keys: Iterable[str]) -> Dict[Tuple[str, str], str]:
+        """
+        批量获取人物的中文角色
+        :param person_keys: 人物键
+        :return: 以（人物键，原始角色）为键的中文角色字典
+        """
+        rows = self.__select("SELECT person_key, role, translated FROM person_role WHERE person_key IN ({})",
+                             person_keys)
+        return {(person_key, role): translated for person_key, role, translated in rows}
+
+    def save(self, names: Dict[str, str], roles: Dict[Tuple[str, str], str]):
+        """
+        批量保存人物的中文名称及角色
+        :param names: 以人物键为键的中文名称字典
+        :param roles: 以（人物键，原始角色）为键的中文角色字典
+        """
+        if not names and not roles:
+            return
+        now = int(time.time())
+        with self._lock, self._conn:
+            self._conn.executemany("INSERT OR REPLACE INTO person_name (person_key, name, updated_at) "
+                                   "VALUES (?, ?, ?)",
+                                   [(key, name, now) for key, name in names.items()])
+            self._conn.executemany("INSERT OR REPLACE INTO person_role (person_key, role, translated, updated_at) "
+                                   "VALUES (?, ?, ?, ?)",
+                                   [(key, role, translated, now) for (key, role), translated in roles.items()])
+
+    def count(self) -> Dict[str, int]:
+        """
+        获取人物名称及角色的数量
+        """
+        with self._lock:
+            name_count = self._conn.execute("SELECT COUNT(*) FROM person_name").fetchone()[0]
+            role_count = self._conn.execute("SELECT COUNT(*) FROM person_role").fetchone()[0]
+        return {"names": name_count, "roles": role_count}
+
+    def close(self):
+        """
+        关闭数据库连接
+        """
+        with self._lock:
+            self._conn.close()
+
+    def __select(self, sql: str, person_keys: Iterable[str]) -> List[tuple]:
+        """按参数数量上限分批查询"""
+        keys = list(dict.fromkeys(key for key in person_keys if key))
+        rows = []
+        with self._lock:
+            for start in range(0, len(keys), self.max_variables):
+                chunk = keys[start:start + self.max_variables]
+                rows.extend(self._conn.execute(sql.format(",".join("?" * len(chunk))), chunk).fetchall())
+        return rows
+
+    @staticmethod
+    def normalize_name(name: Optional[str]) -> Optional[str]:
+        """
+        规范化拉丁名称：NFKC 归一化、去除变音符号、转为小写并去除空格及标点
+        """
+        if not name:
+            return None
+        return names.normalize_name(name) or None
+
+    @classmethod
+    def person_keys(cls, actor: dict) -> List[str]:
+        """
+        获取 Plex 人物可用于查询的人物键，按可信度排序
+        """
+        keys = []
+        if actor.get("person_tmdbid"):
+            keys.append(f"tmdb:{actor.get('person_tmdbid')}")
+        if actor.get("tagKey"):
+            keys.append(f"tag:{actor.get('tagKey')}")
+        name = cls.normalize_name(actor.get("tag"))
+        if name:
+            keys.append(f"name:{name}")
+        return keys